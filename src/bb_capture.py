@@ -0,0 +1,717 @@
+'''
+The row schema, binary capture, rollover, and chart summary of BB-DAQ's output files
+'''
+
+from __future__ import annotations
+# Python has a built-in json library
+import json
+# Python has a built-in os library
+import os
+# Python has a built-in datetime library
+from datetime import date, datetime, time as dt_time
+# Python has a built-in time library
+import time
+# Python has a built-in typing library
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from xlsxwriter import Workbook as XlsxWkbk
+    from xlsxwriter.format import Format as XlsxFormat
+    from xlsxwriter.worksheet import Worksheet as XlsxSheet
+if __package__:
+    from .bb_common import (np, CSV_FLUSH_INTERVAL, BIN_BUF_ROWS, BIN_CELLS_EXT, BIN_FORMAT_NAME,
+                            BIN_FORMAT_VERSION, XLSX_MAX_ROWS, CHART_MAX_POINTS,
+                            CHART_SUMMARY_BUCKET, CHART_SUMMARY_LEVEL, CHART_SHEET_SUFFIX,
+                            DATA_DELIM, TIME_WORD, TIMER_WORD, DATE_WORD, SPECIAL_WORD_CASES,
+                            SCHEMA_SAMPLE_ROWS, SCHEMA_MAX_MISSES, ColumnKind, is_num_str)
+else:
+    # pylint: disable=import-error
+    from bb_common import (np, CSV_FLUSH_INTERVAL, BIN_BUF_ROWS, BIN_CELLS_EXT, BIN_FORMAT_NAME,
+                           BIN_FORMAT_VERSION, XLSX_MAX_ROWS, CHART_MAX_POINTS,
+                           CHART_SUMMARY_BUCKET, CHART_SUMMARY_LEVEL, CHART_SHEET_SUFFIX,
+                           DATA_DELIM, TIME_WORD, TIMER_WORD, DATE_WORD, SPECIAL_WORD_CASES,
+                           SCHEMA_SAMPLE_ROWS, SCHEMA_MAX_MISSES, ColumnKind, is_num_str)
+if TYPE_CHECKING:
+    if __package__:
+        from .bb_file import FileData
+    else:
+        # pylint: disable=import-error
+        from bb_file import FileData
+
+
+# Classes
+class RowSchema():
+    """
+    Class containing the per-column conversion plan for DATA rows, compiled from the header and
+    the first few DATA rows so that later rows don't need every cell inspected
+    """
+
+    def __init__(self, header_txt:str) -> None:
+        """
+        This method is the constructor
+        @param self: Not needed in calls
+        @param header_txt: the joined delimeter-separated values that make up the header
+        @return: None
+        """
+        # Only rows as wide as the header are compiled (anything else uses the slow path)
+        self.width = len(header_txt.split(DATA_DELIM))
+        self.samples:list[list[str]] = []
+        self.is_compiled = False
+        self.num_misses = 0
+        # Column indices for each ColumnKind (populated by compile())
+        self.kinds:list[ColumnKind] = []
+        self.num_inds:list[int] = []
+        self.text_inds:list[int] = []
+        self.time_inds:list[int] = []
+        self.timer_inds:list[int] = []
+        self.date_inds:list[int] = []
+        self.word_checks:list[tuple[int, str]] = [] # (column, key word) pairs
+        self.plain_inds:list[int] = [] # Columns that must not contain key words
+        self.has_datetime = False
+        # The columns to parse, cached for the (save_as_xlsx, plotted columns) they were made for
+        self.parse_key:tuple[bool, tuple[int, ...]] = None # (parse_all, plot_inds)
+        self.parse_inds:list[int] = []
+
+    def learn(self, row:list[str], num_cols:int) -> None:
+        """
+        This method saves a DATA row as a sample, then compiles the schema once there are enough
+        matching samples
+        @param self: Not needed in calls
+        @param row: a list of each delimiter-separated value in the row (it is not changed)
+        @param num_cols: the number of delimeter-separated values in the row
+        @return: None
+        """
+        if num_cols != self.width:
+            self.samples.clear() # The samples must be consecutive
+            return
+        self.samples.append(row[:num_cols])
+        if len(self.samples) == SCHEMA_SAMPLE_ROWS:
+            self.compile()
+
+    def compile(self) -> None:
+        """
+        This method determines the kind of each column from the samples
+        (A column is a key-word column if every sample has the same key word, and a number column
+        if every sample is a number)
+        @param self: Not needed in calls
+        @return: None
+        """
+        word_kinds = {TIME_WORD: ColumnKind.TIME, TIMER_WORD: ColumnKind.TIMER, \
+                      DATE_WORD: ColumnKind.DATE}
+        self.kinds = []
+        for col in range(self.width):
+            cells_upper = {sample[col].upper() for sample in self.samples}
+            (first_upper,) = cells_upper if len(cells_upper) == 1 else (None,)
+            if first_upper in word_kinds:
+                self.kinds.append(word_kinds[first_upper])
+            elif all(is_num_str(sample[col]) for sample in self.samples):
+                self.kinds.append(ColumnKind.NUMBER)
+            else:
+                self.kinds.append(ColumnKind.TEXT)
+        inds = {kind: [] for kind in ColumnKind}
+        for (col, kind) in enumerate(self.kinds):
+            inds[kind].append(col)
+        self.num_inds = inds[ColumnKind.NUMBER]
+        self.text_inds = inds[ColumnKind.TEXT]
+        self.time_inds = inds[ColumnKind.TIME]
+        self.timer_inds = inds[ColumnKind.TIMER]
+        self.date_inds = inds[ColumnKind.DATE]
+        self.word_checks = [(col, TIME_WORD) for col in self.time_inds] + \
+            [(col, TIMER_WORD) for col in self.timer_inds] + \
+            [(col, DATE_WORD) for col in self.date_inds]
+        self.plain_inds = self.text_inds + self.num_inds
+        self.has_datetime = len(self.time_inds) + len(self.date_inds) > 0
+        self.parse_key = None
+        self.samples.clear()
+        self.is_compiled = True
+        self.num_misses = 0
+
+    def matches(self, row:list[str], num_cols:int) -> bool:
+        """
+        This method checks that a row can be converted with the compiled plan (without parsing
+        the numbers, which is done by the caller)
+        @param self: Not needed in calls
+        @param row: a list of each delimiter-separated value in the row
+        @param num_cols: the number of delimeter-separated values in the row
+        @return: a boolean that is true if the row has the schema's key words in the same places
+            and no numbers in its TEXT columns
+        """
+        if num_cols != self.width:
+            return False
+        for (col, word) in self.word_checks:
+            cell = row[col]
+            if (cell != word) and (cell.upper() != word):
+                return False
+        for col in self.plain_inds:
+            if row[col] in SPECIAL_WORD_CASES:
+                return False
+        # A column that started out as text (e.g., "N/A" before a sensor warms up) still has its
+        # numbers written as numbers, so those rows use the slow path until the schema is relearned
+        for col in self.text_inds:
+            if is_num_str(row[col]):
+                return False
+        return True
+
+    def get_parse_inds(self, parse_all:bool, plot_inds:tuple[int, ...]) -> list[int]:
+        """
+        This method gets the number columns that must be parsed (all of them for a sheet or a
+        binary capture, and only the plotted ones for a CSV file)
+        @param self: Not needed in calls
+        @param parse_all: a boolean for parsing every number column
+        @param plot_inds: the indices (0-based) of the plotted columns
+        @return: the column indices
+        """
+        key = (parse_all, plot_inds)
+        if key != self.parse_key:
+            self.parse_key = key
+            if parse_all:
+                self.parse_inds = self.num_inds
+            else:
+                self.parse_inds = [col for col in self.num_inds if col in plot_inds]
+        return self.parse_inds
+
+    def record_miss(self) -> None:
+        """
+        This method counts a row that deviated from the schema, and forgets the schema if too
+        many rows deviate in a row (so that it can be relearned)
+        @param self: Not needed in calls
+        @return: None
+        """
+        self.num_misses += 1
+        if self.num_misses >= SCHEMA_MAX_MISSES:
+            self.is_compiled = False
+            self.samples.clear()
+
+
+class BinaryCapture():
+    """
+    Class containing an append-only binary columnar capture of the DATA rows
+    Each DATA row is a record of little-endian float64 values (one per header column), so the data
+    file can be memory-mapped as a 2-D array. The JSON metadata file next to it holds the header,
+    the column kinds (from the row schema), the segments (pages started by CLEARDATA), the timer
+    resets, and the LABEL rows. Any cells that don't fit their column's kind are appended to the
+    cell file (BIN_CELLS_EXT), so the metadata stays small no matter how many there are. TIME and
+    DATE cells are stored as the second count when they were received, and the usual text of a
+    TEXT column (like "DATA") is stored once in the metadata.
+    """
+
+    def __init__(self, file_name:str, header_txt:str, flush_interval:float=CSV_FLUSH_INTERVAL, \
+                 schema:RowSchema=None) -> None:
+        """
+        This method is the constructor (the capture file is created or cleared)
+        @param self: Not needed in calls
+        @param file_name: the name of the capture file (the metadata file name adds ".json")
+        @param header_txt: the joined delimeter-separated values that make up the header
+        @param flush_interval: the maximum number of seconds between flushes
+        @param schema: the RowSchema that the column kinds are taken from once it is compiled (the
+            rows before that are held), or None to take them from the first DATA row
+        @return: None
+        """
+        self.file_name = file_name
+        self.meta_name = file_name + ".json"
+        self.num_cols = len(header_txt.split(DATA_DELIM))
+        self.num_rows = 0 # Including the rows that are held or pending
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+        self.schema = schema
+        self.held:list[list[tuple[ColumnKind, float|str]]] = [] # Rows waiting for the column kinds
+        self.pending:list[float] = [] # Flattened rows that haven't been written yet
+        self.pending_cells:list[str] = [] # Lines of the cell file that haven't been written yet
+        self.col_kinds:list[str] = None # ColumnKind names, set once they are known
+        self.meta = {
+            "format": BIN_FORMAT_NAME,
+            "version": BIN_FORMAT_VERSION,
+            "dtype": "<f8",
+            "header_txt": header_txt,
+            "num_cols": self.num_cols,
+            "num_rows": 0,
+            "column_kinds": None, # Set by the first DATA row
+            "column_text": [None]*self.num_cols,
+            "segments": [0], # First row of each page
+            "timer_resets": [], # [row, reference second count]
+            "labels": [], # [segment, row, text]
+            # Cells that don't fit their column's kind, as [row, column, kind, value] lines
+            "cells_file": os.path.basename(file_name) + BIN_CELLS_EXT
+        }
+        # The handles are closed in close(), so a with-statement can't be used here
+        self.data_file = open(file_name, mode="wb") # pylint: disable=consider-using-with
+        self.cells_file = open(file_name + BIN_CELLS_EXT, mode="wt", \
+                               encoding='utf-8') # pylint: disable=consider-using-with
+        self.write_meta()
+
+    def write_row(self, cells:list[tuple[ColumnKind, float|str]]) -> None:
+        """
+        This method buffers a DATA row (or holds it until the column kinds are known)
+        @param self: Not needed in calls
+        @param cells: the (kind, value) tuple of each cell, where the value is a number for every
+            kind but TEXT (TIME and DATE are second counts)
+        @return: None
+        """
+        if self.col_kinds is None:
+            self.held.append(cells)
+            self.num_rows += 1
+            # The held rows are bounded like the pending rows (if the schema is never compiled, the
+            # first row decides the kinds)
+            if (self.schema is None) or self.schema.is_compiled or (len(self.held) >= BIN_BUF_ROWS):
+                self.set_kinds()
+            return
+        self.add_row(self.num_rows, cells)
+        self.num_rows += 1
+        if (len(self.pending) >= BIN_BUF_ROWS*self.num_cols) or \
+                (time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def set_kinds(self) -> None:
+        """
+        This method sets the kind of each column from the row schema (or from the first held row if
+        the schema isn't compiled), then buffers the held rows
+        @param self: Not needed in calls
+        @return: None
+        """
+        if (self.schema is not None) and self.schema.is_compiled:
+            kinds = self.schema.kinds
+        else:
+            kinds = [kind for (kind, _) in self.held[0]] if self.held else []
+        self.col_kinds = [kind.name for kind in kinds[:self.num_cols]]
+        self.col_kinds += [ColumnKind.TEXT.name]*(self.num_cols - len(self.col_kinds))
+        self.meta["column_kinds"] = self.col_kinds
+        (held, self.held) = (self.held, [])
+        first_row = self.num_rows - len(held)
+        for (ind, cells) in enumerate(held):
+            self.add_row(first_row + ind, cells)
+
+    def add_row(self, row_ind:int, cells:list[tuple[ColumnKind, float|str]]) -> None:
+        """
+        This method converts a DATA row to the pending values and cell file lines
+        @param self: Not needed in calls
+        @param row_ind: the index of the row in the capture
+        @param cells: the (kind, value) tuple of each cell (see write_row())
+        @return: None
+        """
+        col_kinds = self.col_kinds
+        col_text:list[str] = self.meta["column_text"]
+        vals = [np.nan]*self.num_cols
+        for (col, (kind, value)) in enumerate(cells):
+            if (col < self.num_cols) and (kind.name == col_kinds[col]):
+                if kind != ColumnKind.TEXT:
+                    vals[col] = value
+                    continue
+                if col_text[col] is None:
+                    col_text[col] = value # The first text of a TEXT column is its usual text
+                if value == col_text[col]:
+                    continue
+            self.pending_cells.append(json.dumps([row_ind, col, kind.name, value]) + "\n")
+        self.pending.extend(vals)
+
+    def add_label(self, text:str) -> None:
+        """
+        This method saves a LABEL row (in front of the next DATA row)
+        @param self: Not needed in calls
+        @param text: the joined delimeter-separated values of the row
+        @return: None
+        """
+        self.meta["labels"].append([len(self.meta["segments"]) - 1, self.num_rows, text])
+
+    def add_timer_reset(self, timer_t0:float) -> None:
+        """
+        This method saves a timer reset (in front of the next DATA row)
+        @param self: Not needed in calls
+        @param timer_t0: the new reference second count for the timer
+        @return: None
+        """
+        self.meta["timer_resets"].append([self.num_rows, timer_t0])
+
+    def new_segment(self) -> None:
+        """
+        This method starts a new page (the previous rows are kept, unlike in CSV and Excel)
+        @param self: Not needed in calls
+        @return: None
+        """
+        segments = self.meta["segments"]
+        if segments[-1] == self.num_rows:
+            return # The current page is still empty
+        segments.append(self.num_rows)
+
+    def flush(self) -> None:
+        """
+        This method writes the buffered rows, their cells, and the metadata to the disk (the held
+        rows wait for the column kinds)
+        @param self: Not needed in calls
+        @return: None
+        """
+        if self.pending:
+            np.asarray(self.pending, dtype=self.meta["dtype"]).tofile(self.data_file)
+            self.pending.clear()
+        self.data_file.flush()
+        if self.pending_cells:
+            self.cells_file.writelines(self.pending_cells)
+            self.pending_cells.clear()
+        self.cells_file.flush()
+        self.write_meta()
+        self.last_flush = time.monotonic()
+
+    def write_meta(self) -> None:
+        """
+        This method (re)writes the metadata file, replacing it in one step so that it is never
+        half-written
+        @param self: Not needed in calls
+        @return: None
+        """
+        self.meta["num_rows"] = self.num_rows - len(self.pending)//self.num_cols - len(self.held)
+        tmp_name = self.meta_name + ".tmp"
+        with open(tmp_name, mode="wt", encoding='utf-8') as f_out:
+            json.dump(self.meta, f_out)
+        os.replace(tmp_name, self.meta_name)
+
+    def close(self) -> None:
+        """
+        This method flushes and closes the capture IFF it is open
+        @param self: Not needed in calls
+        @return: None
+        """
+        if self.data_file.closed:
+            return
+        if self.held:
+            self.set_kinds()
+        self.flush()
+        self.data_file.close()
+        self.cells_file.close()
+
+
+class Rollover():
+    """
+    Class that decides when a long run continues into a new sheet or file (a segment), and keeps
+    the manifest of each segment's rows and times for finding a row or time without opening every
+    file. The TIMER values carry on across segments since the timer isn't reset.
+    """
+
+    def __init__(self, max_rows:int=0, max_bytes:int=0, max_seconds:float=0.0) -> None:
+        """
+        This method is the constructor (with no limits, only full Excel sheets are rolled over)
+        @param self: Not needed in calls
+        @param max_rows: the number of rows to write after the header of each segment (0 for no
+            limit)
+        @param max_bytes: the number of bytes to write to each CSV file or binary capture (0 for no
+            limit, and Excel sheets are not measured)
+        @param max_seconds: the number of seconds of data to write to each segment (0 for no limit)
+        @return: None
+        """
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.manifest_name:str = None # Set by FileData from the first file name
+        self.header_txt:str = None
+        self.segments:list[dict] = []
+        self.num_runs = 0
+        self.num_rollovers = 0
+        self.run_rows = 0 # Number of DATA rows in the run so far (over all of its segments)
+        self.rolled_rows = 0 # Number of rows of the run in its earlier segments
+        self.t_start:float = None # Receive time of the first row of the current segment
+        # Where the run started, which the names of its next segments are based on
+        self.base_file:str = None
+        self.base_sheet:str = None
+        self.part = 1
+
+    def start_segment(self, file_name:str, sheet_name:str=None, new_run:bool=True) -> None:
+        """
+        This method adds a segment to the manifest
+        @param self: Not needed in calls
+        @param file_name: the name of the segment's file
+        @param sheet_name: the name of the segment's sheet (None if the file isn't a workbook)
+        @param new_run: a boolean for the segment starting a run (false when a run rolls over)
+        @return: None
+        """
+        if new_run:
+            self.num_runs += 1
+            (self.run_rows, self.rolled_rows) = (0, 0)
+            (self.base_file, self.base_sheet, self.part) = (file_name, sheet_name, 1)
+        else:
+            self.num_rollovers += 1
+        self.segments.append({"run": self.num_runs, "file": file_name, "sheet": sheet_name, \
+                              "rows": 0, "first_row": None, "last_row": None, \
+                              "rx_start": None, "rx_end": None, \
+                              "timer_start": None, "timer_end": None})
+        self.t_start = None
+
+    def add_row(self, rx_time:float, timer_t0:float) -> None:
+        """
+        This method counts a DATA row in the current segment
+        @param self: Not needed in calls
+        @param rx_time: the second count when the row was received
+        @param timer_t0: the reference second count for the timer
+        @return: None
+        """
+        seg = self.segments[-1]
+        self.run_rows += 1
+        if seg["rows"] == 0:
+            (seg["first_row"], seg["rx_start"]) = (self.run_rows, rx_time)
+            seg["timer_start"] = rx_time - timer_t0
+            self.t_start = rx_time
+        seg["rows"] += 1
+        (seg["last_row"], seg["rx_end"], seg["timer_end"]) = \
+            (self.run_rows, rx_time, rx_time - timer_t0)
+
+    def clear_segment(self) -> None:
+        """
+        This method forgets the rows of the current segment (after CLEARDATA erased them)
+        @param self: Not needed in calls
+        @return: None
+        """
+        if not self.segments:
+            return
+        seg = self.segments[-1]
+        self.run_rows -= seg["rows"]
+        seg.update(rows=0, first_row=None, last_row=None, rx_start=None, rx_end=None, \
+                   timer_start=None, timer_end=None)
+        self.t_start = None
+
+    def is_due(self, file_struct:FileData, rx_time:float) -> bool:
+        """
+        This method checks if the next row should go into a new segment
+        @param self: Not needed in calls
+        @param file_struct: the FileData object containing the file-related information
+        @param rx_time: the second count when the next row was received
+        @return: a boolean for whether a segment is full
+        """
+        num_rows = file_struct.row_num - 1
+        if num_rows <= 0:
+            return False # Never leave a segment with only its header
+        if file_struct.is_xlsx and (file_struct.row_num >= XLSX_MAX_ROWS):
+            return True
+        if 0 < self.max_rows <= num_rows:
+            return True
+        if 0 < self.max_bytes <= file_struct.get_num_bytes():
+            return True
+        return (self.max_seconds > 0) and (self.t_start is not None) and \
+            (rx_time - self.t_start >= self.max_seconds)
+
+    def get_file_name(self) -> str:
+        """
+        This method names the next file of the run, numbered like the files of an exported
+        capture (existing files are skipped, since nobody may be there to confirm an overwrite)
+        @param self: Not needed in calls
+        @return: the file name
+        """
+        (root, ext) = os.path.splitext(self.base_file)
+        while True:
+            self.part += 1
+            file_name = f"{root}_{self.part}{ext}"
+            if not os.path.exists(file_name):
+                return file_name
+
+    def get_sheet_name(self, sheet_names:list[str]) -> str:
+        """
+        This method names the next sheet of the run, numbered after the run's first sheet
+        @param self: Not needed in calls
+        @param sheet_names: the names of the sheets already in the workbook
+        @return: the sheet name
+        """
+        taken = {name.upper() for name in sheet_names}
+        while True:
+            self.part += 1
+            suffix = f"_{self.part}"
+            # Excel sheet names are at most 31 characters
+            sheet_name = self.base_sheet[:31 - len(suffix)] + suffix
+            if sheet_name.upper() not in taken:
+                return sheet_name
+
+    def is_used(self) -> bool:
+        """
+        This method checks if the manifest is worth writing
+        @param self: Not needed in calls
+        @return: a boolean for whether there are limits or a run rolled over
+        """
+        return (self.num_rollovers > 0) or (self.max_rows > 0) or (self.max_bytes > 0) or \
+            (self.max_seconds > 0)
+
+    def write_manifest(self) -> None:
+        """
+        This method (re)writes the manifest IFF it is worth writing, replacing it in one step so
+        that it is never half-written
+        @param self: Not needed in calls
+        @return: None
+        """
+        if (self.manifest_name is None) or (not self.is_used()):
+            return
+        manifest_dir = os.path.dirname(os.path.abspath(self.manifest_name))
+        segments = []
+        for seg in self.segments:
+            (rx_start, rx_end) = (seg["rx_start"], seg["rx_end"])
+            segments.append({
+                "run": seg["run"],
+                # Relative to the manifest, so the files can be moved together
+                "file": os.path.relpath(os.path.abspath(seg["file"]), manifest_dir),
+                "sheet": seg["sheet"],
+                "rows": seg["rows"],
+                "first_row": seg["first_row"],
+                "last_row": seg["last_row"],
+                "start": None if rx_start is None else datetime.fromtimestamp(rx_start).isoformat(),
+                "end": None if rx_end is None else datetime.fromtimestamp(rx_end).isoformat(),
+                "timer_start": None if rx_start is None else round(seg["timer_start"], 3),
+                "timer_end": None if rx_end is None else round(seg["timer_end"], 3)
+            })
+        manifest = {"header_txt": self.header_txt, "max_rows": self.max_rows, \
+                    "max_bytes": self.max_bytes, "max_seconds": self.max_seconds, \
+                    "segments": segments}
+        tmp_name = self.manifest_name + ".tmp"
+        with open(tmp_name, mode="wt", encoding='utf-8') as f_out:
+            json.dump(manifest, f_out, indent=1)
+        os.replace(tmp_name, self.manifest_name)
+
+
+class ChartSummary():
+    """
+    Class that writes a min/max summary of a sheet's charted columns to a hidden helper sheet while
+    the data is written, so the chart of a long sheet has a bounded number of points and the
+    workbook opens quickly
+    (The rows are kept until the sheet is long enough to need a summary, so short sheets don't get a
+    helper sheet. Each bucket of rows becomes two summary rows holding each series' lowest and
+    highest value in their order, and the buckets double in size every CHART_SUMMARY_LEVEL
+    buckets, so a full sheet is summarized in a few thousand points.)
+    """
+
+    def __init__(self, workbook:XlsxWkbk, sheet_name:str, header:list[str], cols:list[int], \
+                 max_points:int=CHART_MAX_POINTS, bucket_rows:int=CHART_SUMMARY_BUCKET) -> None:
+        """
+        This method is the constructor
+        @param self: Not needed in calls
+        @param workbook: the Workbook that the sheet is in
+        @param sheet_name: the name of the charted sheet
+        @param header: the header of the charted sheet
+        @param cols: the indices (0-based) of the charted columns, with the x column first
+        @param max_points: the number of rows that are charted directly (without a summary)
+        @param bucket_rows: the number of rows in each of the first buckets
+        @return: None
+        """
+        self.workbook = workbook
+        self.sheet_name = sheet_name
+        self.header = [header[col] if col < len(header) else "" for col in cols]
+        self.cols = cols
+        self.max_points = max_points
+        self.bucket_rows = bucket_rows
+        self.sheet:XlsxSheet = None # The helper sheet, made once the summary is needed
+        self.pending:list[list[float]] = [] # Charted values of the rows that aren't summarized
+        self.num_rows = 0 # Number of rows of the helper sheet (including its header)
+        self.num_buckets = 0
+
+    @staticmethod
+    def to_excel_number(value:date|dt_time) -> float:
+        """
+        This method converts a date or time to the number Excel stores it as
+        @param value: the date or time of day
+        @return: the number of days since Excel's day 0 (or the fraction of a day for a time)
+        """
+        if isinstance(value, dt_time):
+            return (value.hour*3600 + value.minute*60 + value.second + value.microsecond/1e6)/86400
+        return float((value - date(1899, 12, 30)).days)
+
+    def add_row(self, nums:list[tuple[int, float, XlsxFormat]], \
+                dates:list[tuple[int, date|dt_time, XlsxFormat]]) -> None:
+        """
+        This method adds the charted values of a DATA row to the summary
+        @param self: Not needed in calls
+        @param nums: the (column, number, format) tuples of the row
+        @param dates: the (column, date or time, format) tuples of the row
+        @return: None
+        """
+        found = {col: num for (col, num, _) in nums}
+        for (col, value, _) in dates:
+            found[col] = self.to_excel_number(value)
+        self.pending.append([found.get(col, float("nan")) for col in self.cols])
+        if self.sheet is None:
+            if len(self.pending) > self.max_points:
+                self.start_sheet()
+        elif len(self.pending) >= self.bucket_rows:
+            self.write_bucket(self.pending)
+            self.pending = []
+
+    def start_sheet(self) -> None:
+        """
+        This method makes the hidden helper sheet and summarizes the rows so far
+        @param self: Not needed in calls
+        @return: None
+        """
+        taken = {name.upper() for name in self.workbook.sheetnames}
+        (suffix, part) = (CHART_SHEET_SUFFIX, 1)
+        # Excel sheet names are at most 31 characters
+        while (sheet_name := self.sheet_name[:31 - len(suffix)] + suffix).upper() in taken:
+            part += 1
+            suffix = f"{CHART_SHEET_SUFFIX}_{part}"
+        self.sheet = self.workbook.add_worksheet(sheet_name)
+        self.sheet.hide()
+        self.sheet.write_row(0, 0, self.header)
+        self.num_rows = 1
+        (rows, self.pending) = (self.pending, [])
+        start = 0
+        while len(rows) - start >= self.bucket_rows:
+            end = start + self.bucket_rows # The bucket size can change in write_bucket()
+            self.write_bucket(rows[start:end])
+            start = end
+        self.pending = rows[start:]
+
+    def write_bucket(self, rows:list[list[float]]) -> None:
+        """
+        This method writes the two summary rows of a bucket (the x values of the bucket's first
+        and last rows, and each series' lowest and highest value in the order they came in)
+        @param self: Not needed in calls
+        @param rows: the charted values of the bucket's rows
+        @return: None
+        """
+        data = np.array(rows, dtype=float)
+        firsts = [data[0, 0]]
+        lasts = [data[-1, 0]]
+        for vals in data[:, 1:].T:
+            is_gap = np.isnan(vals)
+            if is_gap.all():
+                firsts.append(np.nan)
+                lasts.append(np.nan)
+                continue
+            inds = sorted((np.where(is_gap, np.inf, vals).argmin(), \
+                           np.where(is_gap, -np.inf, vals).argmax()))
+            firsts.append(vals[inds[0]])
+            lasts.append(vals[inds[1]])
+        for summary_row in (firsts, lasts):
+            # Gaps are left as blank cells
+            self.sheet.write_row(self.num_rows, 0, [None if np.isnan(val) else float(val) \
+                                                    for val in summary_row])
+            self.num_rows += 1
+        self.num_buckets += 1
+        if self.num_buckets % CHART_SUMMARY_LEVEL == 0:
+            self.bucket_rows *= 2
+
+    def finish(self) -> None:
+        """
+        This method summarizes the last rows IFF there is a helper sheet
+        @param self: Not needed in calls
+        @return: None
+        """
+        if (self.sheet is None) or (not self.pending):
+            return
+        self.write_bucket(self.pending)
+        self.pending = []
+
+
+# Functions
+def load_capture(file_name:str) -> tuple[dict, np.ndarray]:
+    """
+    This function opens a binary capture for reading without copying its data
+    (A ValueError is raised if the file isn't a capture of the version this module writes)
+    @param file_name: the name of the capture file (the metadata file name adds ".json")
+    @return: a tuple containing the metadata (with the lines of the cell file as its "cells") and
+        the read-only (rows x columns) memory-mapped data
+    """
+    with open(file_name + ".json", encoding='utf-8') as f_in:
+        meta = json.load(f_in)
+    if meta.get("format") != BIN_FORMAT_NAME:
+        raise ValueError(f"{file_name} is not a {BIN_FORMAT_NAME}")
+    if meta.get("version") != BIN_FORMAT_VERSION:
+        raise ValueError(f"{file_name} is version {meta.get('version')} of the {BIN_FORMAT_NAME} " \
+                         f"format (only version {BIN_FORMAT_VERSION} can be read)")
+    cells_name = os.path.join(os.path.dirname(file_name), meta["cells_file"])
+    with open(cells_name, encoding='utf-8') as f_in:
+        # A line that was cut off (e.g., the program was killed mid-write) is skipped
+        meta["cells"] = [json.loads(line) for line in f_in if line.endswith("\n")]
+    shape = (meta["num_rows"], meta["num_cols"])
+    if shape[0] == 0:
+        # Empty files can't be memory-mapped
+        return (meta, np.empty(shape, dtype=meta["dtype"]))
+    return (meta, np.memmap(file_name, dtype=meta["dtype"], mode="r", shape=shape))
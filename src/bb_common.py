@@ -0,0 +1,406 @@
+'''
+The imports, constants, and console helpers shared by the modules of BB-DAQ
+'''
+
+# Type hints are only evaluated by type checkers (so they don't import the lazy libraries below)
+from __future__ import annotations
+# Python has a built-in enum library
+from enum import Enum
+# Python has a built-in importlib library
+import importlib
+# Python has a built-in itertools library
+from itertools import product
+# Python has a built-in os library
+import os
+# Python has a built-in struct library
+import struct
+# Python has a built-in sys library
+import sys
+# Python has a built-in threading library
+import threading
+# Python has a built-in time library
+import time
+# Python has a built-in typing library
+from typing import TextIO
+# If serial is not installed, type "python3 -m pip install pyserial" into a Terminal window
+# Note that if you have another serial library installed, it may interfere with this one
+import serial
+
+
+class LazyModule(): # pylint: disable=too-few-public-methods
+    """
+    Class that stands in for a module and imports it when one of its attributes is first used
+    (Each attribute is then kept on this object, so later uses don't go through __getattr__())
+    """
+
+    def __init__(self, module_name:str) -> None:
+        """
+        This method is the constructor
+        @param self: Not needed in calls
+        @param module_name: the full name of the module (e.g., "matplotlib.pyplot")
+        @return: None
+        """
+        self.__module_name = module_name
+
+    def __getattr__(self, name:str) -> object:
+        """
+        This method imports the module (if it isn't already) and gets one of its attributes
+        @param self: Not needed in calls
+        @param name: the name of the attribute
+        @return: the attribute
+        """
+        value = getattr(importlib.import_module(self.__module_name), name)
+        setattr(self, name, value)
+        return value
+
+
+# The libraries below take far longer to import than the rest of BB-DAQ (pyplot also loads a GUI
+# backend), so each is only imported when a run needs it (CSV runs without a graph need none)
+# Python has a built-in argparse library (only used by headless runs)
+argparse = LazyModule("argparse")
+# Python has a built-in asyncio library (only used by the asyncio event loop)
+asyncio = LazyModule("asyncio")
+list_ports = LazyModule("serial.tools.list_ports")
+# If xlsxwriter is not installed, type "pip3 install xlsxwriter" into a Terminal window
+xlsxwriter = LazyModule("xlsxwriter")
+# If matplotlib is not installed, type "pip3 install matplotlib" into a Terminal window
+plt = LazyModule("matplotlib.pyplot")
+# If numpy is not installed, type "pip3 install numpy" into a Terminal window
+# (It is installed along with matplotlib)
+np = LazyModule("numpy")
+
+
+# Make aliases for long class names for type-hinting
+PySerial = serial.Serial
+
+
+# Constants
+GRAPH_FRAME_RATE: float = 10.0 # Target number of live graph refreshes per second (semi-arbitrary)
+CSV_BUF_SIZE: int = 64*1024 # Number of bytes buffered before the CSV file is written to disk
+CSV_FLUSH_INTERVAL: float = 1.0 # Maximum number of seconds between CSV flushes (semi-arbitrary)
+PLOT_INIT_CAPACITY: int = 4096 # Initial number of points the live graph arrays can hold
+PLOT_MIN_BUCKETS: int = 100 # Minimum number of min/max buckets the drawn line is decimated into
+BIN_BUF_ROWS: int = 4096 # Number of rows buffered before the binary capture is written to disk
+BIN_EXT: str = ".bbd" # Extension of the binary capture (its metadata is in "<file>.bbd.json")
+# Extension added to the binary capture's name for its cell file (the cells that don't fit their
+# column's kind, one JSON array per line)
+BIN_CELLS_EXT: str = ".cells.jsonl"
+BIN_ROW_BYTES: int = 8 # Number of bytes each cell of a binary capture row takes (float64)
+BIN_FORMAT_NAME: str = "BB-DAQ capture"
+BIN_FORMAT_VERSION: int = 2
+RAW_LOG_MAGIC: bytes = b"BBRAW1\n" # Start of a raw serial log with receive times
+RAW_LOG_RECORD: struct.Struct = struct.Struct("<dI") # Receive time (s) and length of each line
+RAW_LOG_OPEN: int = 0xFFFFFFFF # Record length that marks the port being opened (no line bytes)
+RAW_LOG_EXT: str = ".raw"
+XLSX_MAX_ROWS: int = 1048576 # Number of rows an Excel worksheet can hold (including the header)
+CHART_MAX_POINTS: int = 8192 # Number of rows a sheet's chart shows directly (semi-arbitrary)
+CHART_SUMMARY_BUCKET: int = 16 # Number of rows in each bucket of a long sheet's chart summary
+CHART_SUMMARY_LEVEL: int = 256 # Number of chart summary buckets before the buckets double in size
+CHART_SHEET_SUFFIX: str = "_chart" # Suffix of the hidden sheet holding a chart summary
+MANIFEST_EXT: str = ".manifest.json" # Extension of the list of a run's sheets/files (segments)
+RAW_TAP_BUF_SIZE: int = 256*1024 # Number of bytes buffered before the raw log is written to disk
+RAW_TAP_FLUSH_INTERVAL: float = 1.0 # Maximum number of seconds between raw log flushes
+FRAME_BUF_SIZE: int = 4096 # Initial number of bytes the line framer can hold (it grows if needed)
+RATE_SAMPLE_INTERVALS: int = 5 # Number of intervals between data lines measured before the run
+RATE_SAMPLE_TIME: float = 2.0 # Maximum number of seconds spent measuring them (semi-arbitrary)
+RATE_WINDOW: int = 64 # Number of most recent intervals the data rate is estimated from
+RATE_UPDATE_INTERVAL: float = 1.0 # Number of seconds between data rate updates during the run
+RATE_TIMEOUT_FACTOR: float = 1.25 # Serial timeout as a multiple of the (jitter-padded) interval
+RATE_TIMEOUT_JITTERS: float = 4.0 # Number of jitters added to the interval for the timeout
+RATE_MIN_TIMEOUT: float = 0.05 # Minimum serial timeout in seconds, for bursts of data
+RATE_TIMEOUT_CHANGE: float = 0.2 # Relative change needed before the serial timeout is updated
+READ_QUEUE_SIZE: int = 10000 # Maximum number of lines waiting to be processed in threaded mode
+READER_JOIN_TIMEOUT: float = 2.0 # Maximum number of seconds to wait for the reader thread to end
+RECONNECT_TIMEOUT: float = 30.0 # Number of seconds to wait for a lost data stream to come back
+RECONNECT_POLL_INTERVAL: float = 0.25 # Number of seconds between checks for a lost port
+START_TIMEOUT: float = 60.0 # Number of seconds a headless run waits for the data to start
+START_POLL_INTERVAL: float = 0.5 # Serial timeout while waiting for it (so the wait can end)
+STATUS_INTERVAL: float = 0.5 # Number of seconds between redraws of the console status line
+DEFAULT_BUAD: int = 9600 # Buad rate of headless runs if none is given
+DEFAULT_SHEET_NAME: str = "Sheet1" # Sheet name of headless runs if none is given
+# Offset from the high-resolution monotonic clock to the Unix epoch, so lines are stamped with one
+# clock that can't jump (e.g., when the system clock is synced) but still gives the time of day
+RX_CLOCK_TO_EPOCH: float = time.time() - time.perf_counter()
+DATA_START_AFTER: str = "CLEARDATA"
+DATA_DELIM: str = ","
+# Spreadsheet name bad characters
+BAD_STARTS: set[str] = {"'"}
+BAD_ENDS: set[str] = {"'"}
+BAD_CHARS: set[str] = {"/", "\\", "?", "*", ":", "[", "]"}
+# Supported directives
+RESET_TIMER: str = "RESETTIMER"
+CLEAR_DATA: str = "CLEARDATA"
+# Supported row types
+DATA_ROW: str = "DATA"
+LABEL_ROW: str = "LABEL"
+MSG_ROW: str = "MSG"
+# Row written where the data stream restarted (only BB-DAQ writes it, so it isn't a key word)
+GAP_ROW: str = "GAP"
+# All supported key words
+KEY_WORDS: set[str] = {RESET_TIMER, CLEAR_DATA, DATA_ROW, LABEL_ROW, MSG_ROW}
+# Special data words
+TIME_WORD: str = "TIME"
+TIMER_WORD: str = "TIMER"
+DATE_WORD: str = "DATE"
+SPECIAL_WORDS: set[str] = {TIME_WORD, TIMER_WORD, DATE_WORD}
+# Every upper/lower-case spelling of the special data words (checking this set skips str.upper())
+SPECIAL_WORD_CASES: set[str] = {"".join(chars) for word in SPECIAL_WORDS \
+                                for chars in product(*zip(word.lower(), word.upper()))}
+# Names of the read modes of headless runs
+READ_MODE_NAMES: tuple[str, ...] = ("loop", "thread", "asyncio")
+# Row schema
+SCHEMA_SAMPLE_ROWS: int = 3 # Number of matching DATA rows needed to compile the row schema
+SCHEMA_MAX_MISSES: int = 3 # Number of deviating rows in a row before the schema is relearned
+
+
+# Enums
+class GraphChoice(Enum):
+    """
+    Enum representing the choices for viewing the data graph
+    """
+    LIVE = 0
+    EXCEL_ONLY = 1
+    NONE = 2
+
+
+# Names of the graph choices of headless runs
+GRAPH_CHOICE_NAMES: dict[str, GraphChoice] = {"live": GraphChoice.LIVE, \
+                                              "excel": GraphChoice.EXCEL_ONLY, \
+                                              "none": GraphChoice.NONE}
+
+
+class ColumnKind(Enum):
+    """
+    Enum representing how a column of DATA rows is converted
+    """
+    TEXT = 0
+    NUMBER = 1
+    TIME = 2
+    TIMER = 3
+    DATE = 4
+
+
+# Classes
+class ConsoleStatus():
+    """
+    Class that shows the progress of a run on one status line that is redrawn at a fixed interval,
+    instead of printing every line, so the time spent on console output doesn't grow with the data
+    rate (or stall the run when the console is slow, e.g., over SSH)
+    """
+
+    def __init__(self, interval:float=STATUS_INTERVAL, stream:TextIO=None) -> None:
+        """
+        This method is the constructor
+        @param self: Not needed in calls
+        @param interval: the number of seconds between redraws
+        @param stream: the text stream to write to (if None, sys.stdout is used)
+        @return: None
+        """
+        self.stream = sys.stdout if stream is None else stream
+        self.interval = interval
+        # A terminal redraws the same line, but anything else (e.g., a log file) gets one line each
+        self.is_tty = self.stream.isatty()
+        self.t_start = self.last_show = time.monotonic()
+        self.next_show = self.t_start + interval
+        self.num_lines = 0
+        self.num_lines_shown = 0 # Number of lines at the last redraw (for the recent rate)
+        self.num_timeouts = 0
+        self.last_line = ""
+        self.last_len = 0 # Length of the last status line, so a shorter one can cover it
+        # Several ports can share one status line, each counting its lines from its own thread
+        self.lock = threading.Lock()
+
+    def add_line(self, data_in:str) -> None:
+        """
+        This method counts a received line (an empty line is a serial timeout) and redraws the
+        status line if it is due
+        @param self: Not needed in calls
+        @param data_in: the decoded and stripped line of serial data
+        @return: None
+        """
+        with self.lock:
+            if data_in:
+                self.num_lines += 1
+                self.last_line = data_in
+            else:
+                self.num_timeouts += 1
+            if time.monotonic() >= self.next_show:
+                self.show()
+
+    def describe(self) -> str:
+        """
+        This method describes the progress of the run
+        @param self: Not needed in calls
+        @return: a string with the number of lines, the recent line rate, the number of timeouts,
+            the elapsed time, and the last line
+        """
+        now = time.monotonic()
+        rate = (self.num_lines - self.num_lines_shown)/max(now - self.last_show, 1e-9)
+        elapsed = int(now - self.t_start)
+        clock = f"{elapsed//3600:02d}:{elapsed//60 % 60:02d}:{elapsed % 60:02d}"
+        return f"{self.num_lines} lines | {rate:.1f} lines/s | {self.num_timeouts} timeouts | " \
+            f"{clock} | last: {self.last_line}"
+
+    def show(self) -> None:
+        """
+        This method redraws the status line
+        @param self: Not needed in calls
+        @return: None
+        """
+        text = self.describe()
+        self.last_show = time.monotonic()
+        self.next_show = self.last_show + self.interval
+        self.num_lines_shown = self.num_lines
+        if self.is_tty:
+            # Keep it on one line of the terminal, and cover the rest of the last status line
+            try:
+                text = text[:os.get_terminal_size(self.stream.fileno()).columns - 1]
+            except (OSError, ValueError):
+                pass
+            self.stream.write("\r" + text.ljust(self.last_len))
+            self.last_len = len(text)
+        else:
+            self.stream.write(text + "\n")
+        self.stream.flush()
+
+    def finish(self) -> None:
+        """
+        This method shows the final status and ends the status line
+        @param self: Not needed in calls
+        @return: None
+        """
+        self.show()
+        if self.is_tty:
+            self.stream.write("\n")
+            self.stream.flush()
+
+
+# Functions
+def read_rx_clock() -> float:
+    """
+    This function reads the clock that lines are stamped with when they are received
+    @return: the second count since the Unix epoch (monotonic and high-resolution)
+    """
+    return time.perf_counter() + RX_CLOCK_TO_EPOCH
+
+
+def is_num_str(x_str:str, num_type:type=float) -> bool:
+    """
+    This function checks if a string represents a specified numeric type (default: float)
+    @param x_str: the string supposedly representing a number
+    @param num_type: the numerical type to check for
+    @return: a boolean that is true if the string represents the specified numeric type
+    """
+    valid = True
+    try:
+        x_flt = float(x_str)
+        if num_type == int:
+            valid = int(x_flt) == x_flt
+    except (ValueError, TypeError):
+        valid = False
+    return valid
+
+
+def is_valid_sheet_name(sheet_name:str) -> bool:
+    """
+    This function checks a sheet name against Excel's sheet-naming rules (not counting duplicates)
+    @param sheet_name: the sheet name
+    @return: a boolean for whether the name can be used
+    """
+    len_name = len(sheet_name)
+    if (len_name > 32) or (len_name == 0):
+        return False
+    if sheet_name.lower() == "history":
+        return False
+    if (sheet_name[0] in BAD_STARTS) or (sheet_name[-1] in BAD_ENDS):
+        return False
+    return set(sheet_name).isdisjoint(BAD_CHARS)
+
+
+def get_int_input(prompt:str, l_bnd:int=None, u_bnd:int=None) -> int:
+    """
+    This function gets a valid integer input from the user
+    @param prompt: the string asking the user for an integer
+    @param l_bnd: lower bound (optional)
+    @param u_bnd: upper bound (optional)
+    @return: a valid integer
+    """
+    valid = False
+    while (not valid):
+        x = input(prompt).strip()
+        print(x)
+        if not is_num_str(x, int):
+            print("Error: Numeric input not an integer")
+            continue
+        x = int(x)
+        if l_bnd is None:
+            l_bnd = x
+        if u_bnd is None:
+            u_bnd = x
+        valid = (l_bnd <= x <= u_bnd)
+        if not valid:
+            print(f"Error: Integer out of range [{l_bnd},{u_bnd}]")
+    return x
+
+
+def get_int_list_input(prompt:str, l_bnd:int, u_bnd:int) -> list[int]:
+    """
+    This function gets a valid list of comma-separated integers from the user
+    @param prompt: the string asking the user for the integers
+    @param l_bnd: lower bound of each integer
+    @param u_bnd: upper bound of each integer
+    @return: a list of at least one valid integer
+    """
+    while True:
+        x_strs = [x.strip() for x in input(prompt).split(",")]
+        print(", ".join(x_strs))
+        if not all(is_num_str(x, int) for x in x_strs):
+            print("Error: Numeric input not a list of integers")
+            continue
+        xs = [int(x) for x in x_strs]
+        if all(l_bnd <= x <= u_bnd for x in xs):
+            return xs
+        print(f"Error: Integer out of range [{l_bnd},{u_bnd}]")
+
+
+def resolve_dup_file(filepath:str, ext:str) -> str:
+    """
+    This function prompts the user to either overwrite the specified file or enter another file
+    name
+    @param filepath: the path to the desired file, including the extension
+    @param ext: the file extension
+    @return: the final file name, including the extension
+    """
+    file_overwrite = False
+    retry_prompt = f"Enter another workbook/file name or path (without the '{ext}' at the end): "
+    while os.path.exists(filepath) and (not file_overwrite):
+        print("This file already exists:", filepath)
+        file_overwrite = input("Do you wish to overwrite it? ('y'/'n'): ").upper() == "Y"
+        if not file_overwrite:
+            raw_file = input(retry_prompt)
+            filepath = os.path.normpath(raw_file + ext)
+    # Make sure the directory exists
+    file_dir = os.path.split(filepath)[0]
+    if file_dir != "":
+        # Using the following os methods on "" would throw errors
+        if (not os.path.exists(file_dir)):
+            os.makedirs(file_dir)
+    return filepath
+
+
+def get_file_name(save_as_xlsx:bool, save_as_bin:bool=False) -> str:
+    """
+    This function gets a valid file name from the user
+    @param save_as_xlsx: a boolean that determines the file extension (true:".xlsx", false:".csv")
+    @param save_as_bin: a boolean for the binary capture extension (BIN_EXT), which takes priority
+    @return: the final file name, including the extension
+    """
+    raw_file = input("Enter workbook/file name or path (without the file-specific extension): ")
+    file_name = os.path.normpath(raw_file)
+    if save_as_bin:
+        ext = BIN_EXT
+    else:
+        ext = ".xlsx" if save_as_xlsx else ".csv"
+    file_name += ext
+    file_name = resolve_dup_file(file_name, ext)
+    return file_name
@@ -0,0 +1,633 @@
+'''
+The output file of BB-DAQ (Excel workbook, CSV file, or binary capture), and the export
+of binary captures
+'''
+
+from __future__ import annotations
+# Python has a built-in os library
+import os
+# Python has a built-in datetime library
+from datetime import date, datetime, time as dt_time
+# Python has a built-in time library
+import time
+# Python has a built-in typing library
+from typing import TYPE_CHECKING, TextIO
+if TYPE_CHECKING:
+    from xlsxwriter import Workbook as XlsxWkbk
+    from xlsxwriter.format import Format as XlsxFormat
+    from xlsxwriter.worksheet import Worksheet as XlsxSheet
+if __package__:
+    from .bb_common import (xlsxwriter, np, CSV_BUF_SIZE, CSV_FLUSH_INTERVAL, BIN_ROW_BYTES,
+                            MANIFEST_EXT, DATA_DELIM, ColumnKind, is_valid_sheet_name)
+    from .bb_capture import RowSchema, BinaryCapture, Rollover, ChartSummary, load_capture
+else:
+    # pylint: disable=import-error
+    from bb_common import (xlsxwriter, np, CSV_BUF_SIZE, CSV_FLUSH_INTERVAL, BIN_ROW_BYTES,
+                           MANIFEST_EXT, DATA_DELIM, ColumnKind, is_valid_sheet_name)
+    from bb_capture import RowSchema, BinaryCapture, Rollover, ChartSummary, load_capture
+
+
+# Classes
+class CsvWriter():
+    """
+    Class containing the buffered handle to a CSV file
+    (The file is kept open for the whole run so that each row is an in-memory append)
+    """
+
+    def __init__(self, buf_size:int=CSV_BUF_SIZE) -> None:
+        """
+        This method is the constructor (the file isn't opened until open() is called)
+        @param self: Not needed in calls
+        @param buf_size: the number of bytes to buffer before writing to disk
+        @return: None
+        """
+        self.file:TextIO = None
+        self.buf_size = buf_size
+        self.last_flush = time.monotonic()
+        self.num_bytes = 0 # Number of bytes written to the file
+        # Number of extra bytes each newline takes on the disk (e.g., 1 for "\r\n" on Windows)
+        self.newline_extra = len(os.linesep) - 1
+
+    def open(self, file_name:str, append:bool=True) -> None:
+        """
+        This method (re)opens the handle to the file
+        @param self: Not needed in calls
+        @param file_name: the name of the CSV file
+        @param append: a boolean for the file writing mode (false will clear the file)
+        @return: None
+        """
+        self.close()
+        opt = "at" if append else "wt"
+        if not append:
+            self.num_bytes = 0
+        # The handle is closed in close(), so a with-statement can't be used here
+        self.file = open(file_name, mode=opt, encoding='utf-8', \
+                         buffering=self.buf_size) # pylint: disable=consider-using-with
+        self.last_flush = time.monotonic()
+
+    def write(self, text:str) -> None:
+        """
+        This method appends text to the file (it must be open)
+        @param self: Not needed in calls
+        @param text: the text
+        @return: None
+        """
+        self.file.write(text)
+        # The file is UTF-8, so anything that isn't ASCII takes more bytes than characters
+        self.num_bytes += len(text) if text.isascii() else len(text.encode("utf-8"))
+        if self.newline_extra:
+            self.num_bytes += self.newline_extra*text.count("\n")
+
+    def flush(self) -> None:
+        """
+        This method writes any buffered text to the disk IFF the file is open
+        @param self: Not needed in calls
+        @return: None
+        """
+        if self.file is None:
+            return
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def close(self) -> None:
+        """
+        This method flushes and closes the file IFF it is open
+        @param self: Not needed in calls
+        @return: None
+        """
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+
+
+class FileData():
+    """
+    Class containing file-related data
+    """
+
+    def __init__(self, save_as_xlsx:bool, file_name:str, header_txt:str, \
+                 csv_buf_size:int=CSV_BUF_SIZE, flush_interval:float=CSV_FLUSH_INTERVAL, \
+                 save_as_bin:bool=False, *, rollover:Rollover=None) -> None:
+        """
+        This method is the constructor
+        @param self: Not needed in calls
+        @param save_as_xlsx: a boolean for the file extension (true:".xlsx", false:".csv")
+        @param file_name: the name of the file that the data will be written to
+        @param header_txt: the joined delimeter-separated values that make up the header
+        @param csv_buf_size: the number of bytes to buffer before writing to disk (only for CSV)
+        @param flush_interval: the maximum number of seconds between flushes (only for CSV and
+            binary captures, and 0 will flush after every row)
+        @param save_as_bin: a boolean for saving a binary capture (BIN_EXT) instead, which takes
+            priority over save_as_xlsx
+        @param rollover: the Rollover that splits long runs into several sheets/files (if None,
+            only full Excel sheets are rolled over)
+        @return: None
+        """
+        # Define parameters based on user choice
+        self.file_name = file_name
+        self.is_bin = save_as_bin
+        self.is_xlsx = save_as_xlsx and (not save_as_bin)
+        self.header_txt = header_txt
+        self.row_num = 0
+        self.row_schema = RowSchema(header_txt)
+        self.csv = CsvWriter(csv_buf_size)
+        self.flush_interval = flush_interval
+        # Rollover (an Excel sheet can't hold more than XLSX_MAX_ROWS rows)
+        if (rollover is None) and self.is_xlsx:
+            rollover = Rollover()
+        self.rollover = rollover
+        # Graph columns (x and a list of y) charted on each sheet, and the chart summary of the
+        # current sheet
+        self.chart_cols:tuple[int, list[int]] = None
+        self.summary:ChartSummary = None
+        if rollover is not None:
+            rollover.manifest_name = os.path.splitext(file_name)[0] + MANIFEST_EXT
+            rollover.header_txt = header_txt
+            if not self.is_xlsx: # The first sheet starts the first segment of a workbook
+                rollover.start_segment(file_name)
+        self.capture:BinaryCapture = None
+        # Excel formats of the TIME, TIMER, and DATE cells
+        self.formats:dict[ColumnKind, XlsxFormat] = {}
+        if self.is_bin:
+            self.capture = BinaryCapture(file_name, header_txt, flush_interval, self.row_schema)
+        elif self.is_xlsx:
+            self.workbook:XlsxWkbk = None
+            self.curr_sheet:XlsxSheet = None
+            self.create_workbook(file_name) # Populates self.workbook
+            self.add_workbook_formats()
+        else:
+            # Clear the text file
+            self.write_to_file("", append=False)
+
+    def add_workbook_formats(self):
+        """
+        This method adds the Format objects for specific cells
+        """
+        self.formats = {ColumnKind.TIME: self.workbook.add_format({'num_format': 'hh:mm:ss.000'}),
+                        ColumnKind.TIMER: self.workbook.add_format({'num_format': '0.00'}),
+                        ColumnKind.DATE: self.workbook.add_format({'num_format': 'mm-dd-yyyy'})}
+
+    def write_to_file(self, text:str|float|list[str], col:int=0, cell_fmt:XlsxFormat=None, \
+                      inc_row_num:bool=False, append:bool=True) -> None:
+        """
+        This method writes text (or a row of text) to the file/sheet
+        @param self: Not needed in calls
+        @param text: the single string or list of text
+        @param col: the column in the sheet to start writing at (only for Excel)
+        @param cell_fmt: the format for the single cell (only for Excel)
+        @param inc_row_num: a boolean for incrementing the current row number (only for Excel)
+        @param append: a boolean for the CSV file writing mode (only for CSV)
+        @return: None
+        """
+        is_list = isinstance(text, list)
+        if self.is_bin:
+            # Only whole rows (LABEL rows) are kept, since the header is in the metadata
+            if is_list:
+                self.capture.add_label(DATA_DELIM.join(text))
+        elif self.is_xlsx:
+            if is_list:
+                self.curr_sheet.write_row(self.row_num, col, text)
+            else:
+                self.curr_sheet.write(self.row_num, col, text, cell_fmt)
+        else:
+            if is_list:
+                text = ",".join(text) + "\n" # DATA_DELIM may not always be a comma
+            if (not append) or (self.csv.file is None):
+                self.open_csv_file(append)
+            self.csv.write(text)
+            self.flush_if_due()
+        self.row_num += 1 if inc_row_num else 0
+
+    def write_header(self) -> None:
+        """
+        This method writes the header row to the file/sheet (a binary capture keeps the header in
+        its metadata, so only the row number is incremented)
+        @param self: Not needed in calls
+        @return: None
+        """
+        if self.is_bin:
+            self.row_num += 1
+            return
+        self.write_to_file(self.header_txt.split(DATA_DELIM), inc_row_num=True)
+
+    def write_bin_row(self, cells:list[tuple[ColumnKind, float|str]]) -> None:
+        """
+        This method writes a row of (kind, value) cells to the capture IFF the file is a binary
+        capture (the row number is not incremented)
+        @param self: Not needed in calls
+        @param cells: the (kind, value) tuple of each cell (see BinaryCapture.write_row())
+        @return: None
+        """
+        if not self.is_bin:
+            return
+        self.capture.write_row(cells)
+
+    def add_timer_reset(self, timer_t0:float) -> None:
+        """
+        This method saves a timer reset IFF the file is a binary capture (other files only show
+        the reset through the TIMER values)
+        @param self: Not needed in calls
+        @param timer_t0: the new reference second count for the timer
+        @return: None
+        """
+        if not self.is_bin:
+            return
+        self.capture.add_timer_reset(timer_t0)
+
+    def write_typed_row(self, nums:list[tuple[int, float, XlsxFormat]], \
+                        dates:list[tuple[int, date|dt_time, XlsxFormat]], \
+                        strs:list[tuple[int, str]]) -> None:
+        """
+        This method writes a row of already-typed cells to the current sheet IFF the file is a
+        workbook (the row number is not incremented)
+        @param self: Not needed in calls
+        @param nums: the (column, number, format) tuples of the row
+        @param dates: the (column, date or time, format) tuples of the row
+        @param strs: the (column, text) tuples of the row (empty text is skipped by the caller)
+        @return: None
+        """
+        if not self.is_xlsx:
+            return
+        if self.chart_cols is not None:
+            if self.summary is None:
+                (time_col_ind, data_col_inds) = self.chart_cols
+                self.summary = ChartSummary(self.workbook, self.curr_sheet.name, \
+                                            self.header_txt.split(DATA_DELIM), \
+                                            [time_col_ind, *data_col_inds])
+            self.summary.add_row(nums, dates)
+        row_num = self.row_num
+        sheet = self.curr_sheet
+        write_number = sheet.write_number
+        for (col, num, cell_fmt) in nums:
+            write_number(row_num, col, num, cell_fmt)
+        write_datetime = sheet.write_datetime
+        for (col, date_val, cell_fmt) in dates:
+            write_datetime(row_num, col, date_val, cell_fmt)
+        write_string = sheet.write_string
+        for (col, text) in strs:
+            write_string(row_num, col, text)
+
+    def open_csv_file(self, append:bool=True) -> None:
+        """
+        This method (re)opens the buffered handle to the CSV file IFF the file is a CSV file
+        @param self: Not needed in calls
+        @param append: a boolean for the file writing mode (false will clear the file)
+        @return: None
+        """
+        if self.is_xlsx or self.is_bin:
+            return
+        self.csv.open(self.file_name, append)
+
+    def flush_if_due(self) -> None:
+        """
+        This method flushes the CSV file if the flush interval has passed since the last flush
+        (The write buffer itself takes care of size-based flushes)
+        @param self: Not needed in calls
+        @return: None
+        """
+        if time.monotonic() - self.csv.last_flush >= self.flush_interval:
+            self.flush_file()
+
+    def flush_file(self) -> None:
+        """
+        This method writes any buffered text to the disk IFF the CSV file is open
+        @param self: Not needed in calls
+        @return: None
+        """
+        if self.is_bin:
+            self.capture.flush()
+        self.csv.flush()
+
+    def add_formatted_sheet(self, valid_sheet_name:str=None, new_run:bool=True) -> str:
+        """
+        This method adds a formatted sheet to the workbook IFF the file is a workbook
+        @param self: Not needed in calls
+        @param valid_sheet_name: a valid sheet name (this argument is used internally)
+        @param new_run: a boolean for the sheet starting a run (false when a run rolls over)
+        @return: the sheet name
+        """
+        if not self.is_xlsx:
+            return None
+        if valid_sheet_name is None:
+            valid_sheet_name = self.get_valid_sheet_name()
+        self.curr_sheet = self.workbook.add_worksheet(valid_sheet_name)
+        self.summary = None # Made by the first DATA row if the sheet is charted
+        # Make sure the row number is 0 (especially if switching sheets)
+        self.row_num = 0
+        # Make columns 1 and 3 (0-indexed) wider
+        # (This formatting is for BB-DAQ's original purpose, so feel free to change it)
+        self.curr_sheet.set_column(1, 1, 15)
+        self.curr_sheet.set_column(3, 3, 15)
+        if self.rollover is not None:
+            self.rollover.start_segment(self.file_name, valid_sheet_name, new_run)
+        return valid_sheet_name
+
+    def get_valid_sheet_name(self) -> str:
+        """
+        This method gets a valid sheet name from the user IFF the file is a workbook
+        @param self: Not needed in calls
+        @return: the sheet name
+        """
+        if not self.is_xlsx:
+            return None
+        print("\nRefer to the following website for sheet-naming rules:")
+        print("https://support.microsoft.com/en-us/office/rename-a-worksheet-3f1f7148-" \
+            "ee83-404d-8ef0-9ff99fbad1f9\n")
+        sheet_prompt = "Enter valid sheet name: "
+        is_good_name = False
+        # Make sure no duplicates
+        all_sheet_names:set[str] = self.workbook.sheetnames.keys()
+        all_sheet_names = set(name.upper() for name in all_sheet_names)
+        while not is_good_name:
+            sheet_name = input(sheet_prompt).strip()
+            if sheet_name.upper() in all_sheet_names:
+                print("There is already a sheet by that name (case-insensitive)")
+                continue
+            is_good_name = is_valid_sheet_name(sheet_name)
+        return sheet_name
+
+    def add_chart_to_sheet(self, time_col_ind:int, data_col_inds:int|list[int]) -> None:
+        """
+        This method adds a chart to the current sheet IFF the file is a workbook
+        (A sheet with a chart summary charts the summary instead of every row, see ChartSummary)
+        @param self: Not needed in calls
+        @param time_col_ind: the index (0-based) of the time column ("x"), used for graphing
+        @param data_col_inds: the index (0-based) of the data column ("y"), or a list of them for
+            several series, used for graphing
+        @return: None
+        """
+        if not self.is_xlsx:
+            return
+        if isinstance(data_col_inds, int):
+            data_col_inds = [data_col_inds]
+        sheet_name = self.curr_sheet.name # To save steps since used a lot
+        # Cell ranges are given as [sheet, first row, first column, last row, last column] (all
+        # 0-based), so xlsxwriter handles the column letters and any quoting of the sheet name
+        summary = self.summary
+        if (summary is None) or (summary.cols != [time_col_ind, *data_col_inds]):
+            summary = None # The summary is of other columns
+        else:
+            summary.finish()
+        if (summary is not None) and (summary.sheet is not None):
+            # The summary's rows are unevenly spaced, so their x values are plotted as numbers
+            chart = self.workbook.add_chart({'type': 'scatter', 'subtype': 'straight'})
+            (src_name, last_row) = (summary.sheet.name, summary.num_rows - 1)
+            (x_src, y_srcs) = (0, range(1, len(data_col_inds) + 1))
+        else:
+            chart = self.workbook.add_chart({'type': 'line'})
+            (src_name, last_row) = (sheet_name, self.row_num - 1)
+            (x_src, y_srcs) = (time_col_ind, data_col_inds)
+        for (data_col_ind, y_src) in zip(data_col_inds, y_srcs):
+            chart.add_series({
+                'name':       [sheet_name, 0, data_col_ind],
+                'categories': [src_name, 1, x_src, last_row, x_src],
+                'values':     [src_name, 1, y_src, last_row, y_src],
+            })
+        chart.set_x_axis({'name': [sheet_name, 0, time_col_ind]})
+        if len(data_col_inds) == 1:
+            chart.set_y_axis({'name': [sheet_name, 0, data_col_inds[0]]})
+            chart.set_legend({'none': True})
+        else:
+            # The legend tells the series apart
+            chart.set_legend({'position': 'bottom'})
+        # Insert the chart into the worksheet (in the second row, one column after the header)
+        num_header_cols = len(self.header_txt.split(DATA_DELIM))
+        self.curr_sheet.insert_chart(1, num_header_cols + 1, chart)
+
+    def reset_current_page(self) -> None:
+        """
+        This method resets the CSV file or Excel sheet (not the whole workbook), and prints the
+        header again to replicate PLX-DAQ's "CLEARDATA"
+        @param self: Not needed in calls
+        @return: None
+        """
+        if self.is_bin:
+            # Keep the earlier rows, but mark the start of a new page
+            self.capture.new_segment()
+        elif self.is_xlsx:
+            # Re-create sheet by deleting and adding it (its segment is cleared below instead of
+            # starting a new one)
+            sheet_name = self.curr_sheet.name
+            self.workbook.worksheets().remove(self.curr_sheet)
+            self.curr_sheet = None
+            if (self.summary is not None) and (self.summary.sheet is not None):
+                self.workbook.worksheets().remove(self.summary.sheet)
+            rollover = self.rollover
+            self.rollover = None
+            self.add_formatted_sheet(sheet_name)
+            self.rollover = rollover
+            # Write header
+            self.write_to_file(self.header_txt.split(DATA_DELIM))
+        else:
+            self.write_to_file(f"{self.header_txt}\n", append=False)
+        self.row_num = 1
+        # The binary capture keeps the earlier rows
+        if (self.rollover is not None) and (not self.is_bin):
+            self.rollover.clear_segment()
+
+    def create_workbook(self, file_name:str) -> None:
+        """
+        This method creates a workbook IFF the file is a workbook
+        @param self: Not needed in calls
+        @param file_name: The file path of the workbook to be made
+        @return: None
+        """
+        if not self.is_xlsx:
+            return
+        self.workbook = xlsxwriter.Workbook(file_name, {'constant_memory': True})
+
+    def close_workbook(self) -> None:
+        """
+        This method closes the workbook (or the CSV file or binary capture if the file is not a
+        workbook)
+        @param self: Not needed in calls
+        @return: None
+        """
+        if self.rollover is not None:
+            self.rollover.write_manifest()
+        if self.is_bin:
+            self.capture.close()
+            return
+        if not self.is_xlsx:
+            self.csv.close()
+            return
+        self.workbook.close()
+
+    def switch_to_new_file(self, new_file_name:str, new_run:bool=True) -> None:
+        """
+        This method switches the file/workbook while preserving the other attributes
+        @param self: Not needed in calls
+        @param new_file_name: The file path of the file to switch to
+        @param new_run: a boolean for the file starting a run (false when a run rolls over)
+        @return: None
+        """
+        self.file_name = new_file_name
+        self.row_num = 0
+        if self.is_bin:
+            self.capture.close()
+            self.capture = BinaryCapture(new_file_name, self.header_txt, self.flush_interval, \
+                                         self.row_schema)
+        elif self.is_xlsx:
+            self.close_workbook()
+            self.create_workbook(new_file_name)
+            self.add_workbook_formats()
+        else:
+            # Start the new file from scratch (the user already confirmed any overwrite)
+            self.open_csv_file(append=False)
+        # The first sheet starts the first segment of a workbook
+        if (self.rollover is not None) and (not self.is_xlsx):
+            self.rollover.start_segment(new_file_name, new_run=new_run)
+
+    def get_num_bytes(self) -> int:
+        """
+        This method gets the number of bytes written to the CSV file or binary capture (a
+        workbook's size isn't known until it is closed)
+        @param self: Not needed in calls
+        @return: the number of bytes (0 for a workbook)
+        """
+        if self.is_bin:
+            return self.capture.num_rows*self.capture.num_cols*BIN_ROW_BYTES
+        return 0 if self.is_xlsx else self.csv.num_bytes
+
+    def get_run_rows(self) -> int:
+        """
+        This method gets the number of rows written by the run so far (over all of its segments)
+        @param self: Not needed in calls
+        @return: the number of rows after the header of each segment
+        """
+        rolled_rows = 0 if self.rollover is None else self.rollover.rolled_rows
+        return rolled_rows + self.row_num - 1
+
+    def roll_over_if_due(self, rx_time:float, timer_t0:float) -> None:
+        """
+        This method continues the run in a new sheet/file IFF the current one is full, and counts
+        the next DATA row in the manifest
+        @param self: Not needed in calls
+        @param rx_time: the second count when the next DATA row was received
+        @param timer_t0: the reference second count for the timer
+        @return: None
+        """
+        rollover = self.rollover
+        if rollover is None:
+            return
+        if rollover.is_due(self, rx_time):
+            self.roll_over()
+        rollover.add_row(rx_time, timer_t0)
+
+    def roll_over(self) -> None:
+        """
+        This method continues the run in a new sheet (for a workbook) or a new numbered file, with
+        the header written again
+        @param self: Not needed in calls
+        @return: None
+        """
+        self.rollover.rolled_rows += self.row_num - 1
+        if self.is_xlsx:
+            if self.chart_cols is not None:
+                self.add_chart_to_sheet(*self.chart_cols)
+            where = self.add_formatted_sheet(self.rollover.get_sheet_name(self.workbook.sheetnames),
+                                             new_run=False)
+        else:
+            where = self.rollover.get_file_name()
+            self.switch_to_new_file(where, new_run=False)
+        self.write_header()
+        self.rollover.write_manifest()
+        print(f"\nContinuing in {where}")
+
+
+# Functions
+def format_capture_number(num:float) -> str:
+    """
+    This function formats a number from a binary capture for a CSV file
+    (The original text isn't saved, so whole numbers lose trailing zeros, like "2.00" -> "2")
+    @param num: the number
+    @return: the string representing the number
+    """
+    return str(int(num)) if num.is_integer() else repr(float(num))
+
+
+def write_capture_row(file_struct:FileData, cells:dict[int, tuple[ColumnKind, float|str]]) \
+        -> None:
+    """
+    This function writes a DATA row from a binary capture to an Excel sheet or CSV file
+    @param file_struct: the FileData object containing the file-related information
+    @param cells: the (kind, value) tuple of each column (TIME and DATE are second counts)
+    @return: None
+    """
+    if file_struct.is_xlsx:
+        nums = []
+        dates = []
+        strs = []
+        for (col, (kind, value)) in cells.items():
+            if kind == ColumnKind.NUMBER:
+                nums.append((col, value, None))
+            elif kind == ColumnKind.TIMER:
+                nums.append((col, value, file_struct.formats[kind]))
+            elif kind == ColumnKind.TIME:
+                dates.append((col, datetime.fromtimestamp(value).time(), file_struct.formats[kind]))
+            elif kind == ColumnKind.DATE:
+                dates.append((col, datetime.fromtimestamp(value).date(), file_struct.formats[kind]))
+            elif value:
+                strs.append((col, value))
+        file_struct.write_typed_row(nums, dates, strs)
+    else:
+        row = [""]*(max(cells, default=-1) + 1)
+        for (col, (kind, value)) in cells.items():
+            if kind == ColumnKind.NUMBER:
+                row[col] = format_capture_number(value)
+            elif kind == ColumnKind.TIMER:
+                row[col] = str(value)
+            elif kind == ColumnKind.TIME:
+                row[col] = str(datetime.fromtimestamp(value).time())
+            elif kind == ColumnKind.DATE:
+                row[col] = str(datetime.fromtimestamp(value).date())
+            else:
+                row[col] = value or ""
+        file_struct.write_to_file(row)
+    file_struct.row_num += 1
+
+
+def export_capture(file_name:str, out_name:str) -> None:
+    """
+    This function exports a binary capture to an Excel workbook or CSV file (chosen by the
+    extension of out_name), with a sheet (or numbered CSV file) for each segment of the capture
+    @param file_name: the name of the capture file
+    @param out_name: the name of the output file, including the extension
+    @return: None
+    """
+    (meta, data) = load_capture(file_name)
+    kinds = [ColumnKind[name] for name in (meta["column_kinds"] or [])]
+    col_text = meta["column_text"]
+    extra_cells:dict[int, list[tuple[int, ColumnKind, float|str]]] = {}
+    for (row_ind, col, kind_name, value) in meta["cells"]:
+        extra_cells.setdefault(row_ind, []).append((col, ColumnKind[kind_name], value))
+    labels:dict[tuple[int, int], list[str]] = {}
+    for (seg_ind, row_ind, text) in meta["labels"]:
+        labels.setdefault((seg_ind, row_ind), []).append(text)
+    save_as_xlsx = out_name.lower().endswith(".xlsx")
+    file_struct = FileData(save_as_xlsx, out_name, meta["header_txt"])
+    (out_root, out_ext) = os.path.splitext(out_name)
+    starts = meta["segments"]
+    ends = starts[1:] + [len(data)]
+    for (seg_ind, (start, end)) in enumerate(zip(starts, ends)):
+        if save_as_xlsx:
+            file_struct.add_formatted_sheet(f"Segment_{seg_ind + 1}")
+        elif seg_ind > 0:
+            file_struct.switch_to_new_file(f"{out_root}_{seg_ind + 1}{out_ext}")
+        file_struct.write_header()
+        for row_ind in range(start, min(end, len(data)) + 1):
+            for text in labels.get((seg_ind, row_ind), []):
+                file_struct.write_to_file(text.split(DATA_DELIM), inc_row_num=True)
+            if row_ind >= min(end, len(data)):
+                break # Only the labels after the last row are left
+            values = data[row_ind]
+            # A NaN is a cell that the row didn't have (or that is in the cell file)
+            cells = {col: (kind, col_text[col] if kind == ColumnKind.TEXT else float(values[col])) \
+                     for (col, kind) in enumerate(kinds) \
+                     if (kind == ColumnKind.TEXT) or not np.isnan(values[col])}
+            for (col, kind, value) in extra_cells.get(row_ind, []):
+                cells[col] = (kind, value)
+            write_capture_row(file_struct, cells)
+    file_struct.close_workbook()
+    print(f"Exported {len(data)} rows from {file_name} to {out_name}")
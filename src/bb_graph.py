@@ -0,0 +1,490 @@
+'''
+The live graph of BB-DAQ
+'''
+
+from __future__ import annotations
+# Python has a built-in datetime library
+from datetime import time as dt_time
+# Python has a built-in time library
+import time
+# Python has a built-in typing library
+from typing import TYPE_CHECKING, Callable
+if TYPE_CHECKING:
+    from matplotlib.axes import Axes as PltAxes
+    from matplotlib.lines import Line2D as PltLine
+if __package__:
+    from .bb_common import (plt, np, GRAPH_FRAME_RATE, PLOT_INIT_CAPACITY, PLOT_MIN_BUCKETS,
+                            GraphChoice)
+else:
+    # pylint: disable=import-error
+    from bb_common import (plt, np, GRAPH_FRAME_RATE, PLOT_INIT_CAPACITY, PLOT_MIN_BUCKETS,
+                           GraphChoice)
+
+
+class PlotPoints():
+    """
+    Class containing the points of the live graph
+    (A point of every series is kept in one row of a growable 2-D NumPy array, with the x values in
+    column 0 and the y values of each series after it)
+    """
+
+    def __init__(self, num_series:int, *, rolling_samples:int=0, rolling_span:float=0.0) -> None:
+        """
+        This method is the constructor
+        @param self: Not needed in calls
+        @param num_series: the number of y columns
+        @param rolling_samples: the number of most recent points to show (0 shows all of them)
+        @param rolling_span: the x-axis span of the most recent points to show (0 shows all of
+            them, and the x-axis values are assumed to be increasing)
+        @return: None
+        """
+        self.rolling_samples = rolling_samples
+        self.rolling_span = rolling_span
+        # Preallocated points (num_points rows of the capacity are used)
+        self.data = np.empty((PLOT_INIT_CAPACITY, 1 + num_series))
+        self.num_points = 0
+
+    def is_rolling(self) -> bool:
+        """
+        This method checks if only the most recent points are shown
+        @param self: Not needed in calls
+        @return: a boolean that is true if there is a rolling window
+        """
+        return (self.rolling_samples > 0) or (self.rolling_span > 0)
+
+    def add(self, x:float, ys:tuple[float, ...]) -> None:
+        """
+        This method adds a point of every series
+        @param self: Not needed in calls
+        @param x: x value
+        @param ys: y value of each series
+        @return: None
+        """
+        if self.num_points == len(self.data):
+            self.make_room()
+        point = self.data[self.num_points]
+        point[0] = x
+        point[1:] = ys
+        self.num_points += 1
+
+    def make_room(self) -> None:
+        """
+        This method makes room for more points, either by dropping points outside of the rolling
+        window or by doubling the capacity of the array
+        @param self: Not needed in calls
+        @return: None
+        """
+        start = self.get_visible_start()
+        if start > 0:
+            # Shift the visible points to the front (the capacity is at least twice the window)
+            num_kept = self.num_points - start
+            self.data[:num_kept] = self.data[start:self.num_points]
+            self.num_points = num_kept
+        if self.num_points > len(self.data)//2:
+            self.data = np.resize(self.data, (2*len(self.data), self.data.shape[1]))
+
+    def get_visible_start(self) -> int:
+        """
+        This method finds the index of the first point in the rolling window
+        @param self: Not needed in calls
+        @return: the index (0 if there is no rolling window)
+        """
+        start = 0
+        if self.rolling_samples > 0:
+            start = max(0, self.num_points - self.rolling_samples)
+        if (self.rolling_span > 0) and (self.num_points > 0):
+            x_min = self.data[self.num_points - 1, 0] - self.rolling_span
+            x_used = self.data[start:self.num_points, 0]
+            start += int(np.searchsorted(x_used, x_min, side="left"))
+        return start
+
+    def visible(self) -> np.ndarray:
+        """
+        This method gets the points in the rolling window
+        @param self: Not needed in calls
+        @return: a view of the visible rows
+        """
+        return self.data[self.get_visible_start():self.num_points]
+
+    def clear(self) -> None:
+        """
+        This method empties the points (the capacity is kept)
+        @param self: Not needed in calls
+        @return: None
+        """
+        self.num_points = 0
+
+
+class LiveFigure():
+    """
+    Class containing the matplotlib figure of the live graph
+    (The lines are animated, so they can be blitted over a cached background of the axes)
+    """
+
+    def __init__(self, num_series:int, stacked:bool, on_key_press:Callable[[object], None]) \
+            -> None:
+        """
+        This method is the constructor
+        @param self: Not needed in calls
+        @param num_series: the number of lines
+        @param stacked: a boolean for drawing each line on its own axes (with the x-axis shared)
+        @param on_key_press: the function called with the KeyEvent when a key is pressed while the
+            graph is selected
+        @return: None
+        """
+        plt.ion() # Figures made in interactive mode are shown without blocking
+        (self.fig, axes) = plt.subplots(num_series if stacked else 1, 1, sharex=True, \
+                                        squeeze=False)
+        self.axes:list[PltAxes] = list(axes[:, 0])
+        self.fig.canvas.mpl_connect('key_press_event', on_key_press)
+        self.lines:list[PltLine] = []
+        for ind in range(num_series):
+            ax = self.axes[ind if stacked else 0]
+            color = "b" if num_series == 1 else f"C{ind}"
+            self.lines.append(ax.plot([], [], "-", color=color, animated=True)[0])
+        self.use_blit = self.fig.canvas.supports_blit
+        # One axes is blitted by itself, but several are blitted with the whole figure
+        self.blit_bbox = self.axes[0].bbox if len(self.axes) == 1 else self.fig.bbox
+        self.background = None
+        self.fig.canvas.draw()
+
+    def redraw(self, full:bool) -> None:
+        """
+        This method redraws the lines in one pass, blitting them over the cached background when
+        possible
+        @param self: Not needed in calls
+        @param full: a boolean for redrawing the whole figure (and recaching the background)
+        @return: None
+        """
+        canvas = self.fig.canvas
+        if full or (not self.use_blit) or (self.background is None):
+            canvas.draw()
+            if self.use_blit:
+                self.background = canvas.copy_from_bbox(self.blit_bbox)
+        else:
+            canvas.restore_region(self.background)
+        for line in self.lines:
+            line.axes.draw_artist(line)
+        if self.use_blit:
+            canvas.blit(self.blit_bbox)
+
+    def clear_lines(self) -> None:
+        """
+        This method removes the points of every line (the lines themselves are kept)
+        @param self: Not needed in calls
+        @return: None
+        """
+        for line in self.lines:
+            line.set_data([], [])
+
+    def reset_axes(self) -> None:
+        """
+        This method empties the lines and autoscales the axes (while preserving labels)
+        @param self: Not needed in calls
+        @return: None
+        """
+        self.clear_lines()
+        for ax in self.axes:
+            ax.relim()
+            ax.autoscale()
+        self.background = None
+
+    def close(self) -> None:
+        """
+        This method closes the figure
+        @param self: Not needed in calls
+        @return: None
+        """
+        plt.ioff()
+        for ax in self.axes:
+            plt.delaxes(ax)
+        plt.pause(0.01)
+        plt.close(self.fig)
+
+
+class GraphData():
+    """
+    Class containing graph-related data
+    (The live graph reuses one line per data column, whose points are kept in a PlotPoints object,
+    and only a min/max summary of the visible points is drawn once there are more of them than
+    pixels)
+    """
+
+    def __init__(self, user_gc:GraphChoice, time_col_ind:int, data_col_inds:int|list[int], \
+                 frame_rate:float=GRAPH_FRAME_RATE, *, rolling_samples:int=0, \
+                 rolling_span:float=0.0, stacked:bool=False) -> None:
+        """
+        This method is the constructor
+        @param self: Not needed in calls
+        @param user_gc: the GraphChoice enum representing the user's choice
+        @param time_col_ind: the index (0-based) of the time column ("x"), used for graphing
+        @param data_col_inds: the index (0-based) of the data column ("y"), or a list of them for
+            several series sharing the x-axis, used for graphing
+        @param frame_rate: the target number of live graph refreshes per second
+        @param rolling_samples: the number of most recent points to show (0 shows all of them)
+        @param rolling_span: the x-axis span of the most recent points to show (0 shows all of
+            them, and the x-axis values are assumed to be increasing)
+        @param stacked: a boolean for drawing each series on its own axes (stacked subplots)
+            instead of all of them on one
+        @return: None
+        """
+        # Define parameters based on user choice
+        self.user_gc = user_gc
+        self.is_live = (user_gc == GraphChoice.LIVE)
+        self.is_graphed = (user_gc != GraphChoice.NONE)
+        self.time_col_ind = time_col_ind
+        self.data_col_inds = [data_col_inds] if isinstance(data_col_inds, int) \
+            else list(data_col_inds)
+        self.stacked = stacked and (len(self.data_col_inds) > 1)
+        # The columns that are plotted, in the order of the plot data's columns
+        self.plot_inds:tuple[int, ...] = (time_col_ind, *self.data_col_inds) \
+            if self.is_graphed else ()
+        if self.is_live:
+            # The graph is refreshed on a wall-clock schedule, independent of the data rate
+            self.frame_interval = 1/frame_rate
+            self.next_refresh:float = None # Scheduled when the first point is added
+            self.clock:Callable[[], float] = time.monotonic # The clock that the frames are timed by
+            self.stop_requested = False
+            self.buf_ind = 0 # Number of points added since the last refresh
+            self.num_plot_bufs = 0 # Count number of refreshes on current plot
+            num_series = len(self.data_col_inds)
+            self.points = PlotPoints(num_series, rolling_samples=rolling_samples, \
+                                     rolling_span=rolling_span)
+            self.figure = LiveFigure(num_series, self.stacked, self.on_key_press)
+
+    def restart(self) -> GraphData:
+        """
+        This method makes the same graph for a new run (a live graph gets a new figure and arrays,
+        so this one's can be freed once it is closed)
+        @param self: Not needed in calls
+        @return: the GraphData object of the new run
+        """
+        if not self.is_live:
+            return self # There is nothing to free
+        graph_struct = GraphData(self.user_gc, self.time_col_ind, self.data_col_inds, \
+                                 1/self.frame_interval, \
+                                 rolling_samples=self.points.rolling_samples, \
+                                 rolling_span=self.points.rolling_span, stacked=self.stacked)
+        graph_struct.clock = self.clock
+        return graph_struct
+
+    def show_rate(self, rate_txt:str) -> None:
+        """
+        This method shows the data rate in the title of the graph window IFF there is a live graph
+        (The window title isn't part of the figure, so nothing has to be redrawn)
+        @param self: Not needed in calls
+        @param rate_txt: the description of the data rate
+        @return: None
+        """
+        if self.is_live and (self.figure.fig.canvas.manager is not None):
+            self.figure.fig.canvas.manager.set_window_title(f"BB-DAQ ({rate_txt})")
+
+    def disable_graph(self) -> None:
+        """
+        This method will set the graph choice to NONE
+        (Use case: user chooses CSV but with graph choice as EXCEL_ONLY)
+        """
+        self.user_gc = GraphChoice.NONE
+        self.is_graphed = False
+        self.time_col_ind = -1
+        self.data_col_inds = []
+        self.plot_inds = ()
+
+    def set_ax_labels(self, x:str, ys:list[str]) -> None:
+        """
+        This method sets the label of the axes IFF there is a live graph
+        @param self: Not needed in calls
+        @param x: x-axis label
+        @param ys: y-axis label of each series (several series on one axes get a legend instead)
+        @return: None
+        """
+        if not self.is_live:
+            return
+        axes = self.figure.axes
+        axes[-1].set_xlabel(x)
+        if self.stacked:
+            for (ax, y) in zip(axes, ys):
+                ax.set_ylabel(y)
+        elif len(ys) == 1:
+            axes[0].set_ylabel(ys[0])
+        else:
+            axes[0].legend(self.figure.lines, ys, loc="upper left")
+        self.figure.background = None # The labels are part of the background
+
+    @staticmethod
+    def to_plot_value(value:float|str|dt_time) -> float:
+        """
+        This method converts a cell value to a number that can be plotted
+        @param value: the number, numeric string, or time of day (as seconds since midnight)
+        @return: the number (NaN if the value can't be plotted, which leaves a gap in the line)
+        """
+        if isinstance(value, dt_time):
+            return value.hour*3600 + value.minute*60 + value.second + value.microsecond/1e6
+        try:
+            return float(value)
+        except (ValueError, TypeError):
+            return np.nan
+
+    def add_to_buffers(self, x:float, *ys:float) -> None:
+        """
+        This method adds a point of every series to the plot data IFF there is a live graph, then
+        plots the data if the next frame is due
+        @param self: Not needed in calls
+        @param x: x value
+        @param ys: y value of each series
+        @return: None
+        """
+        if not self.is_live:
+            return
+        self.points.add(self.to_plot_value(x), tuple(self.to_plot_value(y) for y in ys))
+        self.buf_ind += 1
+        self.refresh_if_due()
+
+    def on_key_press(self, _) -> None:
+        """
+        This method is called by matplotlib when a key is pressed while the graph is selected
+        @param self: Not needed in calls
+        @param _: the KeyEvent (unused)
+        @return: None
+        """
+        self.stop_requested = True
+
+    def refresh_if_due(self) -> None:
+        """
+        This method refreshes the live graph IFF the next frame is due
+        @param self: Not needed in calls
+        @return: None
+        """
+        if not self.is_live:
+            return
+        now = self.clock()
+        if self.next_refresh is None:
+            self.next_refresh = now + self.frame_interval
+        elif now >= self.next_refresh:
+            self.plot_buffer_data()
+            # Schedule from the current time so that a slow frame doesn't cause a burst of frames
+            self.next_refresh = now + self.frame_interval
+
+    def update_limits(self, drawn:list[tuple[np.ndarray, np.ndarray]]) -> bool:
+        """
+        This method fits the axis limits to the visible data
+        @param self: Not needed in calls
+        @param drawn: the visible (x values, y values) of each series
+        @return: a boolean that is true if the limits changed (so the background must be redrawn)
+        """
+        changed = False
+        is_rolling = self.points.is_rolling()
+        axes = self.figure.axes
+        # The x-axis is shared, and each axes fits the series drawn on it
+        lims = [(np.concatenate([x_vis for (x_vis, _) in drawn]), axes[-1].get_xlim, \
+                 axes[-1].set_xlim)]
+        if self.stacked:
+            lims += [(y_vis, ax.get_ylim, ax.set_ylim) for (ax, (_, y_vis)) in zip(axes, drawn)]
+        else:
+            lims.append((np.concatenate([y_vis for (_, y_vis) in drawn]), axes[0].get_ylim, \
+                         axes[0].set_ylim))
+        for (vals, get_lim, set_lim) in lims:
+            finite = vals[np.isfinite(vals)]
+            if len(finite) == 0:
+                continue
+            (v_min, v_max) = (finite.min(), finite.max())
+            (l_min, l_max) = get_lim()
+            # Only grow the limits (unless rolling) so that most refreshes can be blitted
+            if (not is_rolling) and (l_min <= v_min) and (v_max <= l_max):
+                continue
+            margin = 0.05*(v_max - v_min) if v_max > v_min else 0.5
+            if not is_rolling:
+                v_min = min(v_min, l_min) if self.num_plot_bufs > 0 else v_min
+                v_max = max(v_max, l_max) if self.num_plot_bufs > 0 else v_max
+            set_lim(v_min - margin, v_max + margin)
+            changed = True
+        return changed
+
+    def plot_buffer_data(self) -> None:
+        """
+        This method plots the new data IFF there is a live graph, then resets the buffer index
+        (GUI events are processed without waiting, so this never stalls the data stream)
+        @param self: Not needed in calls
+        @return: None
+        """
+        if not self.is_live:
+            return
+        if self.buf_ind > 0:
+            visible = self.points.visible()
+            num_buckets = max(PLOT_MIN_BUCKETS, int(self.figure.axes[0].bbox.width))
+            drawn = [self.decimate(visible[:, 0], visible[:, col], num_buckets) \
+                     for col in range(1, visible.shape[1])]
+            for (line, (x_vis, y_vis)) in zip(self.figure.lines, drawn):
+                line.set_data(x_vis, y_vis)
+            self.figure.redraw(self.update_limits(drawn))
+            self.num_plot_bufs += 1
+            self.buf_ind = 0
+        self.figure.fig.canvas.flush_events() # This will register keypresses
+        if self.stop_requested:
+            raise KeyboardInterrupt
+
+    @staticmethod
+    def decimate(x_vis:np.ndarray, y_vis:np.ndarray, num_buckets:int) \
+            -> tuple[np.ndarray, np.ndarray]:
+        """
+        This method reduces the points to the lowest and highest point (in order) of each bucket
+        of consecutive points, so a line with many points per pixel keeps its peaks but costs about
+        the same to draw at any data rate (the number of points per bucket follows the number of
+        visible points, which follows the data rate, and the number of buckets follows the width of
+        the axes in pixels)
+        @param x_vis: the visible x values (assumed to be mostly increasing, like time)
+        @param y_vis: the visible y values (NaN gaps are kept if a whole bucket is a gap)
+        @param num_buckets: the number of buckets
+        @return: a tuple containing the x and y values to draw (the same arrays if there are few
+            enough points)
+        """
+        num_points = len(y_vis)
+        if num_points <= 2*num_buckets:
+            return (x_vis, y_vis)
+        bucket_size = num_points//num_buckets
+        num_full = (num_points//bucket_size)*bucket_size
+        buckets = y_vis[:num_full].reshape(-1, bucket_size)
+        is_gap = np.isnan(buckets)
+        inds = np.stack((np.where(is_gap, np.inf, buckets).argmin(axis=1), \
+                         np.where(is_gap, -np.inf, buckets).argmax(axis=1)), axis=1)
+        inds.sort(axis=1) # Keep the order of each bucket's two points
+        inds += np.arange(0, num_full, bucket_size)[:, np.newaxis]
+        # The newest points (fewer than a bucket) are drawn as they are, and the line always
+        # reaches the first and last points
+        inds = np.unique(np.concatenate(([0], inds.ravel(), np.arange(num_full, num_points), \
+                                         [num_points - 1])))
+        return (x_vis[inds], y_vis[inds])
+
+    def overwrite_buffers(self) -> None:
+        """
+        This method empties the plot data IFF there is a live graph
+        @param self: Not needed in calls
+        @return: None
+        """
+        if not self.is_live:
+            return
+        self.points.clear()
+        self.buf_ind = 0
+        self.figure.clear_lines()
+
+    def reset_axes(self) -> None:
+        """
+        This method resets the axes (while preserving labels and the line) IFF there is a live
+        graph
+        @param self: Not needed in calls
+        @return: None
+        """
+        if not self.is_live:
+            return
+        self.figure.reset_axes()
+        self.num_plot_bufs = 0
+
+    def close_fig(self) -> None:
+        """
+        This method closes the figure IFF there is a live graph
+        @param self: Not needed in calls
+        @return: None
+        """
+        if not self.is_live:
+            return
+        self.figure.close()
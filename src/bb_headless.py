@@ -0,0 +1,237 @@
+'''
+The runs of BB-DAQ without any prompts (headless runs and replays)
+'''
+
+from __future__ import annotations
+# Python has a built-in fnmatch library
+from fnmatch import fnmatchcase
+# Python has a built-in json library
+import json
+# Python has a built-in os library
+import os
+# Python has a built-in time library
+import time
+# Python has a built-in typing library
+from typing import TYPE_CHECKING
+# If serial is not installed, type "python3 -m pip install pyserial" into a Terminal window
+# Note that if you have another serial library installed, it may interfere with this one
+import serial
+if TYPE_CHECKING:
+    from argparse import Namespace
+if __package__:
+    from .bb_common import (argparse, list_ports, BIN_EXT, RAW_LOG_EXT, START_TIMEOUT,
+                            STATUS_INTERVAL, DEFAULT_BUAD, DEFAULT_SHEET_NAME, DATA_DELIM,
+                            READ_MODE_NAMES, GraphChoice, GRAPH_CHOICE_NAMES, is_valid_sheet_name)
+    from .bb_graph import GraphData
+    from .bb_capture import Rollover
+    from .bb_file import FileData
+    from .bb_reader import RawTap, TappedSerial, ReplaySerial, open_stream
+    from .bb_session import RunLimits, RunOptions, get_and_write_data
+else:
+    # pylint: disable=import-error
+    from bb_common import (argparse, list_ports, BIN_EXT, RAW_LOG_EXT, START_TIMEOUT,
+                           STATUS_INTERVAL, DEFAULT_BUAD, DEFAULT_SHEET_NAME, DATA_DELIM,
+                           READ_MODE_NAMES, GraphChoice, GRAPH_CHOICE_NAMES, is_valid_sheet_name)
+    from bb_graph import GraphData
+    from bb_capture import Rollover
+    from bb_file import FileData
+    from bb_reader import RawTap, TappedSerial, ReplaySerial, open_stream
+    from bb_session import RunLimits, RunOptions, get_and_write_data
+
+
+def replay(log_name:str, out_name:str, speed:float=0.0, line_period:float=0.0, \
+           threaded:bool=False) -> tuple[int, float]:
+    """
+    This function replays a raw serial log through open_stream() and get_and_write_data() without
+    any hardware or prompts, then reports the throughput
+    @param log_name: the name of the raw serial log (see read_raw_log())
+    @param out_name: the name of the output file, whose extension (".xlsx", ".csv", or BIN_EXT)
+        decides the file type
+    @param speed: the replay speed relative to real time, or 0 to replay as fast as possible
+    @param line_period: the number of seconds between lines for logs without receive times
+    @param threaded: a boolean for reading the replayed lines in a separate thread
+    @return: a tuple containing the number of lines replayed and the seconds it took to write them
+    """
+    ser = ReplaySerial(log_name, speed, line_period)
+    t_start = time.perf_counter()
+    (header_txt, _, handoff) = open_stream(ser, ask_user=False, drain=False)
+    out_ext = os.path.splitext(out_name)[1].lower()
+    file_struct = FileData(out_ext == ".xlsx", out_name, header_txt, \
+                           save_as_bin=(out_ext == BIN_EXT))
+    graph_struct = GraphData(GraphChoice.NONE, -1, -1)
+    get_and_write_data(ser, file_struct, graph_struct, RunOptions(threaded), sheet_name="Replay", \
+                       ask_rerun=False, handoff=handoff)
+    elapsed = time.perf_counter() - t_start
+    rate = ser.num_read/elapsed if elapsed > 0 else float("inf")
+    print(f"Replayed {ser.num_read} lines in {elapsed:.3f} s ({rate:.0f} lines/s)")
+    return (ser.num_read, elapsed)
+
+
+def find_port(port_match:str) -> str:
+    """
+    This function finds the one port whose name, description, or hardware ID matches a pattern
+    @param port_match: the pattern (case-insensitive, with "*" and "?" wildcards), such as
+        "*Arduino*" or "*2341:0043*" (a USB vendor and product ID)
+    @return: the port name, or None if no port or more than one port matches
+    """
+    pattern = port_match.lower()
+    matches = [p.device for p in list_ports.comports() \
+               if any(fnmatchcase(str(field).lower(), pattern) \
+                      for field in (p.device, p.description, p.hwid))]
+    if len(matches) != 1:
+        print(f"Found {len(matches)} ports matching '{port_match}' (one was expected):", \
+              ", ".join(matches))
+        return None
+    return matches[0]
+
+
+def parse_run_args(argv:list[str]=None) -> Namespace:
+    """
+    This function reads the options of a headless run from the command line and a config file
+    (The config file is a JSON object with the same names as the options, e.g. "port_match", and
+    the command line overrides it)
+    @param argv: the arguments after "run" (if None, the ones after the script name are used)
+    @return: the options
+    """
+    parser = argparse.ArgumentParser(prog="BB_DAQ.py run", description="Record the data from " \
+                                     "one port without any prompts (e.g., when started by a " \
+                                     "scheduler)")
+    parser.add_argument("--config", help="JSON file with any of the options below")
+    parser.add_argument("--port", help="name of the serial port (e.g., COM3 or /dev/ttyACM0)")
+    parser.add_argument("--port-match", help="pattern matched against each port's name, " \
+                        "description, and hardware ID (e.g., '*Arduino*' or '*2341:0043*')")
+    parser.add_argument("--baud", type=int, default=DEFAULT_BUAD, help="buad rate")
+    parser.add_argument("--output", help="output file, whose extension picks the format " \
+                        f"(.xlsx, .csv, or {BIN_EXT})")
+    parser.add_argument("--overwrite", action="store_true", help="overwrite the output file")
+    parser.add_argument("--sheet", default=DEFAULT_SHEET_NAME, help="sheet name (only for .xlsx)")
+    parser.add_argument("--graph", default="none", choices=list(GRAPH_CHOICE_NAMES), \
+                        help="graph to show")
+    parser.add_argument("--x-col", type=int, default=-1, help="column index (start at 0) for " \
+                        "the x-axis")
+    parser.add_argument("--y-col", type=int, nargs="+", default=[], help="column indices " \
+                        "(start at 0) for the y-axis")
+    parser.add_argument("--stacked", action="store_true", help="draw each y column on its own " \
+                        "live graph (stacked) instead of all of them on one")
+    parser.add_argument("--rolling", type=int, default=0, help="number of most recent points " \
+                        "to show on the live graph (0 shows all of them)")
+    parser.add_argument("--read", default="loop", choices=list(READ_MODE_NAMES), \
+                        help="how the serial data is read")
+    parser.add_argument("--reconnect", type=float, default=0.0, help="number of seconds to " \
+                        "wait for the board to reconnect (0 ends the run when the data stops)")
+    parser.add_argument("--start-timeout", type=float, default=START_TIMEOUT, help="number " \
+                        "of seconds to wait for CLEARDATA, the header, and the first data line " \
+                        "before giving up (0 to wait forever)")
+    parser.add_argument("--duration", type=float, default=0.0, help="number of seconds of " \
+                        "data to record (0 for no limit)")
+    parser.add_argument("--max-rows", type=int, default=0, help="number of rows to record " \
+                        "(0 for no limit)")
+    parser.add_argument("--raw-log", action="store_true", help="also save every received " \
+                        f"line to a '{RAW_LOG_EXT}' file")
+    parser.add_argument("--rollover-rows", type=int, default=0, help="number of rows after " \
+                        "which the run continues in a new sheet/file (0 for no limit)")
+    parser.add_argument("--rollover-mb", type=float, default=0.0, help="number of megabytes " \
+                        "after which the run continues in a new file (0 for no limit, and only " \
+                        f"for .csv and {BIN_EXT})")
+    parser.add_argument("--rollover-seconds", type=float, default=0.0, help="number of " \
+                        "seconds of data after which the run continues in a new sheet/file " \
+                        "(0 for no limit)")
+    parser.add_argument("--echo", action="store_true", help="print every line of data instead " \
+                        f"of a status line that is redrawn every {STATUS_INTERVAL:g} s")
+    # The config file's values become the defaults, so the command line can override them
+    (pre_args, _) = parser.parse_known_args(argv)
+    if pre_args.config is not None:
+        with open(pre_args.config, encoding='utf-8') as f_in:
+            config = {key.replace("-", "_"): value for (key, value) in json.load(f_in).items()}
+        unknown = set(config) - set(vars(pre_args))
+        if unknown:
+            parser.error(f"unknown option(s) in {pre_args.config}: {', '.join(sorted(unknown))}")
+        parser.set_defaults(**config)
+    args = parser.parse_args(argv)
+    # Defaults aren't checked against the choices, so the config file's values are checked here
+    if args.graph not in GRAPH_CHOICE_NAMES:
+        parser.error(f"invalid graph: {args.graph}")
+    if args.read not in READ_MODE_NAMES:
+        parser.error(f"invalid read mode: {args.read}")
+    if (args.port is None) == (args.port_match is None):
+        parser.error("give either a port or a port pattern")
+    if args.output is None:
+        parser.error("an output file is required")
+    out_ext = os.path.splitext(args.output)[1].lower()
+    if out_ext not in (".xlsx", ".csv", BIN_EXT):
+        parser.error(f"the output file must end with .xlsx, .csv, or {BIN_EXT}")
+    if (out_ext == ".xlsx") and (not is_valid_sheet_name(args.sheet)):
+        parser.error(f"invalid sheet name: {args.sheet}")
+    # The config file can give one y column or a list of them
+    if isinstance(args.y_col, int):
+        args.y_col = [args.y_col]
+    if (args.graph != "none") and ((args.x_col < 0) or (not args.y_col) or (min(args.y_col) < 0)):
+        parser.error("the graph needs the x-axis and y-axis columns")
+    return args
+
+
+def main_headless(argv:list[str]=None) -> int:
+    """
+    This is the main function for runs without any prompts
+    @param argv: the arguments after "run" (if None, the ones after the script name are used)
+    @return: the exit code (0 if the run was recorded, or 1 if it couldn't start or something went
+        wrong during it)
+    """
+    args = parse_run_args(argv)
+    port = args.port if args.port_match is None else find_port(args.port_match)
+    if port is None:
+        print("Exiting...")
+        return 1
+    file_name = os.path.normpath(args.output)
+    out_ext = os.path.splitext(file_name)[1].lower()
+    tap_name = os.path.splitext(file_name)[0] + RAW_LOG_EXT
+    for out_name in [file_name, tap_name] if args.raw_log else [file_name]:
+        if os.path.exists(out_name) and (not args.overwrite):
+            print("This file already exists:", out_name)
+            return 1
+    file_dir = os.path.split(file_name)[0]
+    if file_dir != "":
+        os.makedirs(file_dir, exist_ok=True)
+    tap:RawTap = RawTap(tap_name) if args.raw_log else None
+
+    ser = serial.Serial(baudrate=args.baud)
+    ser.port = port
+    if tap is not None:
+        ser = TappedSerial(ser, tap)
+    try:
+        (header_txt, _, handoff) = open_stream(ser, ask_user=False, \
+                                               start_timeout=args.start_timeout)
+    except TimeoutError as err:
+        # E.g., the port is silent or belongs to another device
+        print(err)
+        ser.close()
+        if tap is not None:
+            tap.close()
+        return 1
+    print(f"\nHeader:\n{header_txt}\n")
+    user_gc = GRAPH_CHOICE_NAMES[args.graph]
+    num_cols = len(header_txt.split(DATA_DELIM))
+    if (user_gc != GraphChoice.NONE) and (max(args.x_col, *args.y_col) >= num_cols):
+        print(f"The graph's columns must be less than {num_cols} (the number of header columns).")
+        handoff.stop()
+        ser.close()
+        return 1
+    graph_struct = GraphData(user_gc, args.x_col, args.y_col, rolling_samples=args.rolling, \
+                             stacked=args.stacked)
+    rollover = None
+    if (args.rollover_rows > 0) or (args.rollover_mb > 0) or (args.rollover_seconds > 0):
+        rollover = Rollover(args.rollover_rows, int(args.rollover_mb*1e6), args.rollover_seconds)
+    file_struct = FileData(out_ext == ".xlsx", file_name, header_txt, \
+                           save_as_bin=(out_ext == BIN_EXT), rollover=rollover)
+    options = RunOptions(args.read == "thread", use_asyncio=(args.read == "asyncio"), \
+                         reconnect_timeout=args.reconnect, \
+                         limits=RunLimits(args.duration, args.max_rows), echo=args.echo)
+    succeeded = get_and_write_data(ser, file_struct, graph_struct, options, args.sheet, \
+                                   ask_rerun=False, handoff=handoff)
+    if tap is not None:
+        tap.close()
+    if not succeeded:
+        print("The run ended with an error.")
+        return 1
+    print("Done.")
+    return 0
@@ -0,0 +1,884 @@
+'''
+The serial reading of BB-DAQ (line framing, the reader thread, the raw serial log, and
+replays of it)
+'''
+
+from __future__ import annotations
+# Python has a built-in collections library
+from collections import deque
+# Python has a built-in os library
+import os
+# Python has a built-in queue library
+import queue
+# Python has a built-in statistics library
+import statistics
+# Python has a built-in threading library
+import threading
+# Python has a built-in time library
+import time
+if __package__:
+    from .bb_common import (asyncio, PySerial, RAW_LOG_MAGIC, RAW_LOG_RECORD, RAW_LOG_OPEN,
+                            RAW_TAP_BUF_SIZE, RAW_TAP_FLUSH_INTERVAL, FRAME_BUF_SIZE,
+                            RATE_SAMPLE_INTERVALS, RATE_SAMPLE_TIME, RATE_WINDOW,
+                            RATE_UPDATE_INTERVAL, RATE_TIMEOUT_FACTOR, RATE_TIMEOUT_JITTERS,
+                            RATE_MIN_TIMEOUT, READ_QUEUE_SIZE, READER_JOIN_TIMEOUT,
+                            START_POLL_INTERVAL, DATA_START_AFTER, read_rx_clock)
+else:
+    # pylint: disable=import-error
+    from bb_common import (asyncio, PySerial, RAW_LOG_MAGIC, RAW_LOG_RECORD, RAW_LOG_OPEN,
+                           RAW_TAP_BUF_SIZE, RAW_TAP_FLUSH_INTERVAL, FRAME_BUF_SIZE,
+                           RATE_SAMPLE_INTERVALS, RATE_SAMPLE_TIME, RATE_WINDOW,
+                           RATE_UPDATE_INTERVAL, RATE_TIMEOUT_FACTOR, RATE_TIMEOUT_JITTERS,
+                           RATE_MIN_TIMEOUT, READ_QUEUE_SIZE, READER_JOIN_TIMEOUT,
+                           START_POLL_INTERVAL, DATA_START_AFTER, read_rx_clock)
+
+
+# Classes
+class LineFramer():
+    """
+    Class that splits chunks of serial bytes into lines, carrying any partial line over to the
+    next chunk
+    (The bytes are kept in one reusable buffer, and each line is decoded straight from a view of
+    it, so reading a chunk costs a few allocations per line instead of a system call per byte)
+    """
+
+    def __init__(self, buf_size:int=FRAME_BUF_SIZE) -> None:
+        """
+        This method is the constructor
+        @param self: Not needed in calls
+        @param buf_size: the initial number of bytes the buffer can hold
+        @return: None
+        """
+        self.buf = bytearray(buf_size)
+        self.view = memoryview(self.buf)
+        self.num_bytes = 0 # Number of bytes of the partial line at the start of the buffer
+
+    def feed(self, chunk:bytes) -> list[str]:
+        """
+        This method adds a chunk of bytes and splits off every complete line
+        @param self: Not needed in calls
+        @param chunk: the bytes that were read
+        @return: a list of the decoded and stripped lines
+        """
+        end = self.num_bytes + len(chunk)
+        if end > len(self.buf):
+            # The buffer can't be resized while it is viewed
+            self.view.release()
+            self.buf.extend(bytes(max(end, 2*len(self.buf)) - len(self.buf)))
+            self.view = memoryview(self.buf)
+        self.view[self.num_bytes:end] = chunk
+        lines = []
+        start = 0
+        line_end = self.buf.find(b"\n", start, end)
+        while line_end != -1:
+            lines.append(str(self.view[start:line_end], "utf-8").strip())
+            start = line_end + 1
+            line_end = self.buf.find(b"\n", start, end)
+        # Move the partial line to the start of the buffer
+        self.num_bytes = end - start
+        if start and self.num_bytes:
+            self.buf[:self.num_bytes] = self.view[start:end]
+        return lines
+
+    def clear(self) -> None:
+        """
+        This method drops the partial line (e.g., after the connection was lost)
+        @param self: Not needed in calls
+        @return: None
+        """
+        self.num_bytes = 0
+
+    def read_lines(self, ser:PySerial) -> list[tuple[str, float]]:
+        """
+        This method reads whatever bytes are waiting (or waits for more, up to the serial timeout)
+        until at least one line is complete, and splits off every complete line
+        @param self: Not needed in calls
+        @param ser: the Serial object that is connected to the device (it must already be open)
+        @return: a list of tuples containing each decoded and stripped line and the time its chunk
+            was received (a timeout gives one empty line, like readline())
+        """
+        lines = []
+        while not lines: # A chunk may only hold part of a line
+            chunk = ser.read(max(1, ser.in_waiting))
+            rx_time = read_rx_clock()
+            if not chunk:
+                return [("", rx_time)]
+            lines = self.feed(chunk)
+        return [(line, rx_time) for line in lines]
+
+
+class RateEstimator():
+    """
+    Class that estimates the interval between data lines (and its jitter) from the most recent
+    receive times, using the median and the median absolute deviation so that a few late or
+    bunched-up lines don't throw off the estimate
+    """
+
+    def __init__(self, window:int=RATE_WINDOW, update_interval:float=RATE_UPDATE_INTERVAL) -> None:
+        """
+        This method is the constructor
+        @param self: Not needed in calls
+        @param window: the number of most recent intervals the estimate is made from
+        @param update_interval: the number of seconds between updates (see add())
+        @return: None
+        """
+        self.intervals:deque[float] = deque(maxlen=window)
+        self.last_rx:float = None
+        self.update_interval = update_interval
+        self.next_update:float = None
+        self.num_lines = 0
+
+    def add(self, rx_time:float, num_lines:int=1) -> bool:
+        """
+        This method adds the receive time of a line (or of a batch of lines received together)
+        @param self: Not needed in calls
+        @param rx_time: the receive time of the line or batch
+        @param num_lines: the number of lines in the batch (its interval is split between them)
+        @return: a boolean that is true once every update_interval seconds (to update whatever
+            depends on the estimate)
+        """
+        self.num_lines += num_lines
+        if self.last_rx is None:
+            self.last_rx = rx_time
+            self.next_update = rx_time + self.update_interval
+            return False
+        interval = (rx_time - self.last_rx)/num_lines
+        self.intervals.extend([interval]*min(num_lines, self.intervals.maxlen))
+        self.last_rx = rx_time
+        if rx_time >= self.next_update:
+            self.next_update = rx_time + self.update_interval
+            return True
+        return False
+
+    def get_interval(self) -> tuple[float, float]:
+        """
+        This method estimates the interval between lines and its jitter
+        @param self: Not needed in calls
+        @return: a tuple containing the median interval and the jitter (the median absolute
+            deviation, scaled to match the standard deviation of normally distributed intervals),
+            or (None, None) if there are no intervals yet
+        """
+        if not self.intervals:
+            return (None, None)
+        median = statistics.median(self.intervals)
+        jitter = 1.4826*statistics.median(abs(x - median) for x in self.intervals)
+        return (median, jitter)
+
+    def get_timeout(self) -> float:
+        """
+        This method finds a serial timeout that the data stream shouldn't hit unless it stopped
+        @param self: Not needed in calls
+        @return: the timeout in seconds (None if there are no intervals yet)
+        """
+        (median, jitter) = self.get_interval()
+        if median is None:
+            return None
+        timeout = RATE_TIMEOUT_FACTOR*(median + RATE_TIMEOUT_JITTERS*jitter)
+        return max(RATE_MIN_TIMEOUT, round(timeout, 3))
+
+    def describe(self) -> str:
+        """
+        This method describes the data rate
+        @param self: Not needed in calls
+        @return: the description
+        """
+        (median, jitter) = self.get_interval()
+        if not median:
+            return "Data rate: unknown"
+        return f"Data rate: {1/median:.2f} lines/s (interval {1000*median:.1f} ms, " \
+            f"jitter {1000*jitter:.1f} ms)"
+
+
+class SerialReader(threading.Thread):
+    """
+    Class containing the thread that drains the serial port into a bounded queue, so that slow
+    file-writing or plotting does not let the OS serial buffer overflow
+    """
+
+    def __init__(self, ser:PySerial, max_queue:int=READ_QUEUE_SIZE, \
+                 prelude:list[tuple[bytes, float]]=None, stream_t0:float=None) -> None:
+        """
+        This method is the constructor
+        @param self: Not needed in calls
+        @param ser: the Serial object that is connected to the device (it must already be open)
+        @param max_queue: the maximum number of lines that can wait in the queue
+        @param prelude: the lines (with their receive times) that were already read from the data
+            stream, which are queued first
+        @param stream_t0: the receive time of the header if the reader takes over a data stream
+            that was already started (see open_stream())
+        @return: None
+        """
+        super().__init__(daemon=True)
+        self.ser = ser
+        self.stream_t0 = stream_t0
+        self.lines:queue.Queue[tuple[bytes, float]|BaseException] = queue.Queue(max_queue)
+        for item in prelude or []:
+            self.lines.put_nowait(item)
+        self.stop_event = threading.Event()
+        # Counters (only written to by the reader thread)
+        self.num_read = 0
+        self.num_dropped = 0
+        self.max_depth = 0
+
+    def run(self) -> None:
+        """
+        This method reads lines (with their receive times) until an empty line is read, an error
+        occurs, or the thread is stopped
+        @param self: Not needed in calls
+        @return: None
+        """
+        while not self.stop_event.is_set():
+            try:
+                line_in = self.ser.readline()
+            except BaseException as err: # pylint: disable=broad-exception-caught
+                # Hand the error to the consumer so it can be raised in the main thread
+                self.put_last_item(err)
+                return
+            rx_time = read_rx_clock()
+            self.num_read += 1
+            if line_in.strip() == b"":
+                # The serial timed out, so the consumer must see this line (don't drop it)
+                self.put_last_item((line_in, rx_time))
+                return
+            try:
+                self.lines.put_nowait((line_in, rx_time))
+            except queue.Full:
+                self.num_dropped += 1
+            self.max_depth = max(self.max_depth, self.lines.qsize())
+
+    def put_last_item(self, item:tuple[bytes, float]|BaseException) -> None:
+        """
+        This method waits for room in the queue for the final item (unless the thread is stopped)
+        @param self: Not needed in calls
+        @param item: the last line (with its receive time) or the error that ended the thread
+        @return: None
+        """
+        while not self.stop_event.is_set():
+            try:
+                self.lines.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def get_line(self, timeout:float=None) -> tuple[str, float]:
+        """
+        This method waits for the next line in the queue
+        @param self: Not needed in calls
+        @param timeout: the maximum number of seconds to wait (if None, it waits for a line)
+        @return: a tuple containing the decoded and stripped line, and the time it was received
+            (or None if no line came before the timeout)
+        """
+        try:
+            item = self.lines.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if isinstance(item, BaseException):
+            raise item
+        (line_in, rx_time) = item
+        return (line_in.decode().strip(), rx_time)
+
+    def stop(self) -> None:
+        """
+        This method signals the thread to stop and waits for it to finish its current read
+        @param self: Not needed in calls
+        @return: None
+        """
+        self.stop_event.set()
+        if self.is_alive():
+            self.join(READER_JOIN_TIMEOUT)
+
+    def drain(self) -> list[tuple[str, float]]:
+        """
+        This method stops the thread (waiting for its current read, so no line is lost) and takes
+        every line left in the queue
+        @param self: Not needed in calls
+        @return: a list of tuples containing each decoded and stripped line and its receive time
+        """
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+        if self.num_dropped > 0:
+            print(f"\n{self.num_dropped} lines were dropped because the queue was full.")
+        batch = []
+        while not self.lines.empty():
+            batch.append(self.get_line())
+        return batch
+
+    def restart(self, max_queue:int=None) -> "SerialReader":
+        """
+        This method starts a new reader on the same port after this one ended (e.g., after the
+        connection was lost and found again, or after its lines were drained), carrying the
+        counters over
+        @param self: Not needed in calls
+        @param max_queue: the maximum number of lines that can wait in the new reader's queue (if
+            None, it is the same as this one's)
+        @return: the new SerialReader
+        """
+        self.stop()
+        if max_queue is None:
+            max_queue = self.lines.maxsize
+        reader = SerialReader(self.ser, max_queue, stream_t0=self.stream_t0)
+        reader.num_read = self.num_read
+        reader.num_dropped = self.num_dropped
+        reader.max_depth = self.max_depth
+        reader.start()
+        return reader
+
+    def print_stats(self) -> None:
+        """
+        This method prints the reader's counters
+        @param self: Not needed in calls
+        @return: None
+        """
+        print(f"Lines read: {self.num_read}, dropped: {self.num_dropped}, " \
+              f"max queue depth: {self.max_depth}, current queue depth: {self.lines.qsize()}")
+
+
+class RawTap(threading.Thread):
+    """
+    Class containing the thread that appends received lines and their receive times to a raw
+    serial log (see read_raw_log()), so disk writes never block the serial reads
+    """
+
+    def __init__(self, file_name:str, buf_size:int=RAW_TAP_BUF_SIZE, \
+                 flush_interval:float=RAW_TAP_FLUSH_INTERVAL) -> None:
+        """
+        This method is the constructor (the thread is started here)
+        @param self: Not needed in calls
+        @param file_name: the name of the raw serial log
+        @param buf_size: the number of bytes buffered before the log is written to disk
+        @param flush_interval: the maximum number of seconds between flushes
+        @return: None
+        """
+        super().__init__(daemon=True)
+        self.file_name = file_name
+        self.flush_interval = flush_interval
+        # The queue is unbounded and never blocks, so recording a line is just a put
+        self.records:queue.SimpleQueue[tuple[float, bytes]|None] = queue.SimpleQueue()
+        self.log_file = open(file_name, mode="wb", \
+                             buffering=buf_size) # pylint: disable=consider-using-with
+        self.log_file.write(RAW_LOG_MAGIC)
+        self.num_lines = 0 # Only written to by the tap thread
+        self.start()
+
+    def record(self, line:bytes) -> None:
+        """
+        This method stamps a received line (with the same clock as the data rows) and queues it
+        for the log
+        @param self: Not needed in calls
+        @param line: the exact bytes that were received
+        @return: None
+        """
+        self.records.put((read_rx_clock(), line))
+
+    def record_open(self) -> None:
+        """
+        This method queues a marker for the port being opened (a replay starts there again)
+        @param self: Not needed in calls
+        @return: None
+        """
+        self.records.put((read_rx_clock(), None))
+
+    def run(self) -> None:
+        """
+        This method writes queued records until close() is called
+        @param self: Not needed in calls
+        @return: None
+        """
+        pack = RAW_LOG_RECORD.pack
+        write = self.log_file.write
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self.records.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                (rx_time, line) = item
+                if line is None:
+                    write(pack(rx_time, RAW_LOG_OPEN))
+                else:
+                    write(pack(rx_time, len(line)))
+                    write(line)
+                    self.num_lines += 1
+            now = time.monotonic()
+            if now >= next_flush:
+                self.log_file.flush()
+                next_flush = now + self.flush_interval
+        self.log_file.close()
+
+    def close(self) -> None:
+        """
+        This method writes the remaining records and closes the log
+        @param self: Not needed in calls
+        @return: None
+        """
+        self.records.put(None)
+        self.join()
+        print(f"Raw serial log: {self.file_name} ({self.num_lines} lines)")
+
+
+class TappedSerial():
+    """
+    Class that wraps a Serial object and records every line it reads to a RawTap
+    (Chunk reads are forwarded too, so the wrapped port is still read in chunks, see
+    unwrap_serial())
+    """
+
+    def __init__(self, ser:PySerial, tap:RawTap) -> None:
+        """
+        This method is the constructor
+        @param self: Not needed in calls
+        @param ser: the Serial object that is connected to the device
+        @param tap: the RawTap that records the lines
+        @return: None
+        """
+        self.ser = ser
+        self.tap = tap
+        self.partial = b"" # The start of a line that a chunk read cut off
+
+    def open(self) -> None:
+        """
+        This method opens the port and marks it in the log
+        @param self: Not needed in calls
+        @return: None
+        """
+        self.ser.open()
+        self.tap.record_open()
+
+    def close(self) -> None:
+        """
+        This method closes the port
+        @param self: Not needed in calls
+        @return: None
+        """
+        self.ser.close()
+
+    @property
+    def port(self) -> str:
+        """
+        This property is the name of the wrapped port
+        @param self: Not needed in calls
+        @return: the port's name
+        """
+        return getattr(self.ser, "port", None)
+
+    @property
+    def timeout(self) -> float:
+        """
+        This property is the timeout of the wrapped port
+        @param self: Not needed in calls
+        @return: the timeout in seconds
+        """
+        return self.ser.timeout
+
+    @timeout.setter
+    def timeout(self, timeout:float) -> None:
+        self.ser.timeout = timeout
+
+    def readline(self) -> bytes:
+        """
+        This method reads a line and records it
+        @param self: Not needed in calls
+        @return: the line as bytes
+        """
+        line = self.ser.readline()
+        self.tap.record(line)
+        return line
+
+    def read(self, size:int=1) -> bytes:
+        """
+        This method reads a chunk and records every line that it completes
+        @param self: Not needed in calls
+        @param size: the maximum number of bytes to read
+        @return: the chunk as bytes (empty if the read timed out)
+        """
+        chunk = self.ser.read(size)
+        if not chunk:
+            self.tap.record(chunk) # A timeout is recorded like an empty readline()
+            return chunk
+        data = self.partial + chunk
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].split(b"\n")[:-1]:
+            self.tap.record(line + b"\n")
+        self.partial = data[end:]
+        return chunk
+
+    @property
+    def in_waiting(self) -> int:
+        """
+        This property is the number of bytes waiting in the wrapped port
+        @param self: Not needed in calls
+        @return: the number of bytes
+        """
+        return self.ser.in_waiting
+
+    def fileno(self) -> int:
+        """
+        This method gets the file descriptor of the wrapped port
+        @param self: Not needed in calls
+        @return: the file descriptor
+        """
+        return self.ser.fileno()
+
+
+class AsyncLineReader():
+    """
+    Class that reads lines from a serial port inside an asyncio event loop
+    (On POSIX, the port's file descriptor is watched by the loop, so nothing blocks and the serial
+    timeout is never used; otherwise, each readline() runs in the loop's default executor)
+    """
+
+    def __init__(self, ser:PySerial) -> None:
+        """
+        This method is the constructor (it must be called inside a running event loop)
+        @param self: Not needed in calls
+        @param ser: the Serial object that is connected to the device (it must already be open)
+        @return: None
+        """
+        self.ser = ser
+        self.loop = asyncio.get_running_loop()
+        # Lines framed from the same chunk are queued together
+        self.batches:asyncio.Queue[list[tuple[str, float]]|BaseException] = asyncio.Queue()
+        self.framer = LineFramer()
+        port = unwrap_serial(ser) # A TappedSerial is watched through the port it wraps
+        self.use_fd = (os.name == "posix") and hasattr(port, "fileno") and \
+            hasattr(type(port), "in_waiting")
+        self.task:asyncio.Task = None
+
+    def start(self) -> None:
+        """
+        This method starts reading batches of lines into the queue
+        @param self: Not needed in calls
+        @return: None
+        """
+        if self.use_fd:
+            self.loop.add_reader(self.ser.fileno(), self.on_readable)
+        else:
+            self.task = self.loop.create_task(self.read_in_executor())
+
+    def on_readable(self) -> None:
+        """
+        This method is called by the event loop when the port has bytes to read, and it queues
+        every complete line
+        @param self: Not needed in calls
+        @return: None
+        """
+        try:
+            chunk = self.ser.read(max(1, self.ser.in_waiting))
+        except BaseException as err: # pylint: disable=broad-exception-caught
+            # Hand the error to the consumer so it can be raised there
+            self.loop.remove_reader(self.ser.fileno())
+            self.batches.put_nowait(err)
+            return
+        rx_time = read_rx_clock()
+        lines = self.framer.feed(chunk)
+        if lines:
+            self.batches.put_nowait([(line, rx_time) for line in lines])
+
+    async def read_in_executor(self) -> None:
+        """
+        This method reads lines with readline() in the default executor until an empty line is
+        read or an error occurs
+        @param self: Not needed in calls
+        @return: None
+        """
+        while True:
+            try:
+                line_in = await self.loop.run_in_executor(None, self.ser.readline)
+            except BaseException as err: # pylint: disable=broad-exception-caught
+                self.batches.put_nowait(err)
+                return
+            data_in = line_in.decode().strip()
+            self.batches.put_nowait([(data_in, read_rx_clock())])
+            if data_in == "":
+                return # The serial timed out
+
+    async def get_batch(self, idle_timeout:float=None) -> list[tuple[str, float]]:
+        """
+        This method waits for the next batch of lines
+        @param self: Not needed in calls
+        @param idle_timeout: the number of seconds without a line before the stream is considered
+            over (None waits forever)
+        @return: a list of tuples containing each decoded and stripped line and the time it was
+            received (one empty line if the stream is over)
+        """
+        try:
+            item = await asyncio.wait_for(self.batches.get(), idle_timeout)
+        except asyncio.TimeoutError:
+            return [("", read_rx_clock())]
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def stop(self) -> None:
+        """
+        This method stops reading lines
+        @param self: Not needed in calls
+        @return: None
+        """
+        if self.use_fd:
+            self.loop.remove_reader(self.ser.fileno())
+        elif self.task is not None:
+            self.task.cancel()
+
+
+class ReplaySerial():
+    """
+    Class that stands in for a Serial object by replaying a recorded raw serial log, either in
+    real time, scaled in time, or as fast as possible
+    """
+
+    def __init__(self, log_name:str, speed:float=1.0, line_period:float=0.0, \
+                 reset_on_open:bool=True) -> None:
+        """
+        This method is the constructor (the whole log is loaded so that disk reads don't affect
+        the replay)
+        @param self: Not needed in calls
+        @param log_name: the name of the raw serial log (see read_raw_log())
+        @param speed: the replay speed relative to real time (e.g., 10 is 10x), or 0 to replay as
+            fast as possible
+        @param line_period: the number of seconds between lines for logs without receive times
+        @param reset_on_open: a boolean for restarting the log when the port is opened, which
+            mimics boards like the Uno R3 that reset when the connection is opened (if the log has
+            open markers from a RawTap, the replay skips to the next marker instead)
+        @return: None
+        """
+        records = []
+        self.open_inds = [] # Indices of the lines that were read right after the port was opened
+        for (rx_time, line) in read_raw_log(log_name):
+            if line is None:
+                self.open_inds.append(len(records))
+            else:
+                records.append((rx_time, line))
+        self.lines = [line for (_, line) in records]
+        # Receive times relative to the first line
+        if records and (records[0][0] is not None):
+            self.rel_times = [rx_time - records[0][0] for (rx_time, _) in records]
+        else:
+            self.rel_times = [ind*line_period for ind in range(len(records))]
+        self.speed = speed
+        self.reset_on_open = reset_on_open
+        self.ind = 0
+        self.open_ind = 0 # Index of the first line replayed since the port was opened
+        self.t_start:float = None # Wall-clock time of the first line replayed since opening
+        self.num_read = 0
+        self.is_open = False
+        self.timeout:float = None # Unused (the end of the log acts as a serial timeout)
+
+    def open(self) -> None:
+        """
+        This method "opens" the port, restarting the log if reset_on_open is set
+        @param self: Not needed in calls
+        @return: None
+        """
+        if self.open_inds:
+            # Skip anything the last connection didn't read
+            self.ind = next((ind for ind in self.open_inds if ind >= self.ind), self.ind)
+        elif self.reset_on_open:
+            self.ind = 0
+        self.open_ind = self.ind
+        self.t_start = None
+        self.is_open = True
+
+    def close(self) -> None:
+        """
+        This method "closes" the port
+        @param self: Not needed in calls
+        @return: None
+        """
+        self.is_open = False
+
+    def readline(self) -> bytes:
+        """
+        This method waits until the next line is due, then returns it
+        @param self: Not needed in calls
+        @return: the line as bytes (b"" at the end of the log, like a serial timeout)
+        """
+        if self.ind >= len(self.lines):
+            return b""
+        now = time.perf_counter()
+        if self.t_start is None:
+            self.t_start = now
+        elif self.speed > 0:
+            t_due = self.t_start + \
+                (self.rel_times[self.ind] - self.rel_times[self.open_ind])/self.speed
+            if t_due > now:
+                time.sleep(t_due - now)
+        line = self.lines[self.ind]
+        self.ind += 1
+        self.num_read += 1
+        return line
+
+
+# Functions
+def unwrap_serial(ser:PySerial) -> PySerial:
+    """
+    This function gets the port that a TappedSerial wraps, so that checking what a port can do
+    checks the real port (TappedSerial forwards every method, but the wrapped port may not have it)
+    @param ser: the Serial object, which may be a TappedSerial
+    @return: the wrapped Serial object (or ser if it isn't wrapped)
+    """
+    while isinstance(ser, TappedSerial):
+        ser = ser.ser
+    return ser
+
+
+def get_header_and_delay(ser:PySerial, ask_user:bool=True) -> tuple[str, float, float]:
+    """
+    This function finds the header of the data and the Arduino delay time between data lines
+    (the median of up to RATE_SAMPLE_INTERVALS intervals, so one late line doesn't matter)
+    It also finds the time the program should pause for after updating the graph
+    @param ser: the Serial object that is connected to the device
+    @param ask_user: a boolean for asking the user to add a delay if none is measured
+    @return: a tuple containing the header, the Arduino delay, and the graph pause time
+    """
+    print("\nMeasuring delay between Arduino data packets...")
+    ser.open()
+    (header_txt, _, rate, _) = measure_stream(ser)
+    ser.close()
+    (delay_ard, graph_pause) = report_delay(rate, ask_user)
+    return (header_txt, delay_ard, graph_pause)
+
+
+def measure_stream(ser:PySerial, start_timeout:float=0.0) \
+        -> tuple[str, float, RateEstimator, list[tuple[bytes, float]]]:
+    """
+    This function reads lines until the header, then measures the intervals between up to
+    RATE_SAMPLE_INTERVALS + 1 data lines (for at most about RATE_SAMPLE_TIME seconds)
+    @param ser: the Serial object that is connected to the device (it must already be open)
+    @param start_timeout: the number of seconds to wait for CLEARDATA, the header, and the first
+        data line (a TimeoutError is raised after that), or 0 to wait forever
+    @return: a tuple containing the header, its receive time, the RateEstimator of the measured
+        lines, and the measured lines (with their receive times)
+    """
+    data_started = read_header = False
+    rate = RateEstimator(RATE_SAMPLE_INTERVALS)
+    t_end = float("inf") # Set when the first data line is received
+    header_txt = ""
+    header_rx:float = None
+    measured = []
+    deadline = read_rx_clock() + start_timeout
+    port_timeout = ser.timeout
+    if start_timeout > 0:
+        # A short timeout lets a silent port (e.g., the wrong device) be noticed, and the port's own
+        # timeout is put back once the data starts
+        ser.timeout = min(start_timeout, START_POLL_INTERVAL)
+    while True:
+        line_in = ser.readline()
+        rx_time = read_rx_clock()
+        if (start_timeout > 0) and (rate.num_lines == 0):
+            if rx_time >= deadline:
+                raise TimeoutError(f"The data didn't start within {start_timeout:g} s (no " \
+                                   f"{DATA_START_AFTER}, header, and data line were received)")
+            if not line_in:
+                continue # Nothing was received before the timeout
+        data_in = line_in.decode().strip()
+        if not data_started:
+            if data_in.upper() == DATA_START_AFTER:
+                data_started = True
+        elif not read_header:
+            header_txt = data_in # Save the header
+            header_rx = rx_time
+            read_header = True
+        else:
+            measured.append((line_in, rx_time))
+            rate.add(rx_time)
+            if rate.num_lines == 1:
+                t_end = rx_time + RATE_SAMPLE_TIME
+                if start_timeout > 0:
+                    ser.timeout = port_timeout
+            # Stop after enough intervals, after too long, or if the data stopped
+            if (rate.num_lines > RATE_SAMPLE_INTERVALS) or \
+                    ((rate.num_lines > 1) and ((rx_time >= t_end) or (data_in == ""))):
+                break
+    return (header_txt, header_rx, rate, measured)
+
+
+def report_delay(rate:RateEstimator, ask_user:bool=True) -> tuple[float, float]:
+    """
+    This function prints the measured Arduino delay (and asks the user to add one if there is none)
+    @param rate: the RateEstimator of the measured lines
+    @param ask_user: a boolean for asking the user to add a delay if none is measured
+    @return: a tuple containing the Arduino delay and the graph pause time
+    """
+    (median, jitter) = rate.get_interval()
+    delay_ard = round(median, 3)
+    # Determine pause time for graph
+    graph_pause = 0.5*delay_ard # Account for data processing time (the 0.5 is arbitrary)
+    if (delay_ard == 0) and ask_user:
+        # This is unlikely to happen, but I must account for it
+        print("No notable Arduino delay between messages. There should be some sort of delay" \
+              " on the order of at least milliseconds.")
+        print("If you want to see the live graph, there must be some pause for it to update.")
+        print("If a delay is introduced, the graph and data-writing will lag behind, but there" \
+              " will be no gaps in the data stream.")
+        add_delay = input("Add a delay of 1 ms? ('y'/'n'): ").upper() == "Y"
+        if add_delay:
+            delay_ard = 0.001
+            graph_pause = 0.001
+    else:
+        print("Delay:", delay_ard, f"s (jitter: {round(jitter, 3)} s, intervals: " \
+              f"{len(rate.intervals)}).")
+    return (delay_ard, graph_pause)
+
+
+def open_stream(ser:PySerial, ask_user:bool=True, drain:bool=True, start_timeout:float=0.0) \
+        -> tuple[str, float, SerialReader]:
+    """
+    This function opens the port, finds the header and the Arduino delay, and hands the still-open
+    data stream to a SerialReader (including the lines read while measuring), so the board isn't
+    reset by reopening the port and no data is lost
+    @param ser: the Serial object that is connected to the device (it must be closed)
+    @param ask_user: a boolean for asking the user to add a delay if none is measured
+    @param drain: a boolean for starting the reader right away, so the serial buffer is emptied
+        while the user answers the remaining prompts
+    @param start_timeout: the number of seconds to wait for the data to start (a TimeoutError is
+        raised after that, and the port is left open), or 0 to wait forever
+    @return: a tuple containing the header, the Arduino delay, and the reader (see the handoff
+        parameter of get_and_write_data())
+    """
+    print("\nMeasuring delay between Arduino data packets...")
+    ser.open()
+    (header_txt, header_rx, rate, measured) = measure_stream(ser, start_timeout)
+    (delay_ard, _) = report_delay(rate, ask_user)
+    # The timeout is set on the open port, so the data stream can end
+    ser.timeout = rate.get_timeout()
+    # Nobody takes lines out of the queue until the prompts are answered, so it is unbounded
+    # (a bounded queue would drop lines after a few seconds at high data rates)
+    handoff = SerialReader(ser, 0, prelude=measured, stream_t0=header_rx)
+    if drain:
+        handoff.start()
+    return (header_txt, delay_ard, handoff)
+
+
+def read_raw_log(log_name:str) -> list[tuple[float, bytes]]:
+    """
+    This function reads a raw serial log, which is either a plain text file with one line per
+    serial line, or a file starting with RAW_LOG_MAGIC followed by records of a RAW_LOG_RECORD
+    (receive time and length) and the exact bytes of the line
+    (A record with a length of RAW_LOG_OPEN marks the port being opened and has no line bytes)
+    @param log_name: the name of the log file
+    @return: a list of (receive time, line) tuples, where the receive time is None for plain text
+        and the line is None for an open marker
+    """
+    with open(log_name, mode="rb") as f_in:
+        content = f_in.read()
+    if not content.startswith(RAW_LOG_MAGIC):
+        return [(None, line) for line in content.splitlines(keepends=True)]
+    records = []
+    pos = len(RAW_LOG_MAGIC)
+    rec_size = RAW_LOG_RECORD.size
+    while pos + rec_size <= len(content):
+        (rx_time, line_len) = RAW_LOG_RECORD.unpack_from(content, pos)
+        pos += rec_size
+        if line_len == RAW_LOG_OPEN:
+            records.append((rx_time, None))
+            continue
+        if pos + line_len > len(content):
+            break # The last record was cut off (e.g., the program was killed mid-write)
+        records.append((rx_time, content[pos:pos + line_len]))
+        pos += line_len
+    return records
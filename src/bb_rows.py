@@ -0,0 +1,303 @@
+'''
+The processing of each line of serial data (DATA, LABEL, and MSG rows and the directives)
+'''
+
+from __future__ import annotations
+# Python has a built-in datetime library
+from datetime import date, datetime, time as dt_time
+# Python has a built-in typing library
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from xlsxwriter.format import Format as XlsxFormat
+if __package__:
+    from .bb_common import (DATA_DELIM, RESET_TIMER, CLEAR_DATA, DATA_ROW, LABEL_ROW, MSG_ROW,
+                            KEY_WORDS, TIME_WORD, TIMER_WORD, DATE_WORD, ColumnKind, read_rx_clock)
+    from .bb_graph import GraphData
+    from .bb_file import FileData
+else:
+    # pylint: disable=import-error
+    from bb_common import (DATA_DELIM, RESET_TIMER, CLEAR_DATA, DATA_ROW, LABEL_ROW, MSG_ROW,
+                           KEY_WORDS, TIME_WORD, TIMER_WORD, DATE_WORD, ColumnKind, read_rx_clock)
+    from bb_graph import GraphData
+    from bb_file import FileData
+
+
+def get_row_type_and_num_cols(row_arr:list[str], default_row:str) -> tuple[str, int, bool]:
+    """
+    This function determines what a row is (i.e., LABEL or DATA)
+    If the first value is not a row type or directive, then the row is assumed to be the given
+    default
+    If the list is empty, the returned type will be None
+    @param row_arr: a list of each delimiter-separated value in the row
+    @param default_row: the default row type
+    @return: a tuple containing the row type, the number of columns, and a flag for a missing label
+    """
+    num_cols = len(row_arr)
+    missing_label = False
+    if num_cols == 0:
+        row_type = None
+    else:
+        col1 = row_arr[0].strip().upper()
+        if col1 == "":
+            row_type = None
+        elif col1 in KEY_WORDS:
+            row_type = col1
+        else:
+            missing_label = True
+            row_type = default_row # Set to default
+    return (row_type, num_cols, missing_label)
+
+
+def process_compiled_row(row:list[str], num_cols:int, timer_t0:float, file_struct:FileData, \
+                         graph_struct:GraphData, rx_time:float=None) -> bool:
+    """
+    This function processes a data row with the compiled row schema, which converts each column
+    with its precomputed kind and parses each needed number exactly once
+    @param row: a list of each delimiter-separated value in the row
+    @param num_cols: the number of delimeter-separated values in the row
+    @param timer_t0: the reference second count for the timer
+    @param file_struct: the FileData object containing the file-related information
+    @param graph_struct: the GraphData object containing the graph-related information
+    @param rx_time: the second count when the row was received (if None, the current time is used)
+    @return: a boolean that is false if the row deviated from the schema (nothing is written then)
+    """
+    schema = file_struct.row_schema
+    if not schema.matches(row, num_cols):
+        schema.record_miss()
+        return False
+    save_as_xlsx = file_struct.is_xlsx
+    is_live = graph_struct.is_live
+    plot_inds = graph_struct.plot_inds
+    # Numbers are only needed in the sheet, the capture, or for the graph (CSV keeps the original
+    # text)
+    parse_inds = schema.get_parse_inds(save_as_xlsx or file_struct.is_bin, \
+                                       plot_inds if is_live else ())
+    try:
+        nums = {col: float(row[col]) for col in parse_inds}
+    except ValueError:
+        schema.record_miss()
+        return False
+    schema.num_misses = 0
+    # The clock is read once for the whole row (if the row wasn't stamped when it was received)
+    rx_s = read_rx_clock() if rx_time is None else rx_time
+    timer_val = round(rx_s - timer_t0, 3)
+    time_val = date_val = None
+    if schema.has_datetime:
+        rx_datetime = datetime.fromtimestamp(rx_s)
+        time_val = rx_datetime.time()
+        date_val = rx_datetime.date()
+    if save_as_xlsx:
+        xlsx_nums = [(col, num, None) for (col, num) in nums.items()]
+        formats = file_struct.formats
+        xlsx_nums += [(col, timer_val, formats[ColumnKind.TIMER]) for col in schema.timer_inds]
+        xlsx_dates = [(col, time_val, formats[ColumnKind.TIME]) for col in schema.time_inds]
+        xlsx_dates += [(col, date_val, formats[ColumnKind.DATE]) for col in schema.date_inds]
+        xlsx_strs = [(col, row[col]) for col in schema.text_inds if row[col] != ""]
+        file_struct.write_typed_row(xlsx_nums, xlsx_dates, xlsx_strs)
+    elif file_struct.is_bin:
+        # TIME and DATE are stored as second counts
+        converted = {ColumnKind.TIMER: timer_val, ColumnKind.TIME: rx_s, ColumnKind.DATE: rx_s}
+        file_struct.write_bin_row([(kind, nums[col] if col in nums else \
+                                    converted.get(kind, row[col])) \
+                                   for (col, kind) in enumerate(schema.kinds)])
+    else:
+        for (inds, val) in ((schema.timer_inds, timer_val), (schema.time_inds, time_val), \
+                            (schema.date_inds, date_val)):
+            if inds:
+                val_str = str(val) # All values in CSV are strings
+                for col in inds:
+                    row[col] = val_str
+        file_struct.write_to_file(row)
+    if is_live:
+        converted = {ColumnKind.TIMER: timer_val, ColumnKind.TIME: time_val}
+        plot_vals = [nums[col] if col in nums else converted.get(schema.kinds[col], row[col]) \
+                     for col in plot_inds] # GraphData leaves gaps for text
+        graph_struct.add_to_buffers(*plot_vals)
+    file_struct.row_num += 1
+    return True
+
+
+def convert_cell(cell_data:str, rx_s:float, timer_t0:float, parse_num:bool) \
+        -> tuple[ColumnKind, float|str|date|dt_time]:
+    """
+    This function converts a cell of a data row by swapping out key words with their values and
+    parsing numbers
+    @param cell_data: the text of the cell
+    @param rx_s: the second count when the row was received
+    @param timer_t0: the reference second count for the timer
+    @param parse_num: a boolean for parsing the text as a number (numbers are only needed in the
+        sheet, the capture, or for the graph)
+    @return: a tuple with the ColumnKind enum and the value (the original text if the cell is TEXT)
+    """
+    cell_data_upper = cell_data.upper()
+    if cell_data_upper == TIME_WORD:
+        return (ColumnKind.TIME, datetime.fromtimestamp(rx_s).time())
+    if cell_data_upper == TIMER_WORD:
+        return (ColumnKind.TIMER, round(rx_s - timer_t0, 3))
+    if cell_data_upper == DATE_WORD:
+        return (ColumnKind.DATE, datetime.fromtimestamp(rx_s).date())
+    if parse_num:
+        try:
+            return (ColumnKind.NUMBER, float(cell_data))
+        except ValueError:
+            pass
+    return (ColumnKind.TEXT, cell_data)
+
+
+def process_data_row(row:list[str], num_cols:int, timer_t0:float, file_struct:FileData, \
+                     graph_struct:GraphData, rx_time:float=None):
+    """
+    This function processes a data row, which entails checking for key words, writing to file, and
+    graphing
+    @param row: a list of each delimiter-separated value in the row
+    @param num_cols: the number of delimeter-separated values in the row
+    @param timer_t0: the reference second count for the timer
+    @param file_struct: the FileData object containing the file-related information
+    @param graph_struct: the GraphData object containing the graph-related information
+    @param rx_time: the second count when the row was received (if None, the current time is used)
+    @return: None
+    """
+    # Use the compiled row schema when possible (the schema learns from rows before it compiles)
+    schema = file_struct.row_schema
+    if schema.is_compiled and \
+            process_compiled_row(row, num_cols, timer_t0, file_struct, graph_struct, rx_time):
+        return
+    if not schema.is_compiled:
+        schema.learn(row, num_cols)
+    # The plotted values of each plotted column
+    plot_inds = graph_struct.plot_inds
+    plotted:dict[int, float|str|dt_time] = {}
+    # The clock is read once for the whole row (if the row wasn't stamped when it was received)
+    rx_s = read_rx_clock() if rx_time is None else rx_time
+    # Pull often-used class variables
+    save_as_xlsx = file_struct.is_xlsx
+    formats = file_struct.formats
+    # Typed (column, value, format) cells for the Excel sheet, so each can skip xlsxwriter's
+    # generic type checks
+    xlsx_nums:list[tuple[int, float, XlsxFormat]] = []
+    xlsx_dates:list[tuple[int, date|dt_time, XlsxFormat]] = []
+    xlsx_strs:list[tuple[int, str]] = []
+    # (kind, value) cells for the binary capture, where TIME and DATE are second counts
+    is_bin = file_struct.is_bin
+    bin_cells:list[tuple[ColumnKind, float|str]] = []
+    # Begin data processing
+    for col in range(num_cols):
+        # Check if the data is a graphed value
+        is_plotted = col in plot_inds
+        (kind, value) = convert_cell(row[col], rx_s, timer_t0, save_as_xlsx or is_bin or is_plotted)
+        if is_plotted:
+            # GraphData converts times and leaves gaps for text
+            plotted[col] = value
+        # Write to file accordingly
+        if save_as_xlsx:
+            if kind in (ColumnKind.NUMBER, ColumnKind.TIMER):
+                xlsx_nums.append((col, value, formats.get(kind)))
+            elif kind in (ColumnKind.TIME, ColumnKind.DATE):
+                xlsx_dates.append((col, value, formats[kind]))
+            elif value != "":
+                xlsx_strs.append((col, value))
+        elif is_bin:
+            bin_cells.append((kind, rx_s if kind in (ColumnKind.TIME, ColumnKind.DATE) else value))
+        elif kind not in (ColumnKind.NUMBER, ColumnKind.TEXT):
+            # The row array is unused after the column iteration, so it can be reused for holding
+            # CSV values (numbers keep their original text)
+            row[col] = str(value) # All values in CSV are strings
+    # Deal with plot (class has live-checking logic), in the order of the graph's columns (x first)
+    if plot_inds:
+        graph_struct.add_to_buffers(*[plotted.get(col) for col in plot_inds])
+    # Write the typed cells to the sheet or capture, or the row array to the CSV file
+    if save_as_xlsx:
+        file_struct.write_typed_row(xlsx_nums, xlsx_dates, xlsx_strs)
+    elif is_bin:
+        file_struct.write_bin_row(bin_cells)
+    else:
+        file_struct.write_to_file(row)
+    # Increment row count
+    file_struct.row_num += 1
+
+
+def process_label_row(row:list[str], file_struct:FileData) -> None:
+    """
+    This function processes a label row
+    @param file_struct: the FileData object containing the file-related information
+    @return: None
+    """
+    file_struct.write_to_file(row, inc_row_num=True)
+
+
+def process_msg_row() -> None:
+    """
+    This function processes a message row
+    (Nothing is to be done in this case yet)
+    @return: None
+    """
+
+
+def process_reset_timer(rx_time:float=None) -> float:
+    """
+    This function processes the reset timer directive
+    @param rx_time: the second count when the directive was received (if None, the current time is
+        used)
+    @return: new reference second count for the timer
+    """
+    return read_rx_clock() if rx_time is None else rx_time # New timer_t0
+
+
+# This function processes the clear data directive
+def process_clear_data(file_struct:FileData, graph_struct:GraphData) -> None:
+    """
+    This function processes the clear data directive
+    @param file_struct: the FileData object containing the file-related information
+    @param graph_struct: the GraphData object containing the graph-related information
+    @return: None
+    """
+    file_struct.reset_current_page()
+    # GraphData has live-checking logic
+    graph_struct.reset_axes()
+    graph_struct.overwrite_buffers()
+
+
+def process_line(data_in:str, timer_t0:float, file_struct:FileData, graph_struct:GraphData, \
+                 rx_time:float=None) -> float:
+    """
+    This function parses a line of serial data and performs the action for its row type
+    @param data_in: the decoded and stripped line of serial data
+    @param timer_t0: the reference second count for the timer
+    @param file_struct: the FileData object containing the file-related information
+    @param graph_struct: the GraphData object containing the graph-related information
+    @param rx_time: the second count when the line was received (if None, the current time is used)
+    @return: the (possibly reset) reference second count for the timer
+    """
+    row = data_in.split(DATA_DELIM)
+    (row_type, num_cols, missing_label) = get_row_type_and_num_cols(row, DATA_ROW)
+    row_is_data = (row_type == DATA_ROW)
+    row_is_msg = (row_type == MSG_ROW)
+    # Check if the data stopped coming in
+    if row_type is None:
+        print("\nNo data received. Serial must've timed out.")
+        raise KeyboardInterrupt
+    # If the label is missing, add it
+    if missing_label and (not row_is_msg):
+        row = [row_type] + row
+        num_cols += 1
+    # Perform actions depending on the row type
+    if row_is_data:
+        if file_struct.rollover is not None:
+            # The clock is read here so the row and its segment get the same time
+            rx_time = read_rx_clock() if rx_time is None else rx_time
+            file_struct.roll_over_if_due(rx_time, timer_t0)
+        process_data_row(row, num_cols, timer_t0, file_struct, graph_struct, rx_time)
+    elif row_type == RESET_TIMER:
+        timer_t0 = process_reset_timer(rx_time)
+        file_struct.add_timer_reset(timer_t0)
+        file_struct.flush_file() # Make sure everything before the reset is on the disk
+    elif row_type == CLEAR_DATA:
+        process_clear_data(file_struct, graph_struct)
+    elif row_is_msg:
+        process_msg_row()
+    elif row_type == LABEL_ROW:
+        process_label_row(row, file_struct)
+    else:
+        # This line should not be reached, so it's good for troubleshooting
+        print(f"Unexpected row type: {row_type}")
+    return timer_t0
@@ -0,0 +1,863 @@
+'''
+The runs of BB-DAQ (reading, processing, and writing the data until the stream ends)
+'''
+
+from __future__ import annotations
+# Python has a built-in threading library
+import threading
+# Python has a built-in time library
+import time
+# Python has a built-in traceback library
+import traceback
+# If serial is not installed, type "python3 -m pip install pyserial" into a Terminal window
+# Note that if you have another serial library installed, it may interfere with this one
+import serial
+if __package__:
+    from .bb_common import (asyncio, list_ports, PySerial, RATE_TIMEOUT_CHANGE, READ_QUEUE_SIZE,
+                            RECONNECT_TIMEOUT, RECONNECT_POLL_INTERVAL, DATA_START_AFTER,
+                            DATA_DELIM, BAD_STARTS, BAD_ENDS, BAD_CHARS, CLEAR_DATA, GAP_ROW,
+                            GraphChoice, ConsoleStatus, read_rx_clock, get_int_input, get_file_name)
+    from .bb_graph import GraphData
+    from .bb_file import FileData
+    from .bb_reader import LineFramer, RateEstimator, SerialReader, unwrap_serial, AsyncLineReader
+    from .bb_rows import process_line
+else:
+    # pylint: disable=import-error
+    from bb_common import (asyncio, list_ports, PySerial, RATE_TIMEOUT_CHANGE, READ_QUEUE_SIZE,
+                           RECONNECT_TIMEOUT, RECONNECT_POLL_INTERVAL, DATA_START_AFTER, DATA_DELIM,
+                           BAD_STARTS, BAD_ENDS, BAD_CHARS, CLEAR_DATA, GAP_ROW, GraphChoice,
+                           ConsoleStatus, read_rx_clock, get_int_input, get_file_name)
+    from bb_graph import GraphData
+    from bb_file import FileData
+    from bb_reader import LineFramer, RateEstimator, SerialReader, unwrap_serial, AsyncLineReader
+    from bb_rows import process_line
+
+
+# Classes
+class RunLimits():
+    """
+    Class containing the limits that end a run on their own (for runs without anyone watching)
+    """
+
+    def __init__(self, duration:float=0.0, max_rows:int=0) -> None:
+        """
+        This method is the constructor
+        @param self: Not needed in calls
+        @param duration: the number of seconds of data to record (0 for no limit)
+        @param max_rows: the number of rows to write after the header (0 for no limit), counted
+            over every sheet/file the run rolls over into
+        @return: None
+        """
+        self.duration = duration
+        self.max_rows = max_rows
+        self.t_end:float = None # Set by the first line checked
+
+    def restart(self) -> "RunLimits":
+        """
+        This method makes the same limits for a new run
+        @param self: Not needed in calls
+        @return: the new RunLimits
+        """
+        return RunLimits(self.duration, self.max_rows)
+
+    def is_reached(self, file_struct:FileData, rx_time:float) -> bool:
+        """
+        This method checks if the run should end
+        @param self: Not needed in calls
+        @param file_struct: the FileData object containing the file-related information
+        @param rx_time: the receive time of the last line
+        @return: a boolean for whether a limit was reached
+        """
+        if self.t_end is None:
+            self.t_end = rx_time + self.duration if self.duration > 0 else float("inf")
+        if rx_time >= self.t_end:
+            print(f"\nReached the time limit ({self.duration:g} s).")
+            return True
+        if 0 < self.max_rows <= file_struct.get_run_rows():
+            print(f"\nReached the row limit ({self.max_rows} rows).")
+            return True
+        return False
+
+
+class RunOptions(): # pylint: disable=too-few-public-methods
+    """
+    Class containing the options of each run of a session (how the data is read, and what ends a
+    run)
+    """
+
+    def __init__(self, threaded:bool=False, *, use_asyncio:bool=False, \
+                 reconnect_timeout:float=0.0, limits:RunLimits=None, echo:bool=False) -> None:
+        """
+        This method is the constructor
+        @param self: Not needed in calls
+        @param threaded: a boolean for reading the serial data in a separate thread (the data is
+            still processed, written, and plotted in the main thread)
+        @param use_asyncio: a boolean for reading and processing the serial data with asyncio tasks
+            (see async_acquire()), which takes priority over threaded
+        @param reconnect_timeout: the number of seconds to wait for the board to come back after it
+            resets or the connection is lost (see StreamGuard), or 0 to end the run when the data
+            stops (only for the blocking and threaded reads)
+        @param limits: the RunLimits that end the run (e.g., for headless runs), or None
+        @param echo: a boolean for printing every line of data instead of a status line that is
+            redrawn every STATUS_INTERVAL seconds (see ConsoleStatus)
+        @return: None
+        """
+        self.threaded = threaded
+        self.use_asyncio = use_asyncio
+        self.reconnect_timeout = reconnect_timeout
+        self.limits = limits
+        self.echo = echo
+
+    def restart(self) -> RunOptions:
+        """
+        This method makes the same options for a new run (with limits that haven't been reached)
+        @param self: Not needed in calls
+        @return: the new RunOptions
+        """
+        return RunOptions(self.threaded, use_asyncio=self.use_asyncio, \
+                          reconnect_timeout=self.reconnect_timeout, \
+                          limits=None if self.limits is None else self.limits.restart(), \
+                          echo=self.echo)
+
+
+class StreamGuard():
+    """
+    Class that watches a data stream for board resets (CLEARDATA and the header being sent again)
+    and lost connections (timeouts, read errors, or the port leaving the port list), reconnects, and
+    marks each restart in the file, so long unattended runs survive transient USB drops
+    """
+
+    def __init__(self, ser:PySerial, file_struct:FileData, \
+                 reconnect_timeout:float=RECONNECT_TIMEOUT, \
+                 poll_interval:float=RECONNECT_POLL_INTERVAL) -> None:
+        """
+        This method is the constructor
+        @param self: Not needed in calls
+        @param ser: the Serial object that is connected to the device
+        @param file_struct: the FileData object containing the file-related information
+        @param reconnect_timeout: the number of seconds to wait for a lost data stream to come back
+        @param poll_interval: the number of seconds between checks for a lost port
+        @return: None
+        """
+        self.ser = ser
+        self.file_struct = file_struct
+        self.port:str = getattr(ser, "port", None) # Only named ports can be found in the port list
+        self.reconnect_timeout = reconnect_timeout
+        self.poll_interval = poll_interval
+        # CLEARDATA is held until the next line shows whether the board reset
+        self.held_clear:tuple[str, float] = None
+        self.last_rx:float = None # Receive time of the last line (not counting held lines)
+        self.lost_at:float = None # Time the data stream was found lost (None while it isn't)
+        self.is_closed = False # Whether the port was closed after it was lost
+        self.reopened = False # Whether the port was reopened since the data stream was lost
+        self.restarts:list[tuple[str, float]] = [] # Reason and gap (in seconds) of each restart
+
+    def screen(self, data_in:str, rx_time:float) -> list[tuple[str, float]]:
+        """
+        This method checks a line for a restart of the data stream
+        @param self: Not needed in calls
+        @param data_in: the decoded and stripped line of serial data
+        @param rx_time: the second count when the line was received
+        @return: a list of tuples containing each line (and its receive time) to process now (an
+            empty line is only passed on once the data stream is given up on)
+        """
+        if data_in == "":
+            lines = [] if self.held_clear is None else [self.held_clear]
+            self.held_clear = None
+            if not self.recover():
+                lines.append((data_in, rx_time))
+            return lines
+        if (self.held_clear is None) and (data_in.upper() == CLEAR_DATA):
+            self.held_clear = (data_in, rx_time)
+            return []
+        if (self.held_clear is not None) and (data_in == self.file_struct.header_txt):
+            # The board started over, so the header (which is already written) is skipped
+            self.held_clear = None
+            self.mark_restart("Board reset", rx_time)
+            return []
+        if self.lost_at is not None:
+            self.mark_restart("Reconnected" if self.reopened else "Resumed", rx_time)
+        lines = [(data_in, rx_time)]
+        if self.held_clear is not None:
+            lines.insert(0, self.held_clear)
+            self.held_clear = None
+        self.last_rx = rx_time
+        return lines
+
+    def lose_port(self) -> None:
+        """
+        This method closes the port after a read error, so it is reopened once it is back
+        @param self: Not needed in calls
+        @return: None
+        """
+        if not self.is_closed:
+            self.ser.close()
+            self.is_closed = True
+
+    def recover(self) -> bool:
+        """
+        This method waits for the port to come back (reopening it if it was lost) after a timeout
+        or read error
+        @param self: Not needed in calls
+        @return: a boolean for whether to keep reading (false once reconnect_timeout has passed)
+        """
+        now = time.monotonic()
+        if self.lost_at is None:
+            self.lost_at = now
+            print(f"\nNo data received. Waiting up to {self.reconnect_timeout:g} s for the " \
+                  "board to reconnect...")
+        if now - self.lost_at > self.reconnect_timeout:
+            return False
+        if (self.port is not None) and \
+                (self.port not in {info.device for info in list_ports.comports()}):
+            self.lose_port()
+            time.sleep(self.poll_interval)
+        elif self.is_closed:
+            try:
+                self.ser.open()
+            except (serial.SerialException, OSError):
+                time.sleep(self.poll_interval)
+                return True
+            self.is_closed = False
+            self.reopened = True
+        return True
+
+    def mark_restart(self, reason:str, rx_time:float) -> None:
+        """
+        This method records a restart of the data stream and writes a gap row to the file
+        @param self: Not needed in calls
+        @param reason: the cause of the restart
+        @param rx_time: the receive time of the first line after the restart
+        @return: None
+        """
+        gap = 0.0 if self.last_rx is None else rx_time - self.last_rx
+        self.restarts.append((reason, gap))
+        self.last_rx = rx_time
+        self.lost_at = None
+        self.reopened = False
+        print(f"\n{reason}: the data resumed after a {gap:.3f} s gap.\n")
+        self.file_struct.write_to_file([GAP_ROW, reason, f"{gap:.3f}"], inc_row_num=True)
+
+    def describe(self) -> str:
+        """
+        This method describes the restarts of the data stream
+        @param self: Not needed in calls
+        @return: a string with the number of restarts and the longest gap
+        """
+        if not self.restarts:
+            return "Stream restarts: 0"
+        num_resets = sum(reason == "Board reset" for (reason, _) in self.restarts)
+        longest = max(gap for (_, gap) in self.restarts)
+        return f"Stream restarts: {len(self.restarts)} (board resets: {num_resets}), " \
+            f"longest gap: {longest:.3f} s"
+
+
+class PortWorker(threading.Thread):
+    """
+    Class containing the thread that reads, processes, and writes the data from one port when
+    several ports are used at once
+    """
+
+    def __init__(self, ser:PySerial, file_struct:FileData, tag:str, timer_t0:float, \
+                 stop_event:threading.Event, *, handoff:SerialReader=None, \
+                 status:ConsoleStatus=None) -> None:
+        """
+        This method is the constructor
+        @param self: Not needed in calls
+        @param ser: the Serial object that is connected to the device (with a timeout)
+        @param file_struct: the FileData object for this port's output
+        @param tag: the name of the port, which starts each printed line and names the sheet
+        @param timer_t0: the reference second count for the timer (shared by all ports)
+        @param stop_event: the event that stops every port
+        @param handoff: the SerialReader of a data stream that open_stream() already started (the
+            port is left open and the header is already read), or None to open the port here
+        @param status: the ConsoleStatus that counts the lines of every port, or None to print every
+            line
+        @return: None
+        """
+        super().__init__(daemon=True)
+        self.ser = ser
+        self.file_struct = file_struct
+        self.tag = tag
+        self.timer_t0 = timer_t0
+        self.stop_event = stop_event
+        self.handoff = handoff
+        self.status = status
+        self.graph_struct = GraphData(GraphChoice.NONE, -1, -1)
+        self.num_lines = 0
+        self.error_txt:str = None # Traceback of the error that ended the thread (if any)
+
+    def run(self) -> None:
+        """
+        This method reads lines until the serial times out, an error occurs, or every port is
+        stopped
+        @param self: Not needed in calls
+        @return: None
+        """
+        self.file_struct.add_formatted_sheet(get_tag_sheet_name(self.tag))
+        timer_t0 = self.timer_t0
+        pending:list[tuple[str, float]] = [] # Lines read before the loop started
+        if self.handoff is None:
+            self.ser.open()
+        try:
+            if self.handoff is None:
+                skip_to_data(self.ser)
+            else:
+                pending = self.handoff.drain()
+            self.file_struct.write_header()
+            for (data_in, rx_time) in pending:
+                timer_t0 = self.process(data_in, rx_time, timer_t0)
+            while not self.stop_event.is_set():
+                line_in = self.ser.readline()
+                rx_time = read_rx_clock()
+                timer_t0 = self.process(line_in.decode().strip(), rx_time, timer_t0)
+        except KeyboardInterrupt:
+            pass # The serial timed out
+        except:
+            self.error_txt = traceback.format_exc()
+        finally:
+            self.ser.close()
+            self.file_struct.flush_file()
+
+    def process(self, data_in:str, rx_time:float, timer_t0:float) -> float:
+        """
+        This method prints (or counts) and processes a line from this port
+        @param self: Not needed in calls
+        @param data_in: the decoded and stripped line of serial data
+        @param rx_time: the second count when the line was received
+        @param timer_t0: the reference second count for the timer
+        @return: the (possibly reset) reference second count for the timer
+        """
+        if self.status is None:
+            print(f"[{self.tag}] {data_in}")
+        else:
+            # An empty line is a timeout
+            self.status.add_line(f"[{self.tag}] {data_in}" if data_in else "")
+        timer_t0 = process_line(data_in, timer_t0, self.file_struct, self.graph_struct, rx_time)
+        self.num_lines += 1
+        return timer_t0
+
+
+class AcquisitionSession():
+    """
+    Class that runs BB-DAQ as many times in a row as the user wants with the same settings (each
+    run in a new file/worksheet), one run after another instead of one inside another, so the
+    state of each run is released before the next one starts
+    """
+
+    def __init__(self, ser:PySerial, file_struct:FileData, graph_struct:GraphData, \
+                 options:RunOptions=None) -> None:
+        """
+        This method is the constructor
+        @param self: Not needed in calls
+        @param ser: the Serial object that is connected to the device
+        @param file_struct: the FileData object containing the file-related information
+        @param graph_struct: the GraphData object of the first run (the next runs get their own)
+        @param options: the RunOptions of the first run (the next runs get their own limits), or
+            None for the defaults
+        @return: None
+        """
+        self.ser = ser
+        self.file_struct = file_struct
+        self.graph_struct = graph_struct
+        self.options = RunOptions() if options is None else options
+        self.num_runs = 0
+        self.num_failed = 0 # Runs that ended because something went wrong
+
+    def run(self, sheet_name:str=None, ask_rerun:bool=True, handoff:SerialReader=None) -> int:
+        """
+        This method does the runs until the user doesn't want another one, then closes the file
+        @param self: Not needed in calls
+        @param sheet_name: a valid sheet name for the first run (if None, the user is asked)
+        @param ask_rerun: a boolean for asking the user to run again after each run
+        @param handoff: the SerialReader of a data stream that open_stream() already started for
+            the first run, or None
+        @return: the number of runs
+        """
+        file_struct = self.file_struct
+        while True:
+            succeeded = acquire_once(self.ser, file_struct, self.graph_struct, self.options, \
+                                     sheet_name, handoff=handoff)
+            if not succeeded:
+                self.num_failed += 1
+            self.num_runs += 1
+            # Give the user the option to run BB-DAQ again with the same settings
+            # (but in a new file/worksheet)
+            (run_again, new_file) = ask_to_run_again(file_struct.is_xlsx) if ask_rerun \
+                else (False, False)
+            # Add the chart before moving on from the worksheet
+            if self.graph_struct.is_graphed:
+                file_struct.add_chart_to_sheet(self.graph_struct.time_col_ind, \
+                                               self.graph_struct.data_col_inds)
+            if not run_again:
+                break
+            self.prepare_next_run(new_file)
+            # The next run reopens the port and asks for a sheet name
+            (sheet_name, handoff) = (None, None)
+        file_struct.close_workbook()
+        return self.num_runs
+
+    def prepare_next_run(self, new_file:bool) -> None:
+        """
+        This method switches to a new file (if asked) and drops the state of the last run (the
+        graph's figure and arrays, and the reached limits) before the next run starts
+        @param self: Not needed in calls
+        @param new_file: a boolean for asking the user for a new file (instead of a new worksheet)
+        @return: None
+        """
+        if new_file:
+            file_name = get_file_name(self.file_struct.is_xlsx, self.file_struct.is_bin)
+            self.file_struct.switch_to_new_file(file_name)
+        self.graph_struct = self.graph_struct.restart()
+        self.options = self.options.restart()
+
+
+# Functions
+def adapt_to_rate(rate:RateEstimator, ser:PySerial, graph_struct:GraphData) -> None:
+    """
+    This function updates the serial timeout (if the port has one) to match the measured data rate,
+    and shows the data rate on the live graph
+    @param rate: the RateEstimator of the data stream
+    @param ser: the Serial object that is connected to the device
+    @param graph_struct: the GraphData object containing the graph-related information
+    @return: None
+    """
+    timeout = rate.get_timeout()
+    old_timeout = getattr(ser, "timeout", None)
+    # Changing the timeout reconfigures the port, so it is only done for notable changes
+    if (timeout is not None) and (old_timeout is not None) and \
+            (abs(timeout - old_timeout) > RATE_TIMEOUT_CHANGE*old_timeout):
+        ser.timeout = timeout
+    graph_struct.show_rate(rate.describe())
+
+
+def skip_to_data(ser:PySerial) -> None:
+    """
+    This function reads lines until DATA_START_AFTER and the header have been read
+    @param ser: the Serial object that is connected to the device (it must already be open)
+    @return: None
+    """
+    data_started = False
+    # Loop until we hit DATA_START_AFTER
+    while not data_started:
+        # Read in a line of data and parse it
+        data_in = ser.readline().decode().strip()
+        data_started = (data_in.upper() == DATA_START_AFTER)
+    # Now we're onto the header
+    _ = ser.readline() # Discard the header since we already have it
+
+
+async def async_process_lines(reader:AsyncLineReader, timer_t0:float, file_struct:FileData, \
+                              graph_struct:GraphData, rate:RateEstimator, \
+                              limits:RunLimits=None, *, status:ConsoleStatus=None) -> None:
+    """
+    This function processes lines from the async reader until the stream ends
+    @param reader: the AsyncLineReader of the serial port
+    @param timer_t0: the reference second count for the timer
+    @param file_struct: the FileData object containing the file-related information
+    @param graph_struct: the GraphData object containing the graph-related information
+    @param rate: the RateEstimator of the data stream (the idle timeout follows ser.timeout, which
+        follows the data rate)
+    @param limits: the RunLimits that end the run, or None
+    @param status: the ConsoleStatus that counts the lines, or None to print every line
+    @return: None
+    """
+    ser = reader.ser
+    try:
+        while True:
+            batch = await reader.get_batch(getattr(ser, "timeout", None))
+            if not batch:
+                continue
+            if rate.add(batch[-1][1], len(batch)):
+                adapt_to_rate(rate, ser, graph_struct)
+            timer_t0 = process_batch(batch, timer_t0, file_struct, graph_struct, limits=limits, \
+                                     status=status)
+    except KeyboardInterrupt:
+        pass # The stream ended
+
+
+async def async_flush_file(file_struct:FileData) -> None:
+    """
+    This function flushes the output file on schedule, even while no data is coming in
+    @param file_struct: the FileData object containing the file-related information
+    @return: None
+    """
+    while True:
+        await asyncio.sleep(file_struct.flush_interval)
+        file_struct.flush_if_due()
+
+
+async def async_refresh_graph(graph_struct:GraphData) -> None:
+    """
+    This function refreshes the live graph on schedule until a key is pressed
+    @param graph_struct: the GraphData object containing the graph-related information
+    @return: None
+    """
+    try:
+        while True:
+            await asyncio.sleep(graph_struct.frame_interval)
+            graph_struct.plot_buffer_data()
+    except KeyboardInterrupt:
+        pass # A key was pressed
+
+
+async def async_acquire(ser:PySerial, timer_t0:float, file_struct:FileData, \
+                        graph_struct:GraphData, pending:list[tuple[str, float]]=None, *, \
+                        rate:RateEstimator=None, options:RunOptions=None) -> None:
+    """
+    This function runs the reader, processor, file flusher, and graph refresher as cooperative
+    asyncio tasks until the stream ends or a key is pressed on the graph
+    (The end of the stream is found with an idle timeout of ser.timeout instead of relying on the
+    serial timeout)
+    @param ser: the Serial object that is connected to the device (it must already be open)
+    @param timer_t0: the reference second count for the timer
+    @param file_struct: the FileData object containing the file-related information
+    @param graph_struct: the GraphData object containing the graph-related information
+    @param pending: the lines (with their receive times) that were read before the tasks started
+    @param rate: the RateEstimator of the data stream (if None, a new one is made)
+    @param options: the RunOptions of the run (if None, the defaults are used)
+    @return: None
+    """
+    options = RunOptions() if options is None else options
+    reader = AsyncLineReader(ser)
+    if pending:
+        reader.batches.put_nowait(pending)
+    reader.start()
+    rate = RateEstimator() if rate is None else rate
+    status = None if options.echo else ConsoleStatus()
+    tasks = [asyncio.create_task(async_process_lines(reader, timer_t0, file_struct, \
+                                                     graph_struct, rate, options.limits, \
+                                                     status=status)), \
+             asyncio.create_task(async_flush_file(file_struct))]
+    if graph_struct.is_live:
+        # Only the graph task refreshes the graph
+        graph_struct.next_refresh = float("inf")
+        tasks.append(asyncio.create_task(async_refresh_graph(graph_struct)))
+    try:
+        # The flush task never ends, so this waits for the stream to end or a key press
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        reader.stop()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if status is not None:
+            status.finish()
+        if graph_struct.is_live:
+            graph_struct.next_refresh = None
+    for task in tasks:
+        if task.done() and (not task.cancelled()) and (task.exception() is not None):
+            raise task.exception()
+
+
+def read_batch(ser:PySerial, reader:SerialReader=None, framer:LineFramer=None, \
+               timeout:float=None) -> list[tuple[str, float]]:
+    """
+    This function reads the next batch of lines from the reader thread, the line framer, or the
+    port itself (in that order of preference)
+    @param ser: the Serial object that is connected to the device (it must already be open)
+    @param reader: the SerialReader of the port, or None
+    @param framer: the LineFramer of the port, or None
+    @param timeout: the maximum number of seconds to wait for the reader thread (if None, it waits
+        for a line)
+    @return: a list of tuples containing each decoded and stripped line and its receive time (empty
+        if the reader thread had no line before the timeout)
+    """
+    if reader is not None:
+        line = reader.get_line(timeout)
+        return [] if line is None else [line]
+    if framer is not None:
+        return framer.read_lines(ser)
+    line_in = ser.readline()
+    return [(line_in.decode().strip(), read_rx_clock())]
+
+
+def restart_reading(reader:SerialReader=None, framer:LineFramer=None) -> SerialReader:
+    """
+    This function gets the reader thread and line framer ready to read again after the data stream
+    was lost and found again
+    @param reader: the SerialReader of the port (which ended when the stream was lost), or None
+    @param framer: the LineFramer of the port, or None
+    @return: the new SerialReader (or None if there was none)
+    """
+    if framer is not None:
+        framer.clear()
+    return None if reader is None else reader.restart()
+
+
+def process_batch(batch:list[tuple[str, float]], timer_t0:float, file_struct:FileData, \
+                  graph_struct:GraphData, *, guard:StreamGuard=None, limits:RunLimits=None, \
+                  status:ConsoleStatus=None) -> float:
+    """
+    This function prints and processes a batch of lines
+    @param batch: a list of tuples containing each decoded and stripped line and its receive time
+    @param timer_t0: the reference second count for the timer
+    @param file_struct: the FileData object containing the file-related information
+    @param graph_struct: the GraphData object containing the graph-related information
+    @param guard: the StreamGuard that screens each line for restarts of the data stream, or None
+    @param limits: the RunLimits that end the run, or None
+    @param status: the ConsoleStatus that counts the lines, or None to print every line
+    @return: the (possibly reset) reference second count for the timer
+    """
+    for (data_in, rx_time) in batch:
+        if status is None:
+            print(data_in)
+        else:
+            status.add_line(data_in)
+        if guard is None:
+            timer_t0 = process_line(data_in, timer_t0, file_struct, graph_struct, rx_time)
+        else:
+            for (line, line_rx) in guard.screen(data_in, rx_time):
+                timer_t0 = process_line(line, timer_t0, file_struct, graph_struct, line_rx)
+        # The run ends like it does when the data stops
+        if (limits is not None) and limits.is_reached(file_struct, rx_time):
+            raise KeyboardInterrupt
+    return timer_t0
+
+
+def start_reader(ser:PySerial, threaded:bool, handoff:SerialReader=None) \
+        -> tuple[SerialReader, list[tuple[str, float]]]:
+    """
+    This function starts the reader thread (if one is used) and takes the lines that were already
+    read from the data stream
+    @param ser: the Serial object that is connected to the device (it must already be open)
+    @param threaded: a boolean for reading the serial data in a separate thread
+    @param handoff: the SerialReader of a data stream that open_stream() already started, or None
+    @return: a tuple containing the reader (None if the data isn't read in a thread) and the lines
+        (with their receive times) to process before reading any more
+    """
+    if handoff is None:
+        reader = SerialReader(ser) if threaded else None
+        if reader is not None:
+            reader.start()
+        return (reader, [])
+    pending = handoff.drain()
+    # The lines sent during the prompts are taken out of the unbounded queue first, so the run's
+    # reader can have the usual bounded queue
+    reader = handoff.restart(READ_QUEUE_SIZE) if threaded else None
+    return (reader, pending)
+
+
+def prepare_run(file_struct:FileData, graph_struct:GraphData, sheet_name:str=None) -> None:
+    """
+    This function adds the sheet of a run and labels its graph
+    @param file_struct: the FileData object containing the file-related information
+    @param graph_struct: the GraphData object containing the graph-related information
+    @param sheet_name: a valid sheet name (if None, the user is asked for one)
+    @return: None
+    """
+    # Find how many columns the header has
+    header = file_struct.header_txt.split(DATA_DELIM)
+
+    # FileData has the logic to check if a spreadsheet is used
+    file_struct.add_formatted_sheet(sheet_name)
+
+    # GraphData has the logic to check if the graph is live
+    x_label = header[graph_struct.time_col_ind]
+    y_labels = [header[col] for col in graph_struct.data_col_inds]
+    graph_struct.set_ax_labels(x_label, y_labels)
+
+    # Make sure that the graphing choice makes sense
+    if (not file_struct.is_xlsx) and (graph_struct.user_gc == GraphChoice.EXCEL_ONLY):
+        graph_struct.disable_graph()
+    # Sheets that fill up during the run get their chart when the run rolls over
+    file_struct.chart_cols = (graph_struct.time_col_ind, graph_struct.data_col_inds) \
+        if graph_struct.is_graphed else None
+
+
+def acquire_once(ser:PySerial, file_struct:FileData, graph_struct:GraphData, \
+                 options:RunOptions=None, sheet_name:str=None, *, handoff:SerialReader=None) \
+        -> bool:
+    """
+    This function does the reading of serial data and writing of the output file for one run (the
+    file is left open for the next run, see AcquisitionSession)
+    @param ser: the Serial object that is connected to the device
+    @param file_struct: the FileData object containing the file-related information
+    @param graph_struct: the GraphData object containing the graph-related information
+    @param options: the RunOptions of the run (if None, the defaults are used)
+    @param sheet_name: a valid sheet name (if None, the user is asked for one)
+    @param handoff: the SerialReader of a data stream that open_stream() already started (the port
+        is left open and the header is already read), or None to open the port here
+    @return: a boolean that is false if the run ended because something went wrong
+    """
+    options = RunOptions() if options is None else options
+    prepare_run(file_struct, graph_struct, sheet_name)
+    timer_t0 = read_rx_clock()
+    rate = RateEstimator() # Tracks the data rate during the run
+    reader:SerialReader = None
+    pending:list[tuple[str, float]] = [] # Lines read before the loop started
+    guard:StreamGuard = None
+    status:ConsoleStatus = None
+    succeeded = True
+    if (options.reconnect_timeout > 0) and (not options.use_asyncio):
+        guard = StreamGuard(ser, file_struct, options.reconnect_timeout)
+    # Ports that can say how many bytes are waiting are read in chunks instead of line by line
+    # (The class is checked since in_waiting is a property that fails while the port is closed)
+    framer = LineFramer() if hasattr(type(unwrap_serial(ser)), "in_waiting") else None
+    if handoff is None:
+        ser.open()
+    else:
+        timer_t0 = handoff.stream_t0
+    try:
+        print("\nThere are three ways to stop the program:")
+        print("  Press any key while the graph window is selected.")
+        print("  Press the Reset button on the Arduino.")
+        print("  Press Ctrl+C (use as last resort).\n")
+        if handoff is None:
+            skip_to_data(ser)
+        file_struct.write_header()
+        # Now we're onto the data
+        (reader, pending) = start_reader(ser, options.threaded and (not options.use_asyncio), \
+                                         handoff)
+        if options.use_asyncio:
+            asyncio.run(async_acquire(ser, timer_t0, file_struct, graph_struct, pending, \
+                                      rate=rate, options=options))
+            raise KeyboardInterrupt
+        if not options.echo:
+            status = ConsoleStatus()
+        # A live graph keeps seeing keypresses (and drawing its last points) while the stream stalls
+        idle_timeout = graph_struct.frame_interval if graph_struct.is_live else None
+        while True:
+            # The rows are iterated by the while loop, but columns will be iterated by the for loop
+            # Read in a batch of lines (with their receive times, if known) and parse them
+            try:
+                if pending:
+                    (batch, pending) = (pending, [])
+                else:
+                    batch = read_batch(ser, reader, framer, idle_timeout)
+            except (serial.SerialException, OSError):
+                if guard is None:
+                    raise
+                # Handled like a timeout, but the port is reopened once it is back
+                guard.lose_port()
+                batch = [("", read_rx_clock())]
+            if not batch:
+                # Nothing came before the timeout, so handle the graph's events (e.g., a keypress)
+                graph_struct.plot_buffer_data()
+                continue
+            if rate.add(batch[-1][1], len(batch)):
+                adapt_to_rate(rate, ser, graph_struct)
+            timer_t0 = process_batch(batch, timer_t0, file_struct, graph_struct, guard=guard, \
+                                     limits=options.limits, status=status)
+            if (guard is not None) and (batch[-1][0] == ""):
+                # The stream came back (or the run would have ended), so start reading again
+                reader = restart_reading(reader, framer)
+    except KeyboardInterrupt:
+        print("\nExiting...")
+    except:
+        print(f"\nSomething went wrong:\n{traceback.format_exc()}\n")
+        succeeded = False
+    finally:
+        if status is not None:
+            status.finish()
+        if reader is not None:
+            reader.stop()
+            reader.print_stats()
+        print(rate.describe())
+        if guard is not None:
+            print(guard.describe())
+        ser.close()
+        # FileData has the logic to check if there is a CSV file to flush
+        file_struct.flush_file()
+        # GraphData has the logic to check if the graph is live
+        graph_struct.close_fig()
+    return succeeded
+
+
+def ask_to_run_again(save_as_xlsx:bool) -> tuple[bool, bool]:
+    """
+    This function asks the user whether to run BB-DAQ again with the same settings (but in a new
+    file/worksheet)
+    @param save_as_xlsx: a boolean for the file extension (true:".xlsx", false:".csv")
+    @return: a tuple containing a boolean for running again and a boolean for using a new file
+    """
+    print("\nWould you like to run BB-DAQ again with the same settings,"\
+          " but with the output in a new file/worksheet?")
+    rerun_prompt = "Enter 0 to exit, or enter 1 to run again: "
+    run_again = (get_int_input(rerun_prompt, 0, 1) == 1)
+    new_file = True # Default for CSV
+    if run_again and save_as_xlsx:
+        rerun_prompt_xlsx = "Enter 0 to make a new worksheet in the same workbook,"\
+            " or enter 1 to make a new workbook: "
+        new_file = (get_int_input(rerun_prompt_xlsx, 0, 1) == 1)
+    return (run_again, new_file)
+
+
+def get_and_write_data(ser:PySerial, file_struct:FileData, graph_struct:GraphData, \
+                       options:RunOptions=None, sheet_name:str=None, ask_rerun:bool=True, *, \
+                       handoff:SerialReader=None) -> bool:
+    """
+    This function does the reading of serial data and writing of the output file, and then runs
+    again for as long as the user wants (see acquire_once() and AcquisitionSession)
+    @param ser: the Serial object that is connected to the device
+    @param file_struct: the FileData object containing the file-related information
+    @param graph_struct: the GraphData object containing the graph-related information
+    @param options: the RunOptions of the first run (see AcquisitionSession), or None for the
+        defaults
+    @param sheet_name: a valid sheet name (if None, the user is asked for one)
+    @param ask_rerun: a boolean for asking the user to run again (if false, the file is closed)
+    @param handoff: see acquire_once()
+    @return: a boolean that is false if any run ended because something went wrong
+    """
+    session = AcquisitionSession(ser, file_struct, graph_struct, options)
+    session.run(sheet_name, ask_rerun, handoff)
+    return session.num_failed == 0
+
+
+def get_tag_sheet_name(tag:str) -> str:
+    """
+    This function makes a valid sheet name from a port's tag
+    @param tag: the name of the port
+    @return: the sheet name
+    """
+    sheet_name = "".join("_" if char in BAD_CHARS else char for char in tag)
+    sheet_name = sheet_name.strip("".join(BAD_STARTS | BAD_ENDS))
+    return sheet_name[-31:] or "Sheet1" # Excel sheet names are at most 31 characters
+
+
+def acquire_ports(sers:list[PySerial], file_structs:list[FileData], tags:list[str], \
+                  handoffs:list[SerialReader]=None, echo:bool=False) -> None:
+    """
+    This function reads, processes, and writes the data from several ports at once, each in its
+    own thread (and to its own file), with the TIMER and TIME values of every port taken from one
+    clock
+    @param sers: the Serial objects that are connected to the devices (with timeouts)
+    @param file_structs: the FileData objects for the outputs, in the same order as sers
+    @param tags: the names of the ports, in the same order as sers
+    @param handoffs: the SerialReader of each data stream that open_stream() already started, in
+        the same order as sers (the timer starts at the first header), or None to open the ports
+        here (the timer starts now)
+    @param echo: a boolean for printing every line of data (with its port's name) instead of one
+        status line for every port
+    @return: None
+    """
+    stop_event = threading.Event()
+    status = None if echo else ConsoleStatus()
+    if handoffs is None:
+        (handoffs, timer_t0) = ([None]*len(sers), read_rx_clock())
+    else:
+        timer_t0 = min(handoff.stream_t0 for handoff in handoffs)
+    workers = [PortWorker(ser, file_struct, tag, timer_t0, stop_event, handoff=handoff, \
+                          status=status) \
+               for (ser, file_struct, tag, handoff) in zip(sers, file_structs, tags, handoffs)]
+    print("\nThere are two ways to stop the program:")
+    print("  Press the Reset button on every Arduino.")
+    print("  Press Ctrl+C.\n")
+    for worker in workers:
+        worker.start()
+    try:
+        while any(worker.is_alive() for worker in workers):
+            workers[0].join(0.1) # Joining with a timeout keeps Ctrl+C responsive
+            workers.append(workers.pop(0))
+    except KeyboardInterrupt:
+        print("\nExiting...")
+        stop_event.set()
+        for worker in workers:
+            worker.join()
+    if status is not None:
+        status.finish()
+    for worker in sorted(workers, key=lambda w: tags.index(w.tag)):
+        print(f"{worker.tag}: {worker.num_lines} lines")
+        if worker.error_txt is not None:
+            print(f"\nSomething went wrong:\n{worker.error_txt}\n")
+        worker.file_struct.close_workbook()
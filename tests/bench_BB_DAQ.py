@@ -0,0 +1,331 @@
+'''
+Made for benchmarking BB_DAQ.py
+
+This script drives the hot path of BB-DAQ (bb_rows.py and bb_file.py) with synthetic DATA rows
+(no Arduino needed) and reports the rows per second, the per-row latency percentiles, and the peak
+memory of each part.
+It also times importing BB_DAQ.py in fresh interpreters for different kinds of runs.
+Each run is appended to a results file, and the rows per second are compared to the last run with
+the same settings so regressions are easy to spot.
+
+Run it from the repository's root directory:
+  python3 -m tests.bench_BB_DAQ [--rows N] [--widths 1 8 64] [--rates 10 100 1000] [--imports N]
+'''
+
+# Import standard libraries
+from argparse import ArgumentParser
+from datetime import datetime
+from os import environ, makedirs
+from os.path import normpath, split as os_split, isdir
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable
+# The live graph is drawn off-screen so that the benchmark can run without a display
+environ.setdefault("MPLBACKEND", "Agg")
+# Import BB-DAQ from src directory
+from src import bb_common, bb_graph, bb_file, bb_rows # pylint: disable=wrong-import-position
+
+
+# Constants
+BENCH_OUT_DIR = normpath(os_split(__file__)[0] + "/out/")
+SRC_DIR = normpath(os_split(__file__)[0] + "/../src/")
+RESULTS_FILE = normpath(f"{BENCH_OUT_DIR}/bench_results.jsonl")
+DEFAULT_ROWS = 5000
+DEFAULT_WIDTHS = (1, 4, 16, 64) # Number of numeric columns after the row type and key words
+DEFAULT_RATES = (10, 100, 1000) # Device data rates (rows/s) to report the load for
+MEMORY_ROWS = 2000 # Number of rows traced for the peak memory (tracing slows everything down)
+REGRESSION_PCT = 10.0 # Slowdown (%) that is flagged when comparing to the last run
+DEFAULT_IMPORT_RUNS = 5 # Number of fresh interpreters each import case is timed in
+# What each kind of run imports (the libraries are only imported when a run first uses them)
+IMPORT_CASES = {
+    "csv_no_graph": "import BB_DAQ",
+    "xlsx_live_graph": "import BB_DAQ, bb_common; bb_common.xlsxwriter.Workbook; " \
+        "bb_common.plt.ion; bb_common.np.empty",
+    # Everything BB_DAQ.py imported up front before the libraries were imported lazily
+    "eager": "import BB_DAQ, argparse, asyncio, numpy, xlsxwriter, serial.tools.list_ports; " \
+        "import matplotlib.pyplot"
+}
+# Key word mixes in the columns before the numbers (the header names match the key words)
+KEY_WORD_MIXES = {
+    "none": [],
+    "timer": [bb_common.TIMER_WORD],
+    "all": [bb_common.DATE_WORD, bb_common.TIMER_WORD, bb_common.TIME_WORD]
+}
+
+
+def make_stream(width:int, mix:str, num_rows:int) -> tuple[str, list[list[str]]]:
+    """
+    This function makes the header and the split DATA rows of a synthetic stream
+    @param width: the number of numeric columns
+    @param mix: the key of the key word mix in KEY_WORD_MIXES
+    @param num_rows: the number of rows
+    @return: a tuple containing the header and a list of split rows
+    """
+    key_words = KEY_WORD_MIXES[mix]
+    header = [bb_common.DATA_ROW] + key_words + [f"Value {col}" for col in range(width)]
+    rows = []
+    for i in range(num_rows):
+        nums = [f"{i*(col + 1)/8:.3f}" for col in range(width)]
+        rows.append([bb_common.DATA_ROW] + key_words + nums)
+    return (bb_common.DATA_DELIM.join(header), rows)
+
+
+def time_calls(func:Callable, args_list:list) -> list[int]:
+    """
+    This function calls a function once per item and times each call
+    @param func: the function, which takes one argument
+    @param args_list: the argument of each call
+    @return: the number of nanoseconds each call took
+    """
+    perf_ns = time.perf_counter_ns
+    latencies = []
+    for args in args_list:
+        t0 = perf_ns()
+        func(args)
+        latencies.append(perf_ns() - t0)
+    return latencies
+
+
+def peak_memory(func:Callable, args_list:list) -> int:
+    """
+    This function finds the peak memory allocated while calling a function once per item
+    @param func: the function, which takes one argument
+    @param args_list: the argument of each call
+    @return: the peak number of bytes allocated
+    """
+    tracemalloc.start()
+    for args in args_list:
+        func(args)
+    (_, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def summarize(latencies:list[int]) -> dict[str, float]:
+    """
+    This function summarizes the latency of each call
+    @param latencies: the number of nanoseconds each call took
+    @return: a dictionary with the rows (or calls) per second and the latency percentiles (in
+        microseconds)
+    """
+    ordered = sorted(latencies)
+    def pct(p:float) -> float:
+        return ordered[min(len(ordered) - 1, int(p/100*len(ordered)))]/1e3
+    total_s = sum(ordered)/1e9
+    return {"rows_per_s": len(ordered)/total_s if total_s > 0 else float("inf"), \
+            "p50_us": pct(50), "p90_us": pct(90), "p99_us": pct(99), "max_us": ordered[-1]/1e3}
+
+
+def make_file_struct(ext:str, header_txt:str, name:str) -> bb_file.FileData:
+    """
+    This function makes a FileData object that is ready for DATA rows
+    @param ext: the file extension (".xlsx", ".csv", or bb_common.BIN_EXT)
+    @param header_txt: the header
+    @param name: the file name (without the extension)
+    @return: the FileData object
+    """
+    file_name = normpath(f"{BENCH_OUT_DIR}/{name}{ext}")
+    file_struct = bb_file.FileData(ext == ".xlsx", file_name, header_txt, \
+                                   save_as_bin=(ext == bb_common.BIN_EXT))
+    file_struct.add_formatted_sheet("Bench")
+    file_struct.write_header()
+    return file_struct
+
+
+def bench_rows(width:int, mix:str, num_rows:int) -> list[dict]:
+    """
+    This function benchmarks the row-level functions for a synthetic stream
+    @param width: the number of numeric columns
+    @param mix: the key of the key word mix in KEY_WORD_MIXES
+    @param num_rows: the number of rows
+    @return: a list of result dictionaries
+    """
+    (header_txt, rows) = make_stream(width, mix, num_rows)
+    num_cols = len(rows[0])
+    no_graph = bb_graph.GraphData(bb_common.GraphChoice.NONE, -1, -1)
+    timer_t0 = time.time()
+    results = []
+
+    def add_result(bench:str, func:Callable, make_args:Callable) -> None:
+        # Rows are copied for each pass since the row functions can change them
+        latencies = time_calls(func, make_args(rows))
+        result = {"bench": bench, "width": width, "mix": mix, **summarize(latencies)}
+        result["peak_kib"] = peak_memory(func, make_args(rows[:MEMORY_ROWS]))/1024
+        results.append(result)
+
+    add_result("get_row_type_and_num_cols", \
+               lambda row: bb_rows.get_row_type_and_num_cols(row, bb_common.DATA_ROW), list)
+    for ext in (".csv", ".xlsx", bb_common.BIN_EXT):
+        file_struct = make_file_struct(ext, header_txt, f"bench_process_{width}_{mix}")
+        add_result(f"process_data_row{ext}", lambda row, fs=file_struct: \
+                   bb_rows.process_data_row(row, num_cols, timer_t0, fs, no_graph), \
+                   lambda rows: [row.copy() for row in rows])
+        file_struct.close_workbook()
+    for ext in (".csv", ".xlsx"):
+        file_struct = make_file_struct(ext, header_txt, f"bench_write_{width}_{mix}")
+        add_result(f"write_to_file{ext}", lambda row, fs=file_struct: \
+                   fs.write_to_file(row, inc_row_num=True), list)
+        file_struct.close_workbook()
+    return results
+
+
+def bench_graph(num_rows:int) -> list[dict]:
+    """
+    This function benchmarks adding points to the live graph and redrawing it
+    @param num_rows: the number of points
+    @return: a list of result dictionaries
+    """
+    # The next refresh is never due so that only the plot_buffer_data() calls redraw the graph
+    graph_struct = bb_graph.GraphData(bb_common.GraphChoice.LIVE, 0, 1)
+    graph_struct.next_refresh = float("inf")
+    points = [(i/100, (i % 200)/10) for i in range(num_rows)]
+    latencies = time_calls(lambda point: graph_struct.add_to_buffers(*point), points)
+    results = [{"bench": "add_to_buffers", "width": 2, "mix": "none", **summarize(latencies)}]
+    # Redraw after each frame's worth of points, as if the data came in at 1000 rows/s
+    step = max(1, int(1000/bb_common.GRAPH_FRAME_RATE))
+    def show_and_plot(ind:int) -> None:
+        graph_struct.points.num_points = ind + step
+        graph_struct.buf_ind = step
+        graph_struct.plot_buffer_data()
+    latencies = time_calls(show_and_plot, range(0, num_rows - step, step))
+    # Each call is a frame, so the load is at GRAPH_FRAME_RATE no matter the device data rate
+    results.append({"bench": "plot_buffer_data", "width": 2, "mix": "none", "per_frame": True, \
+                    **summarize(latencies)})
+    graph_struct.close_fig()
+    return results
+
+
+def bench_imports(num_runs:int) -> list[dict]:
+    """
+    This function times each import case in fresh interpreters
+    @param num_runs: the number of interpreters per case
+    @return: a list of result dictionaries (times in milliseconds)
+    """
+    results = []
+    for (case, stmt) in IMPORT_CASES.items():
+        code = f"import time; t0 = time.perf_counter(); {stmt}; print(time.perf_counter() - t0)"
+        times_ms = []
+        for _ in range(num_runs):
+            out = subprocess.run([sys.executable, "-c", code], cwd=SRC_DIR, check=True, \
+                                 capture_output=True, text=True).stdout
+            times_ms.append(1e3*float(out.split()[-1]))
+        results.append({"case": case, "median_ms": statistics.median(times_ms), \
+                        "min_ms": min(times_ms), "max_ms": max(times_ms)})
+    return results
+
+
+def print_imports(results:list[dict]) -> None:
+    """
+    This function prints the import times and how they compare to importing everything up front
+    @param results: the result dictionaries of bench_imports()
+    @return: None
+    """
+    eager = {r["case"]: r["median_ms"] for r in results}.get("eager")
+    print(f"\n{'import case':<28}{'median ms':>10}{'min ms':>9}{'max ms':>9}{'vs eager':>10}")
+    for r in results:
+        vs_eager = f"{100*r['median_ms']/eager:.0f}%" if eager else "-"
+        print(f"{r['case']:<28}{r['median_ms']:>10.1f}{r['min_ms']:>9.1f}{r['max_ms']:>9.1f}" \
+              f"{vs_eager:>10}")
+
+
+def load_last_run(results_file:str) -> dict:
+    """
+    This function loads the last run in the results file
+    @param results_file: the name of the results file
+    @return: the last run (empty if there is none)
+    """
+    try:
+        with open(results_file, encoding='utf-8') as f_in:
+            lines = f_in.read().splitlines()
+    except FileNotFoundError:
+        return {}
+    return json.loads(lines[-1]) if lines else {}
+
+
+def print_results(results:list[dict], last_run:dict, rates:list[float]) -> int:
+    """
+    This function prints the results, the load at each device rate, and the change since the last
+    run with the same number of rows
+    @param results: the result dictionaries
+    @param last_run: the last run (empty if there is none)
+    @param rates: the device data rates (rows/s)
+    @return: the number of regressions
+    """
+    last_rates = {}
+    if last_run:
+        last_rates = {(r["bench"], r["width"], r["mix"]): r["rows_per_s"] \
+                      for r in last_run["results"]}
+    print(f"{'bench':<28}{'width':>6}{'mix':>7}{'rows/s':>12}{'p50 us':>9}{'p99 us':>9}" \
+          f"{'max us':>10}{'peak KiB':>10}{'change':>9}  load at " + \
+          ", ".join(f"{rate:g}/s" for rate in rates))
+    num_regressions = 0
+    for r in results:
+        change = ""
+        last_rate = last_rates.get((r["bench"], r["width"], r["mix"]))
+        if last_rate:
+            pct = 100*(r["rows_per_s"] - last_rate)/last_rate
+            change = f"{pct:+.1f}%"
+            if pct < -REGRESSION_PCT:
+                change += "!"
+                num_regressions += 1
+        if r.get("per_frame"):
+            loads = f"{100*bb_common.GRAPH_FRAME_RATE/r['rows_per_s']:.2f}% (per frame)"
+        else:
+            loads = ", ".join(f"{100*rate/r['rows_per_s']:.2f}%" for rate in rates)
+        peak = f"{r['peak_kib']:.0f}" if "peak_kib" in r else "-"
+        print(f"{r['bench']:<28}{r['width']:>6}{r['mix']:>7}{r['rows_per_s']:>12.0f}" \
+              f"{r['p50_us']:>9.1f}{r['p99_us']:>9.1f}{r['max_us']:>10.1f}{peak:>10}" \
+              f"{change:>9}  {loads}")
+    return num_regressions
+
+
+def main() -> None:
+    """
+    This is the main function
+    @return: None
+    """
+    parser = ArgumentParser(description="Benchmark the hot path of BB-DAQ")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="rows per benchmark")
+    parser.add_argument("--widths", type=int, nargs="+", default=DEFAULT_WIDTHS, \
+                        help="numbers of numeric columns")
+    parser.add_argument("--mixes", nargs="+", default=list(KEY_WORD_MIXES), \
+                        choices=list(KEY_WORD_MIXES), help="key word mixes")
+    parser.add_argument("--rates", type=float, nargs="+", default=DEFAULT_RATES, \
+                        help="device data rates (rows/s) to report the load for")
+    parser.add_argument("--imports", type=int, default=DEFAULT_IMPORT_RUNS, \
+                        help="fresh interpreters each import case is timed in (0 skips them)")
+    parser.add_argument("--results", default=RESULTS_FILE, help="file the runs are appended to")
+    args = parser.parse_args()
+    if not isdir(BENCH_OUT_DIR):
+        makedirs(BENCH_OUT_DIR)
+    results = []
+    for width in args.widths:
+        for mix in args.mixes:
+            results += bench_rows(width, mix, args.rows)
+    results += bench_graph(args.rows)
+    last_run = load_last_run(args.results)
+    if last_run.get("rows") != args.rows:
+        last_run = {} # Runs with different row counts aren't comparable
+    num_regressions = print_results(results, last_run, args.rates)
+    imports = bench_imports(args.imports) if args.imports > 0 else []
+    if imports:
+        print_imports(imports)
+    run = {"date": datetime.now().isoformat(timespec="seconds"), \
+           "python": platform.python_version(), "rows": args.rows, "results": results, \
+           "imports": imports}
+    with open(args.results, mode="a", encoding='utf-8') as f_out:
+        f_out.write(json.dumps(run) + "\n")
+    print(f"\nResults appended to {args.results}")
+    if num_regressions:
+        print(f"{num_regressions} benchmark(s) were over {REGRESSION_PCT:g}% slower than the " \
+              "last run (marked with '!')")
+
+
+# Run main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+'''
+Brad Barakat
+The mocks and constants shared by the tests of BB-DAQ
+
+A user would not need to see or even use this file.
+'''
+
+# Import standard libraries
+from os import makedirs
+from os.path import normpath, split as os_split
+from time import time, sleep
+from threading import Event
+# Import BB-DAQ from src directory
+from src import bb_common
+
+
+# Constants
+DATA_HEADER = "Type,Date,Timer,Time,No.,Value"
+DATA_ROW_START = f"{bb_common.DATA_ROW},{bb_common.DATE_WORD},{bb_common.TIMER_WORD}," \
+    f"{bb_common.TIME_WORD}"
+TEST_OUT_DIR = normpath(os_split(__file__)[0] + "/out/")
+# So each test file can also be run on its own
+makedirs(TEST_OUT_DIR, exist_ok=True)
+
+
+class SerialMock:
+    """
+    This class provides a simple mock for a pyserial serial object
+    """
+
+    def __init__(self, lines:list[str], delay_s:float) -> None:
+        # Reverse the list of lines so we can just pop in O(1)
+        if lines[-1].strip() != "":
+            lines.append("") # So the last message signals a stop to BB-DAQ loops
+        lines.reverse()
+        self.line_stack = lines
+        self.num_lines = len(lines)
+        self.delay_s = delay_s
+        self.last_out_s = 0 # Tracks the number of seconds since last output
+        self.timeout:float = None # Like a port opened without a timeout
+
+    def readline(self) -> bytes:
+        """
+        Returns an encoded string from the list of lines, and pops it from the list,
+        while using a loop with time.time() to mimic the Arduino delay time
+        (If the list is empty, "" will be returned)
+        """
+        curr_s = time()
+        while (curr_s - self.last_out_s < self.delay_s):
+            curr_s = time()
+        self.last_out_s = curr_s # Update time
+        # Now the Arduino delay time is over
+        if self.num_lines == 0:
+            raise StopIteration()
+        line_i = self.line_stack[-1]
+        self.line_stack.pop()
+        self.num_lines -= 1
+        return line_i.encode()
+
+    def open(self) -> None:
+        """
+        A method that does nothing since this buffer is already "open"
+        """
+
+    def close(self) -> None:
+        """
+        A method that does nothing since this buffer isn't meant to be closed
+        """
+
+
+class TimeoutSerialMock(SerialMock):
+    """
+    This class is a SerialMock that times out (returns an empty line) once its lines run out,
+    like a port whose board stopped sending data
+    """
+
+    def readline(self) -> bytes:
+        """
+        Returns the next line, or an empty line after the delay time once the lines run out
+        """
+        if self.num_lines == 0:
+            sleep(self.delay_s)
+            return b""
+        return super().readline()
+
+
+class FakeClock: # pylint: disable=too-few-public-methods
+    """
+    This class is a clock that moves forward by a fixed step every time it is read, so that
+    anything timed by it doesn't depend on how fast the test runs
+    """
+
+    def __init__(self, step_s:float) -> None:
+        self.step_s = step_s
+        self.now_s = -step_s
+
+    def __call__(self) -> float:
+        """
+        Returns the next time
+        """
+        self.now_s += self.step_s
+        return self.now_s
+
+
+class StalledSerialMock(SerialMock):
+    """
+    This class is a SerialMock whose stream stalls (readline() blocks) once its lines run out, until
+    it is closed
+    """
+
+    def __init__(self, lines:list[str], delay_s:float) -> None:
+        super().__init__(lines, delay_s)
+        self.closed = Event()
+
+    def readline(self) -> bytes:
+        """
+        Returns the next line, or blocks until the port is closed once the lines run out
+        """
+        if self.num_lines == 1: # Only the final empty line is left
+            self.closed.wait()
+            return b""
+        return super().readline()
+
+    def close(self) -> None:
+        """
+        Ends the stall
+        """
+        self.closed.set()
@@ -1,75 +1,34 @@
 '''
 Brad Barakat
-Made for testing BB_DAQ.py
+Made for testing BB_DAQ.py, along with the helpers in bb_common.py, the row processing in
+bb_rows.py, and the headless runs in bb_headless.py
 
 The goal here is to automate as much testing as possible without needing to set up the Arduino.
 A user would not need to see or even use this file.
 '''
 
 # Import standard libraries
-from os import listdir, remove as os_rmv, makedirs
-from os.path import normpath, join as os_join, split as os_split, isdir
+from os import listdir, remove as os_rmv, makedirs, openpty, ttyname, write as os_write, \
+    close as os_close, name as os_name
+from os.path import normpath, join as os_join, isdir, exists
 from unittest.mock import patch
-from time import time
+from datetime import datetime
+from time import sleep
+from threading import Thread
+from types import SimpleNamespace
+import json
+import subprocess
+import sys
 # Import 3rd party libraries
 import pytest
-# Import BB_DAQ from src directory
-from src import BB_DAQ
-
-
-# Constants
-DATA_HEADER = "Type,Date,Timer,Time,No.,Value"
-DATA_ROW_START = f"{BB_DAQ.DATA_ROW},{BB_DAQ.DATE_WORD},{BB_DAQ.TIMER_WORD},{BB_DAQ.TIME_WORD}"
-TEST_OUT_DIR = normpath(os_split(__file__)[0] + "/out/")
-
-
-class SerialMock:
-    """
-    This class provides a simple mock for a pyserial serial object
-    """
-
-    def __init__(self, lines:list[str], delay_s:float) -> None:
-        # Reverse the list of lines so we can just pop in O(1)
-        if lines[-1].strip() != "":
-            lines.append("") # So the last message signals a stop to BB-DAQ loops
-        lines.reverse()
-        self.line_stack = lines
-        self.num_lines = len(lines)
-        self.delay_s = delay_s
-        self.last_out_s = 0 # Tracks the number of seconds since last output
-
-    def readline(self) -> bytes:
-        """
-        Returns an encoded string from the list of lines, and pops it from the list,
-        while using a loop with time.time() to mimic the Arduino delay time
-        (If the list is empty, "" will be returned)
-        """
-        curr_s = time()
-        while (curr_s - self.last_out_s < self.delay_s):
-            curr_s = time()
-        self.last_out_s = curr_s # Update time
-        # Now the Arduino delay time is over
-        if self.num_lines == 0:
-            raise StopIteration()
-        line_i = self.line_stack[-1]
-        self.line_stack.pop()
-        self.num_lines -= 1
-        return line_i.encode()
-
-    def open(self) -> None:
-        """
-        A method that does nothing since this buffer is already "open"
-        """
-
-    def close(self) -> None:
-        """
-        A method that does nothing since this buffer isn't meant to be closed
-        """
+# Import BB-DAQ from src directory
+from src import bb_common, bb_graph, bb_file, bb_reader, bb_rows, bb_headless
+from tests.mocks import DATA_HEADER, DATA_ROW_START, TEST_OUT_DIR
 
 
 class TestClass:
     """
-    The class containing the tests for BB_DAQ.py
+    The class containing the tests for BB_DAQ.py, bb_common.py, bb_rows.py, and bb_headless.py
     """
 
     def test_clear_files(self):
@@ -82,24 +41,25 @@ class TestClass:
         else:
             file_list = listdir(TEST_OUT_DIR)
             for filename in file_list:
-                # Make sure the file is an Excel or CSV file
-                if filename.endswith((".xlsx", ".csv")):
+                # Make sure the file is an Excel, CSV, binary capture, or raw serial log file
+                if filename.endswith((".xlsx", ".csv", bb_common.BIN_EXT, ".json", ".jsonl", \
+                                      bb_common.RAW_LOG_EXT)):
                     os_rmv(os_join(TEST_OUT_DIR,filename)) # Doesn't alter file_list
         assert True
 
     @pytest.mark.parametrize("test_row_type,expected_tuple", \
-                             [(BB_DAQ.DATA_ROW, (BB_DAQ.DATA_ROW,False)), \
-                              (BB_DAQ.LABEL_ROW, (BB_DAQ.LABEL_ROW,False)), \
-                              (BB_DAQ.MSG_ROW, (BB_DAQ.MSG_ROW,False)), \
+                             [(bb_common.DATA_ROW, (bb_common.DATA_ROW,False)), \
+                              (bb_common.LABEL_ROW, (bb_common.LABEL_ROW,False)), \
+                              (bb_common.MSG_ROW, (bb_common.MSG_ROW,False)), \
                               ("BadRowType", ("DEFAULT",True))])
     def test_get_row_type_and_num_cols(self, test_row_type, expected_tuple):
         """
-        This method tests BB_DAQ.get_row_type_and_num_cols()
+        This method tests bb_rows.get_row_type_and_num_cols()
         """
         def_row = "DEFAULT"
         row = [test_row_type, "rest_of_data"]
         row_len = len(row)
-        (row_type, num_cols, missing_label) = BB_DAQ.get_row_type_and_num_cols(row, def_row)
+        (row_type, num_cols, missing_label) = bb_rows.get_row_type_and_num_cols(row, def_row)
         assert row_type == expected_tuple[0]
         assert num_cols == row_len
         assert missing_label == expected_tuple[1]
@@ -114,197 +74,198 @@ class TestClass:
                               (("ruh roh rhaggy", float), False)])
     def test_is_num_str(self, test_tuple, expected):
         """
-        This method tests BB_DAQ.is_num_str()
+        This method tests bb_common.is_num_str()
         """
-        res = BB_DAQ.is_num_str(test_tuple[0], test_tuple[1])
+        res = bb_common.is_num_str(test_tuple[0], test_tuple[1])
         assert res == expected
 
     @patch("builtins.input", side_effect=['ruh roh rhaggy', '3.2', '-4'])
     def test_get_int_input(self, _):
         """
-        This method tests BB_DAQ.get_int_input() mainly to test input-patching
+        This method tests bb_common.get_int_input() mainly to test input-patching
         Patching requires another argument, but it's unused, so I put _
         """
-        res = BB_DAQ.get_int_input("pls send ints")
+        res = bb_common.get_int_input("pls send ints")
         assert res == -4
 
-    def test_get_header_and_delay(self):
+    @patch("builtins.input", side_effect=['5, x', '1, 9', ' 5,4 '])
+    def test_get_int_list_input(self, _):
         """
-        This method tests BB_DAQ.get_header_and_delay()
-        """
-        msg_list = [BB_DAQ.DATA_START_AFTER, DATA_HEADER, "random text"]
-        sleep_time = 0.25 # s
-        ser = SerialMock(msg_list, sleep_time)
-        (header_txt, delay_ard, _) = BB_DAQ.get_header_and_delay(ser)
-        assert header_txt == DATA_HEADER
-        # We won't get delay_ard == sleep_time exactly, so we need a tolerance
-        # With my Arduino, I'd get something like 0.213 s when using a delay of 0.2 s
-        tol = 0.075*sleep_time
-        assert -tol <= delay_ard - sleep_time <= tol
-
-    @patch("builtins.input", side_effect=['Timer_Reset', '1', '0', 'history', 'Clear_Data', '1', \
-           '1', normpath(f"{TEST_OUT_DIR}/test_gc_none_w2"), 'New_Wkbk', '0'])
-    def test_get_and_write_data_excel_gc_none(self, _):
-        """
-        This method tests BB_DAQ.get_and_write_data() for an Excel output with no graph:
-        - A sheet testing the timer reset, and another testing the data clear (and sheet naming)
-        - A new workbook with row types to also test file-switching
+        This method tests bb_common.get_int_list_input() with a word and an out-of-range integer
         Patching requires another argument, but it's unused, so I put _
         """
-        timer_reset_list = [BB_DAQ.DATA_START_AFTER, \
-                DATA_HEADER, \
-                f"{DATA_ROW_START},1,0", \
-                f"{DATA_ROW_START},2,1", \
-                BB_DAQ.RESET_TIMER, \
-                f"{BB_DAQ.LABEL_ROW},{BB_DAQ.DATE_WORD},Label,Timer Reset", \
-                f"{DATA_ROW_START},5,2", ""]
-        clear_data_list = [BB_DAQ.DATA_START_AFTER, \
-                DATA_HEADER, \
-                f"{DATA_ROW_START},1,0", \
-                f"{DATA_ROW_START},2,1", \
-                BB_DAQ.CLEAR_DATA, \
-                f"{BB_DAQ.LABEL_ROW},{BB_DAQ.DATE_WORD},Label,Data Cleared", \
-                f"{DATA_ROW_START},5,2", ""]
-        new_wkbk_rt_list = [BB_DAQ.DATA_START_AFTER, \
-                DATA_HEADER, \
-                f"{DATA_ROW_START},1,0", \
-                f"{BB_DAQ.MSG_ROW},Message", \
-                f"{BB_DAQ.LABEL_ROW},{BB_DAQ.DATE_WORD},Label,Message Sent", \
-                # Intentionally left out a row type below
-                f"{BB_DAQ.DATE_WORD},{BB_DAQ.TIMER_WORD},{BB_DAQ.TIME_WORD},4,1",
-                f"{DATA_ROW_START},5,2", ""]
-        msg_list = timer_reset_list + clear_data_list + new_wkbk_rt_list
-        ser = SerialMock(msg_list, 0.25)
-        fpath = normpath(f"{TEST_OUT_DIR}/test_gc_none_w1.xlsx")
-        file_struct = BB_DAQ.FileData(True, fpath, DATA_HEADER)
-        graph_struct = BB_DAQ.GraphData(BB_DAQ.GraphChoice.NONE,-1,-1,0,0)
-        BB_DAQ.get_and_write_data(ser, file_struct, graph_struct)
-        # DATA_START_AFTER, MSG_ROW, RESET_TIMER, and "" won't be shown in the file
-        num_disp_rows = len(new_wkbk_rt_list) - 1 - 1 - 1 # This is 1-indexed
-        # row_num is 0-indexed and incremented after each row is done
-        assert file_struct.row_num == num_disp_rows
+        res = bb_common.get_int_list_input("pls send ints", 0, 5)
+        assert res == [5, 4]
 
-    @patch("builtins.input", side_effect=['Sheet_1', '0'])
-    def test_get_and_write_data_excel_gc_sheet(self, _):
+    def test_replay(self):
         """
-        This method tests BB_DAQ.get_and_write_data() for an Excel output with the graph only in
-        the sheet (not live)
-        Patching requires another argument, but it's unused, so I put _
+        This method tests bb_headless.replay() for a plain text log and a raw log with receive times
         """
-        num_data_lines = 10
-        msg_list = [BB_DAQ.DATA_START_AFTER, DATA_HEADER]
+        num_data_lines = 20
+        msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER]
         for i in range(num_data_lines):
-            msg_list.append(f"{DATA_ROW_START},{i},{(i-1)**2}")
-        ser = SerialMock(msg_list, 0.25)
-        fpath = normpath(f"{TEST_OUT_DIR}/test_gc_sheet.xlsx")
-        file_struct = BB_DAQ.FileData(True, fpath, DATA_HEADER)
-        graph_struct = BB_DAQ.GraphData(BB_DAQ.GraphChoice.EXCEL_ONLY,4,5,0,0)
-        BB_DAQ.get_and_write_data(ser, file_struct, graph_struct)
-        # DATA_START_AFTER, MSG_ROW, RESET_TIMER, and "" won't be shown in the file
-        num_disp_rows = num_data_lines + 1 # This is 1-indexed
-        # row_num is 0-indexed and incremented after each row is done
-        assert file_struct.row_num == num_disp_rows
-        assert len(file_struct.curr_sheet.charts) == 1
+            msg_list.append(f"{DATA_ROW_START},{i},{i/4}")
+        # Plain text log (replayed as fast as possible)
+        log_path = normpath(f"{TEST_OUT_DIR}/test_replay.txt")
+        with open(log_path, mode="w", encoding="utf-8") as f_out:
+            f_out.write("\r\n".join(msg_list) + "\r\n")
+        csv_path = normpath(f"{TEST_OUT_DIR}/test_replay.csv")
+        # The log restarts when the port is reopened, like an Uno R3
+        (num_lines, _) = bb_headless.replay(log_path, csv_path)
+        assert num_lines == len(msg_list)
+        with open(csv_path, encoding='utf-8') as f_in:
+            lines = f_in.read().splitlines()
+        assert lines[0] == DATA_HEADER
+        assert len(lines) == num_data_lines + 1
+        assert lines[-1].endswith(f"{num_data_lines - 1},{(num_data_lines - 1)/4}")
+        # Raw log with receive times 10 ms apart (replayed at 2x speed, so at least 5 ms apart)
+        raw_path = normpath(f"{TEST_OUT_DIR}/test_replay.raw")
+        with open(raw_path, mode="wb") as f_out:
+            f_out.write(bb_common.RAW_LOG_MAGIC)
+            for (i, msg) in enumerate(msg_list):
+                line = (msg + "\r\n").encode()
+                f_out.write(bb_common.RAW_LOG_RECORD.pack(100 + i/100, len(line)) + line)
+            f_out.write(bb_common.RAW_LOG_RECORD.pack(200, 99) + b"cut") # Truncated record
+        assert len(bb_reader.read_raw_log(raw_path)) == len(msg_list)
+        (num_lines, elapsed) = bb_headless.replay(raw_path, csv_path, speed=2.0)
+        assert num_lines == len(msg_list)
+        assert elapsed >= (len(msg_list) - 1)*0.005
 
-    @patch("builtins.input", side_effect=['Sheet_1', '0'])
-    def test_get_and_write_data_excel_gc_live(self, _):
+    def test_lazy_imports(self):
         """
-        This method tests BB_DAQ.get_and_write_data() for an Excel output with the live graph
-        Patching requires another argument, but it's unused, so I put _
+        This method tests that importing BB_DAQ and replaying a log into a CSV file without a graph
+        (in a fresh interpreter) doesn't import the libraries only other kinds of runs need
         """
-        num_data_lines = 10
-        msg_list = [BB_DAQ.DATA_START_AFTER, DATA_HEADER]
-        for i in range(num_data_lines):
-            msg_list.append(f"{DATA_ROW_START},{i},{(i-1)**2}")
-        ser = SerialMock(msg_list, 0.25)
-        fpath = normpath(f"{TEST_OUT_DIR}/test_gc_live.xlsx")
-        file_struct = BB_DAQ.FileData(True, fpath, DATA_HEADER)
-        graph_struct = BB_DAQ.GraphData(BB_DAQ.GraphChoice.LIVE,4,5,0.1,5)
-        BB_DAQ.get_and_write_data(ser, file_struct, graph_struct)
-        # DATA_START_AFTER, MSG_ROW, RESET_TIMER, and "" won't be shown in the file
-        num_disp_rows = num_data_lines + 1 # This is 1-indexed
-        # row_num is 0-indexed and incremented after each row is done
-        assert file_struct.row_num == num_disp_rows
-        assert len(file_struct.curr_sheet.charts) == 1
-        assert graph_struct.num_plot_bufs == 2
+        msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER]
+        msg_list += [f"{DATA_ROW_START},{i},{i/4}" for i in range(10)]
+        log_path = normpath(f"{TEST_OUT_DIR}/test_lazy.txt")
+        with open(log_path, mode="w", encoding="utf-8") as f_out:
+            f_out.write("\r\n".join(msg_list) + "\r\n")
+        csv_path = normpath(f"{TEST_OUT_DIR}/test_lazy.csv")
+        lazy_modules = ("argparse", "asyncio", "matplotlib", "numpy", "xlsxwriter", \
+                        "serial.tools.list_ports")
+        code = f"import sys; from src import BB_DAQ; BB_DAQ.replay({log_path!r}, {csv_path!r}); " \
+            f"print('Imported:', *[name for name in {lazy_modules!r} if name in sys.modules])"
+        out = subprocess.run([sys.executable, "-c", code], cwd=normpath(f"{TEST_OUT_DIR}/../.."), \
+                             check=True, capture_output=True, text=True).stdout
+        assert out.splitlines()[-1] == "Imported:"
+        with open(csv_path, encoding='utf-8') as f_in:
+            assert len(f_in.read().splitlines()) == len(msg_list) - 1
 
-    @patch("builtins.input", side_effect=['1', normpath(f"{TEST_OUT_DIR}/test_gc_none_f2"), '0'])
-    def test_get_and_write_data_csv_gc_none(self, _):
+    @pytest.mark.skipif(os_name != "posix", reason="pseudo-terminals are only on POSIX")
+    def test_main_headless(self):
         """
-        This method tests BB_DAQ.get_and_write_data() for a CSV output with no graph:
-        - A file testing the data clear and timer reset
-        - A new file with row types to also test file-switching
-        Patching requires another argument, but it's unused, so I put _
+        This method tests bb_headless.main_headless() on a pseudo-terminal with a config file, a
+        command-line option that overrides it, and a row limit that ends the run
         """
-        clear_timer_list = [BB_DAQ.DATA_START_AFTER, \
-                DATA_HEADER, \
-                f"{DATA_ROW_START},1,0", \
-                BB_DAQ.CLEAR_DATA, \
-                f"{DATA_ROW_START},3,1", \
-                BB_DAQ.RESET_TIMER, \
-                f"{BB_DAQ.LABEL_ROW},{BB_DAQ.DATE_WORD},Label,Timer Reset", \
-                f"{DATA_ROW_START},6,2", ""]
-        new_file_rt_list = [BB_DAQ.DATA_START_AFTER, \
-                DATA_HEADER, \
-                f"{DATA_ROW_START},1,0", \
-                f"{BB_DAQ.MSG_ROW},Message", \
-                f"{BB_DAQ.LABEL_ROW},{BB_DAQ.DATE_WORD},Label,Message Sent", \
-                # Intentionally left out a row type below
-                f"{BB_DAQ.DATE_WORD},{BB_DAQ.TIMER_WORD},{BB_DAQ.TIME_WORD},4,1",
-                f"{DATA_ROW_START},5,2", ""]
-        msg_list = clear_timer_list + new_file_rt_list
-        ser = SerialMock(msg_list, 0.25)
-        fpath = normpath(f"{TEST_OUT_DIR}/test_gc_none_f1.csv")
-        file_struct = BB_DAQ.FileData(False, fpath, DATA_HEADER)
-        graph_struct = BB_DAQ.GraphData(BB_DAQ.GraphChoice.NONE,-1,-1,0,0)
-        BB_DAQ.get_and_write_data(ser, file_struct, graph_struct)
-        # DATA_START_AFTER, MSG_ROW, RESET_TIMER, and "" won't be shown in the file
-        num_disp_rows = len(new_file_rt_list) - 1 - 1 - 1 # This is 1-indexed
-        # row_num is 0-indexed and incremented after each row is done
-        assert file_struct.row_num == num_disp_rows
+        (master_fd, slave_fd) = openpty()
+        num_data_lines = 40
+        max_rows = 12
+        def write_lines():
+            sleep(0.1) # Wait for the port to be opened
+            os_write(master_fd, f"{bb_common.DATA_START_AFTER}\r\n{DATA_HEADER}\r\n".encode())
+            for i in range(num_data_lines):
+                os_write(master_fd, f"{DATA_ROW_START},{i},{i*3}\r\n".encode())
+                sleep(0.005)
+        config_path = normpath(f"{TEST_OUT_DIR}/test_headless.json")
+        fpath = normpath(f"{TEST_OUT_DIR}/test_headless.csv")
+        with open(config_path, "w", encoding='utf-8') as f_out:
+            json.dump({"port": ttyname(slave_fd), "output": fpath, "max-rows": 1000}, f_out)
+        writer = Thread(target=write_lines)
+        writer.start()
+        assert bb_headless.main_headless(["--config", config_path, \
+                                          "--max-rows", str(max_rows)]) == 0
+        writer.join()
+        with open(fpath, encoding='utf-8') as f_in:
+            lines = f_in.read().splitlines()
+        assert lines[0] == DATA_HEADER
+        assert [line.split(",")[-2:] for line in lines[1:]] == \
+            [[str(i), str(i*3)] for i in range(max_rows)]
+        # The output file is never overwritten unless asked
+        assert bb_headless.main_headless(["--config", config_path]) == 1
+        # Neither is the raw serial log (it is checked before anything is opened or written)
+        raw_fpath = normpath(f"{TEST_OUT_DIR}/test_headless_raw.csv")
+        raw_log_path = normpath(f"{TEST_OUT_DIR}/test_headless_raw{bb_common.RAW_LOG_EXT}")
+        with open(raw_log_path, "wb") as f_out:
+            f_out.write(b"old log")
+        assert bb_headless.main_headless(["--config", config_path, "--output", raw_fpath, \
+                                          "--raw-log"]) == 1
+        assert not exists(raw_fpath)
+        with open(raw_log_path, "rb") as f_in:
+            assert f_in.read() == b"old log"
+        # A run that ends with an error gives a non-zero exit code
+        writer = Thread(target=write_lines)
+        writer.start()
+        with patch("src.bb_session.process_batch", side_effect=ValueError("bad batch")):
+            assert bb_headless.main_headless(["--config", config_path, "--overwrite"]) == 1
+        writer.join()
+        os_close(master_fd)
+        os_close(slave_fd)
+        # A silent port (e.g., the wrong device) ends the run once the start timeout passes
+        (master_fd, slave_fd) = openpty()
+        silent_fpath = normpath(f"{TEST_OUT_DIR}/test_headless_silent.csv")
+        assert bb_headless.main_headless(["--port", ttyname(slave_fd), "--output", silent_fpath, \
+                                          "--overwrite", "--start-timeout", "0.5"]) == 1
+        os_close(master_fd)
+        os_close(slave_fd)
+        # Conflicting or missing options end with an error
+        with pytest.raises(SystemExit):
+            bb_headless.parse_run_args(["--port", "COM3", "--port-match", "*", "--output", fpath])
+        with pytest.raises(SystemExit):
+            bb_headless.parse_run_args(["--port", "COM3", "--output", "run.txt"])
+        with pytest.raises(SystemExit):
+            bb_headless.parse_run_args(["--port", "COM3", "--output", "run.csv", "--graph", "live"])
 
-    @patch("builtins.input", side_effect='0')
-    def test_get_and_write_data_csv_gc_sheet(self, _):
+    @patch("src.bb_headless.list_ports.comports")
+    def test_find_port(self, mock_comports):
         """
-        This method tests BB_DAQ.get_and_write_data() for a CSV output with the graph only in the
-        sheet (not live), which should be no different than the no graph case due to file type
-        Patching requires another argument, but it's unused, so I put _
+        This method tests that bb_headless.find_port() matches a pattern against each port's name,
+        description, and hardware ID, and only returns a port if exactly one matches
         """
-        num_data_lines = 10
-        msg_list = [BB_DAQ.DATA_START_AFTER, DATA_HEADER]
-        for i in range(num_data_lines):
-            msg_list.append(f"{DATA_ROW_START},{i},{(i-1)**2}")
-        ser = SerialMock(msg_list, 0.25)
-        fpath = normpath(f"{TEST_OUT_DIR}/test_gc_sheet.csv")
-        file_struct = BB_DAQ.FileData(False, fpath, DATA_HEADER)
-        graph_struct = BB_DAQ.GraphData(BB_DAQ.GraphChoice.EXCEL_ONLY,4,5,0,0)
-        BB_DAQ.get_and_write_data(ser, file_struct, graph_struct)
-        # DATA_START_AFTER, MSG_ROW, RESET_TIMER, and "" won't be shown in the file
-        num_disp_rows = num_data_lines + 1 # This is 1-indexed
-        # row_num is 0-indexed and incremented after each row is done
-        assert file_struct.row_num == num_disp_rows
-        with pytest.raises(AttributeError):
-            _ = len(file_struct.curr_sheet.charts)
+        mock_comports.return_value = [
+            SimpleNamespace(device="/dev/ttyS0", description="n/a", hwid="n/a"),
+            SimpleNamespace(device="/dev/ttyACM0", description="Arduino Uno", \
+                            hwid="USB VID:PID=2341:0043 SER=1"),
+            SimpleNamespace(device="/dev/ttyACM1", description="Arduino Uno", \
+                            hwid="USB VID:PID=2341:0043 SER=2")]
+        assert bb_headless.find_port("*SER=2") == "/dev/ttyACM1"
+        assert bb_headless.find_port("/dev/ttys0") == "/dev/ttyS0"
+        assert bb_headless.find_port("*arduino*") is None
+        assert bb_headless.find_port("COM*") is None
 
-    @patch("builtins.input", side_effect='0')
-    def test_get_and_write_data_csv_gc_live(self, _):
+    def test_row_single_stamp(self):
         """
-        This method tests BB_DAQ.get_and_write_data() for a CSV output with the live graph
-        Patching requires another argument, but it's unused, so I put _
+        This method tests that bb_rows.process_data_row() reads the clock at most once per row, and
+        that the TIME, TIMER, and DATE cells all come from the receive time of the row
         """
-        num_data_lines = 10
-        msg_list = [BB_DAQ.DATA_START_AFTER, DATA_HEADER]
-        for i in range(num_data_lines):
-            msg_list.append(f"{DATA_ROW_START},{i},{(i-1)**2}")
-        ser = SerialMock(msg_list, 0.25)
-        fpath = normpath(f"{TEST_OUT_DIR}/test_gc_live.csv")
-        file_struct = BB_DAQ.FileData(False, fpath, DATA_HEADER)
-        graph_struct = BB_DAQ.GraphData(BB_DAQ.GraphChoice.LIVE,4,5,0.1,5)
-        BB_DAQ.get_and_write_data(ser, file_struct, graph_struct)
-        # DATA_START_AFTER, MSG_ROW, RESET_TIMER, and "" won't be shown in the file
-        num_disp_rows = num_data_lines + 1 # This is 1-indexed
-        # row_num is 0-indexed and incremented after each row is done
-        assert file_struct.row_num == num_disp_rows
-        with pytest.raises(AttributeError):
-            _ = len(file_struct.curr_sheet.charts)
-        assert graph_struct.num_plot_bufs == 2
+        header = "Type,Date,Timer,Time,Timer 2,No."
+        fpath = normpath(f"{TEST_OUT_DIR}/test_single_stamp.csv")
+        file_struct = bb_file.FileData(False, fpath, header)
+        file_struct.write_header()
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.NONE,-1,-1)
+        timer_t0 = 1_000_000.0
+        num_rows = 2*bb_common.SCHEMA_SAMPLE_ROWS # Use both the slow and compiled paths
+        clock_reads = []
+        def fake_clock():
+            clock_reads.append(timer_t0 + 0.5*len(clock_reads))
+            return clock_reads[-1]
+        with patch.object(bb_rows, "read_rx_clock", side_effect=fake_clock):
+            for i in range(num_rows):
+                row = f"{DATA_ROW_START},{bb_common.TIMER_WORD},{i}".split(",")
+                bb_rows.process_data_row(row, len(row), timer_t0, file_struct, graph_struct)
+            assert len(clock_reads) == num_rows
+            # A stamped row doesn't read the clock at all
+            rx_time = timer_t0 + 100.25
+            row = f"{DATA_ROW_START},{bb_common.TIMER_WORD},{num_rows}".split(",")
+            bb_rows.process_data_row(row, len(row), timer_t0, file_struct, graph_struct, rx_time)
+            assert len(clock_reads) == num_rows
+        file_struct.close_workbook()
+        with open(fpath, encoding='utf-8') as f_in:
+            lines = f_in.read().splitlines()
+        for (i, line) in enumerate(lines[1:]):
+            cells = line.split(",")
+            rx_s = timer_t0 + (100.25 if i == num_rows else 0.5*i)
+            rx_datetime = datetime.fromtimestamp(rx_s)
+            assert cells[1] == str(rx_datetime.date())
+            assert float(cells[2]) == float(cells[4]) == round(rx_s - timer_t0, 3)
+            assert cells[3] == str(rx_datetime.time())
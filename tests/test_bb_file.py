@@ -0,0 +1,260 @@
+'''
+Brad Barakat
+Made for testing bb_file.py and bb_capture.py (the output files)
+
+The goal here is to automate as much testing as possible without needing to set up the Arduino.
+A user would not need to see or even use this file.
+'''
+
+# Import standard libraries
+from os import remove as os_rmv
+from os.path import normpath, exists, getsize
+from unittest.mock import patch
+from time import time
+from zipfile import ZipFile
+import json
+# Import 3rd party libraries
+import pytest
+# Import BB-DAQ from src directory
+from src import bb_common, bb_graph, bb_capture, bb_file, bb_rows, bb_session
+from tests.mocks import DATA_HEADER, DATA_ROW_START, TEST_OUT_DIR, SerialMock
+
+
+class TestClass:
+    """
+    The class containing the tests for bb_file.py and bb_capture.py
+    """
+
+    def test_csv_buffered_writes(self):
+        """
+        This method tests that FileData keeps the CSV file open and only writes the buffered rows
+        to the disk when flushed (or closed)
+        """
+        fpath = normpath(f"{TEST_OUT_DIR}/test_csv_buffer.csv")
+        file_struct = bb_file.FileData(False, fpath, DATA_HEADER, flush_interval=3600)
+        file_struct.write_to_file(DATA_HEADER.split(bb_common.DATA_DELIM), inc_row_num=True)
+        file_struct.write_to_file(["DATA", "1", "2"], inc_row_num=True)
+        handle = file_struct.csv.file
+        with open(fpath, encoding='utf-8') as f_in:
+            assert f_in.read() == "" # Still in the buffer
+        file_struct.flush_file()
+        with open(fpath, encoding='utf-8') as f_in:
+            assert f_in.read() == f"{DATA_HEADER}\nDATA,1,2\n"
+        file_struct.write_to_file(["DATA", "3", "4"], inc_row_num=True)
+        assert file_struct.csv.file is handle # The file wasn't reopened
+        # Text that isn't ASCII takes more bytes than characters (for the rollover's size limit)
+        file_struct.write_to_file(["LABEL", "Température (°C)", "Δt (µs)"], inc_row_num=True)
+        file_struct.close_workbook()
+        assert file_struct.csv.file is None
+        assert file_struct.get_num_bytes() == getsize(fpath)
+        with open(fpath, encoding='utf-8') as f_in:
+            assert f_in.read().endswith("DATA,3,4\nLABEL,Température (°C),Δt (µs)\n")
+
+    def test_row_schema(self):
+        """
+        This method tests that the row schema compiles from the first DATA rows, converts later
+        rows with it, and falls back to the slow path when a row deviates
+        """
+        fpath = normpath(f"{TEST_OUT_DIR}/test_row_schema.csv")
+        file_struct = bb_file.FileData(False, fpath, DATA_HEADER)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.NONE,-1,-1)
+        schema = file_struct.row_schema
+        rows = [f"{DATA_ROW_START},{i},{i/2}" for i in range(bb_common.SCHEMA_SAMPLE_ROWS + 1)]
+        rows.append(f"{DATA_ROW_START},{bb_common.TIMER_WORD},text") # Deviates from the schema
+        for row_txt in rows:
+            row = row_txt.split(bb_common.DATA_DELIM)
+            bb_rows.process_data_row(row, len(row), time(), file_struct, graph_struct)
+        kinds = bb_common.ColumnKind
+        assert schema.is_compiled
+        assert schema.kinds == [kinds.TEXT, kinds.DATE, kinds.TIMER, kinds.TIME, kinds.NUMBER, \
+                                kinds.NUMBER]
+        assert schema.num_misses == 1
+        file_struct.close_workbook()
+        with open(fpath, encoding='utf-8') as f_in:
+            lines = [line.split(bb_common.DATA_DELIM) for line in f_in.read().splitlines()]
+        assert len(lines) == len(rows)
+        for line in lines:
+            # No key words are left in the file, no matter which path converted the row
+            assert bb_common.SPECIAL_WORDS.isdisjoint(cell.upper() for cell in line)
+        assert lines[-1][-1] == "text"
+
+    @pytest.mark.parametrize("save_as_bin", [False, True])
+    def test_row_schema_text_turns_numeric(self, save_as_bin):
+        """
+        This method tests that a column whose first rows are text (like "N/A" before a sensor warms
+        up) still has its later numbers written as numbers to a sheet or a binary capture
+        """
+        header_txt = "Type,No.,Value"
+        ext = bb_common.BIN_EXT if save_as_bin else ".xlsx"
+        fpath = normpath(f"{TEST_OUT_DIR}/test_text_numeric{ext}")
+        file_struct = bb_file.FileData(not save_as_bin, fpath, header_txt, save_as_bin=save_as_bin)
+        file_struct.add_formatted_sheet("Data")
+        file_struct.write_header()
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.NONE,-1,-1)
+        num_text_rows = bb_common.SCHEMA_SAMPLE_ROWS
+        num_rows = num_text_rows + 2*bb_common.SCHEMA_SAMPLE_ROWS # Relearn, then use the schema
+        rows = [f"{bb_common.DATA_ROW},{i},N/A" for i in range(num_text_rows)]
+        rows += [f"{bb_common.DATA_ROW},{i},{i + 1.5}" for i in range(num_text_rows, num_rows)]
+        for row_txt in rows:
+            row = row_txt.split(bb_common.DATA_DELIM)
+            bb_rows.process_data_row(row, len(row), time(), file_struct, graph_struct)
+        assert file_struct.row_schema.kinds[2] == bb_common.ColumnKind.NUMBER
+        file_struct.close_workbook()
+        xlsx_path = fpath
+        if save_as_bin:
+            # The numbers in the TEXT column are kept in the cell file as numbers
+            (meta, _) = bb_capture.load_capture(fpath)
+            kinds = bb_common.ColumnKind
+            assert meta["cells"] == [[i, 2, kinds.NUMBER.name, i + 1.5] \
+                                     for i in range(num_text_rows, num_rows)]
+            xlsx_path = normpath(f"{TEST_OUT_DIR}/test_text_numeric_export.xlsx")
+            bb_file.export_capture(fpath, xlsx_path)
+        with ZipFile(xlsx_path) as xlsx_zip:
+            sheet_xml = xlsx_zip.read("xl/worksheets/sheet1.xml").decode()
+        for row_num in range(num_text_rows + 2, num_rows + 2): # 1-indexed, after the header
+            assert f'<c r="C{row_num}"><v>' in sheet_xml
+
+    @patch("builtins.input", side_effect='0')
+    def test_binary_capture(self, _):
+        """
+        This method tests bb_session.get_and_write_data() for a binary capture, then reads the
+        capture back and exports it to CSV and Excel
+        Patching requires another argument, but it's unused, so I put _
+        """
+        num_data_lines = 2*bb_common.SCHEMA_SAMPLE_ROWS # Use both the slow and compiled paths
+        # The first row is too short, so the column kinds must come from the schema instead
+        msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER, DATA_ROW_START]
+        for i in range(1, num_data_lines):
+            msg_list.append(f"{DATA_ROW_START},{i},{i/4}")
+        msg_list += [f"{bb_common.LABEL_ROW},Label,Before Clear", bb_common.CLEAR_DATA, \
+                     bb_common.RESET_TIMER, f"{DATA_ROW_START},{num_data_lines},text"]
+        ser = SerialMock(msg_list, 0.01)
+        fpath = normpath(f"{TEST_OUT_DIR}/test_capture{bb_common.BIN_EXT}")
+        file_struct = bb_file.FileData(False, fpath, DATA_HEADER, save_as_bin=True)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.NONE,-1,-1)
+        bb_session.get_and_write_data(ser, file_struct, graph_struct)
+        (meta, data) = bb_capture.load_capture(fpath)
+        assert meta["header_txt"] == DATA_HEADER
+        assert data.shape == (num_data_lines + 1, len(DATA_HEADER.split(bb_common.DATA_DELIM)))
+        kinds = bb_common.ColumnKind
+        assert meta["column_kinds"][-2:] == [kinds.NUMBER.name, kinds.NUMBER.name]
+        assert list(data[1:num_data_lines, 4]) == list(range(1, num_data_lines))
+        assert meta["segments"] == [0, num_data_lines]
+        assert len(meta["timer_resets"]) == 1
+        # The text in a number column is kept in the cell file
+        assert exists(fpath + bb_common.BIN_CELLS_EXT)
+        assert meta["cells"] == [[num_data_lines, 5, kinds.TEXT.name, "text"]]
+        # Export (the CSV has a file per segment, and the workbook has a sheet per segment)
+        csv_path = normpath(f"{TEST_OUT_DIR}/test_capture.csv")
+        bb_file.export_capture(fpath, csv_path)
+        with open(csv_path, encoding='utf-8') as f_in:
+            lines = f_in.read().splitlines()
+        assert lines[0] == DATA_HEADER
+        assert lines[-1] == f"{bb_common.LABEL_ROW},Label,Before Clear"
+        assert lines[2].split(bb_common.DATA_DELIM)[-2:] == ["1", "0.25"]
+        with open(normpath(f"{TEST_OUT_DIR}/test_capture_2.csv"), encoding='utf-8') as f_in:
+            assert f_in.read().splitlines()[-1].endswith(f"{num_data_lines},text")
+        xlsx_path = normpath(f"{TEST_OUT_DIR}/test_capture.xlsx")
+        bb_file.export_capture(fpath, xlsx_path)
+        # A capture of another version of the format isn't read
+        future_path = normpath(f"{TEST_OUT_DIR}/test_capture_future{bb_common.BIN_EXT}")
+        with open(future_path + ".json", "w", encoding='utf-8') as f_out:
+            json.dump({**meta, "version": bb_common.BIN_FORMAT_VERSION + 1}, f_out)
+        with pytest.raises(ValueError):
+            bb_capture.load_capture(future_path)
+
+    @pytest.mark.parametrize("save_as_xlsx", [False, True])
+    def test_rollover(self, save_as_xlsx):
+        """
+        This method tests bb_capture.Rollover with a row limit for CSV files (and a run limit
+        counted over every file), and with full sheets for a workbook
+        """
+        num_data_lines = 120
+        msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER]
+        for i in range(num_data_lines):
+            msg_list.append(f"{DATA_ROW_START},{i},{i/4}")
+        ser = SerialMock(msg_list, 0.001)
+        ext = ".xlsx" if save_as_xlsx else ".csv"
+        fpath = normpath(f"{TEST_OUT_DIR}/test_rollover{ext}")
+        for part in range(2, 5): # Left by an earlier test run (rollover won't overwrite them)
+            part_path = normpath(f"{TEST_OUT_DIR}/test_rollover_{part}{ext}")
+            if exists(part_path):
+                os_rmv(part_path)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.NONE,-1,-1)
+        if save_as_xlsx:
+            # Sheets of 50 rows (the header and 49 DATA rows)
+            file_struct = bb_file.FileData(True, fpath, DATA_HEADER)
+            with patch.object(bb_capture, "XLSX_MAX_ROWS", 50):
+                bb_session.get_and_write_data(ser, file_struct, graph_struct, sheet_name="Data", \
+                                              ask_rerun=False)
+            with ZipFile(fpath) as zip_in:
+                num_sheets = sum(name.startswith("xl/worksheets/sheet") \
+                                 for name in zip_in.namelist())
+            assert num_sheets == 3
+            expected = [("Data", 49), ("Data_2", 49), ("Data_3", 22)]
+        else:
+            file_struct = bb_file.FileData(False, fpath, DATA_HEADER, \
+                                           rollover=bb_capture.Rollover(max_rows=50))
+            limits = bb_session.RunLimits(max_rows=110) # Ends in the third file
+            bb_session.get_and_write_data(ser, file_struct, graph_struct, \
+                                          bb_session.RunOptions(limits=limits), ask_rerun=False)
+            timers = []
+            for (part, num_rows) in (("", 50), ("_2", 50), ("_3", 10)):
+                with open(normpath(f"{TEST_OUT_DIR}/test_rollover{part}.csv"), \
+                          encoding='utf-8') as f_in:
+                    lines = f_in.read().splitlines()
+                assert lines[0] == DATA_HEADER
+                assert len(lines) == num_rows + 1
+                timers += [float(line.split(",")[2]) for line in lines[1:]]
+            # The TIMER values carry on across files
+            assert timers == sorted(timers)
+            assert timers[50] - timers[49] < 0.5
+            expected = [(None, 50), (None, 50), (None, 10)]
+        manifest_path = normpath(f"{TEST_OUT_DIR}/test_rollover{bb_common.MANIFEST_EXT}")
+        with open(manifest_path, encoding='utf-8') as f_in:
+            segments = json.load(f_in)["segments"]
+        assert [(seg["sheet"], seg["rows"]) for seg in segments] == expected
+        first_row = 1
+        for seg in segments:
+            assert seg["first_row"] == first_row
+            assert seg["timer_start"] <= seg["timer_end"]
+            first_row += seg["rows"]
+        assert segments[1]["timer_start"] >= segments[0]["timer_end"]
+
+    def test_chart_summary(self):
+        """
+        This method tests that a long sheet's chart shows a min/max summary from a hidden sheet,
+        and that charts address columns past Z
+        """
+        num_cols = 30 # Past column Z
+        header_txt = ",".join(f"Col {col}" for col in range(num_cols))
+        fpath = normpath(f"{TEST_OUT_DIR}/test_chart_summary.xlsx")
+        file_struct = bb_file.FileData(True, fpath, header_txt)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.EXCEL_ONLY,1,[28,29])
+        file_struct.chart_cols = (graph_struct.time_col_ind, graph_struct.data_col_inds)
+        num_rows = 2*bb_common.CHART_MAX_POINTS
+        for (sheet_name, sheet_rows) in (("Long Sheet", num_rows), ("Short", 10)):
+            file_struct.add_formatted_sheet(sheet_name)
+            file_struct.write_header()
+            for i in range(sheet_rows):
+                row = [bb_common.DATA_ROW, str(i)] + ["0"]*(num_cols - 4) + \
+                    [str(1000 if i == 12345 else i % 10), str(-i)]
+                bb_rows.process_data_row(row, num_cols, bb_common.read_rx_clock(), file_struct, \
+                                         graph_struct)
+            file_struct.add_chart_to_sheet(graph_struct.time_col_ind, graph_struct.data_col_inds)
+        summary_rows = file_struct.workbook.get_worksheet_by_name("Long Sheet_chart").dim_rowmax
+        # Each bucket has two rows, and the buckets double in size
+        assert summary_rows < 2*num_rows/bb_common.CHART_SUMMARY_BUCKET
+        assert file_struct.workbook.get_worksheet_by_name("Short_chart") is None
+        file_struct.close_workbook()
+        with ZipFile(fpath) as zip_in:
+            charts = [zip_in.read(f"xl/charts/chart{ind}.xml").decode() for ind in (1, 2)]
+            workbook_xml = zip_in.read("xl/workbook.xml").decode()
+            summary_xml = zip_in.read("xl/worksheets/sheet2.xml").decode()
+        assert 'name="Long Sheet_chart" sheetId="2" state="hidden"' in workbook_xml
+        assert "<v>1000</v>" in summary_xml # The peak is kept
+        assert "'Long Sheet_chart'!$C$2:$C$" in charts[0]
+        assert "'Long Sheet'!$AC$1" in charts[0] # The series name
+        assert "<c:scatterChart>" in charts[0]
+        assert "Short!$AD$2:$AD$11" in charts[1]
+        assert "<c:lineChart>" in charts[1]
@@ -0,0 +1,118 @@
+'''
+Brad Barakat
+Made for testing bb_graph.py (the live graph)
+
+The goal here is to automate as much testing as possible without needing to set up the Arduino.
+A user would not need to see or even use this file.
+'''
+
+# Import standard libraries
+from os.path import normpath
+from time import time
+from zipfile import ZipFile
+# Import 3rd party libraries
+import pytest
+# Import BB-DAQ from src directory
+from src import bb_common, bb_graph, bb_file, bb_rows
+from tests.mocks import DATA_HEADER, DATA_ROW_START, TEST_OUT_DIR
+
+
+class TestClass:
+    """
+    The class containing the tests for bb_graph.py
+    """
+
+    def test_graph_data_reuses_line(self):
+        """
+        This method tests that the live graph keeps a single line, grows its arrays as needed, and
+        only shows the rolling window of points
+        """
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.LIVE,0,1,rolling_samples=100)
+        num_points = 3*bb_common.PLOT_INIT_CAPACITY
+        for i in range(num_points):
+            graph_struct.add_to_buffers(i, str(i % 7)) # Numeric strings can be plotted too
+        graph_struct.plot_buffer_data()
+        assert len(graph_struct.figure.axes[0].lines) == 1
+        (x_vis, y_vis) = graph_struct.figure.lines[0].get_data()
+        assert len(x_vis) == len(y_vis) == 100
+        assert x_vis[-1] == num_points - 1
+        # Points outside the window are dropped instead of growing the arrays forever
+        assert len(graph_struct.points.data) <= 2*bb_common.PLOT_INIT_CAPACITY
+        graph_struct.reset_axes()
+        graph_struct.overwrite_buffers()
+        assert len(graph_struct.figure.axes[0].lines) == 1
+        assert graph_struct.points.num_points == 0
+        graph_struct.close_fig()
+
+    def test_graph_data_keypress_stops(self):
+        """
+        This method tests that a keypress in the live graph stops the run at the next frame
+        without the graph ever waiting for input
+        """
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.LIVE,0,1)
+        graph_struct.add_to_buffers(0, 1)
+        t_start = time()
+        graph_struct.plot_buffer_data()
+        assert time() - t_start < 1 # No blocking pause
+        graph_struct.on_key_press(None)
+        with pytest.raises(KeyboardInterrupt):
+            graph_struct.plot_buffer_data()
+        graph_struct.close_fig()
+
+    def test_graph_decimation(self):
+        """
+        This method tests that the live graph draws a min/max summary of many points that keeps
+        the peaks and gaps
+        """
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.LIVE,0,1)
+        num_points = 50000
+        for i in range(num_points):
+            y_val = 1000 if i == 12345 else (-1000 if i == 23456 else i % 10)
+            graph_struct.add_to_buffers(i, "gap" if 30000 <= i < 32000 else y_val)
+        graph_struct.plot_buffer_data()
+        (x_vis, y_vis) = graph_struct.figure.lines[0].get_data()
+        num_buckets = max(bb_common.PLOT_MIN_BUCKETS, int(graph_struct.figure.axes[0].bbox.width))
+        assert len(x_vis) <= 2*num_buckets + num_points//num_buckets + 2
+        assert list(x_vis) == sorted(x_vis)
+        assert (12345 in x_vis) and (23456 in x_vis)
+        assert (bb_common.np.nanmax(y_vis), bb_common.np.nanmin(y_vis)) == (1000, -1000)
+        assert bb_common.np.isnan(y_vis).any()
+        assert (x_vis[0], x_vis[-1]) == (0, num_points - 1)
+        # Few points are drawn as they are
+        (x_few, y_few) = bb_graph.GraphData.decimate(x_vis[:10], y_vis[:10], 100)
+        assert len(x_few) == len(y_few) == 10
+        graph_struct.close_fig()
+
+    @pytest.mark.parametrize("stacked", [False, True])
+    def test_graph_data_many_series(self, stacked):
+        """
+        This method tests a live graph of several data columns sharing one x column, and that
+        the compiled and slow paths of a run add every series
+        """
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.LIVE,4,[5,4,2],stacked=stacked)
+        assert graph_struct.points.data.shape[1] == 4
+        assert len(graph_struct.figure.axes) == (3 if stacked else 1)
+        assert graph_struct.restart().stacked == stacked
+        fpath = normpath(f"{TEST_OUT_DIR}/test_many_series_{stacked}.xlsx")
+        file_struct = bb_file.FileData(True, fpath, DATA_HEADER)
+        graph_struct.set_ax_labels("No.", ["Value", "No.", "Timer"])
+        num_rows = 2*bb_common.SCHEMA_SAMPLE_ROWS # Use both the slow and compiled paths
+        file_struct.add_formatted_sheet("Sheet1")
+        file_struct.write_header()
+        for i in range(num_rows):
+            row = f"{DATA_ROW_START},{i},{i/2}".split(bb_common.DATA_DELIM)
+            bb_rows.process_data_row(row, len(row), bb_common.read_rx_clock(), file_struct, \
+                                     graph_struct)
+        graph_struct.plot_buffer_data()
+        assert [len(line.get_xdata()) for line in graph_struct.figure.lines] == [num_rows]*3
+        (x_vis, y_vis) = graph_struct.figure.lines[0].get_data()
+        assert (x_vis[-1], y_vis[-1]) == (num_rows - 1, (num_rows - 1)/2)
+        assert list(graph_struct.figure.lines[1].get_ydata()) == list(x_vis)
+        assert graph_struct.figure.lines[2].get_ydata()[-1] >= 0 # TIMER
+        # All series are in one chart
+        file_struct.add_chart_to_sheet(4, [5, 4])
+        file_struct.close_workbook()
+        with ZipFile(fpath) as zip_in:
+            chart_xml = zip_in.read("xl/charts/chart1.xml").decode()
+        assert chart_xml.count("<c:ser>") == 2
+        graph_struct.close_fig()
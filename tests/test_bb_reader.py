@@ -0,0 +1,237 @@
+'''
+Brad Barakat
+Made for testing bb_reader.py (the serial reading)
+
+The goal here is to automate as much testing as possible without needing to set up the Arduino.
+A user would not need to see or even use this file.
+'''
+
+# Import standard libraries
+from os import openpty, ttyname, write as os_write, close as os_close, name as os_name
+from os.path import normpath
+from time import time, sleep
+from threading import Thread
+# Import 3rd party libraries
+import pytest
+import serial
+# Import BB-DAQ from src directory
+from src import bb_common, bb_graph, bb_file, bb_reader, bb_session, bb_headless
+from tests.mocks import DATA_HEADER, DATA_ROW_START, TEST_OUT_DIR, SerialMock, \
+    TimeoutSerialMock
+
+
+class TestClass:
+    """
+    The class containing the tests for bb_reader.py
+    """
+
+    def test_get_header_and_delay(self):
+        """
+        This method tests bb_reader.get_header_and_delay()
+        """
+        msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER, "random text"]
+        sleep_time = 0.25 # s
+        ser = SerialMock(msg_list, sleep_time)
+        (header_txt, delay_ard, _) = bb_reader.get_header_and_delay(ser)
+        assert header_txt == DATA_HEADER
+        # We won't get delay_ard == sleep_time exactly, so we need a tolerance
+        # With my Arduino, I'd get something like 0.213 s when using a delay of 0.2 s
+        tol = 0.075*sleep_time
+        assert -tol <= delay_ard - sleep_time <= tol
+
+    def test_open_stream_start_timeout(self):
+        """
+        This method tests that bb_reader.open_stream() gives up on a port that never starts the
+        data (here, one that sends a line without CLEARDATA and then goes silent)
+        """
+        ser = TimeoutSerialMock(["not the data"], 0.05)
+        t_start = time()
+        with pytest.raises(TimeoutError):
+            bb_reader.open_stream(ser, ask_user=False, start_timeout=0.5)
+        assert 0.5 <= time() - t_start < 1.5
+        # The data can still start after a silence, and the port's timeout is put back
+        ser = TimeoutSerialMock(["", bb_common.DATA_START_AFTER, DATA_HEADER] + \
+                                [f"{DATA_ROW_START},{i},{i}" for i in range(10)], 0.01)
+        (header_txt, _, handoff) = bb_reader.open_stream(ser, ask_user=False, drain=False, \
+                                                        start_timeout=0.5)
+        assert header_txt == DATA_HEADER
+        assert ser.timeout != bb_common.START_POLL_INTERVAL
+        handoff.stop()
+
+    def test_raw_tap(self):
+        """
+        This method tests bb_reader.RawTap with bb_reader.open_stream() and
+        bb_session.get_and_write_data(), then replays the raw serial log
+        """
+        num_data_lines = 10
+        msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER]
+        for i in range(num_data_lines):
+            msg_list.append(f"{DATA_ROW_START},{i},{i/4}")
+        ser = SerialMock(msg_list.copy(), 0.01)
+        log_path = normpath(f"{TEST_OUT_DIR}/test_tap{bb_common.RAW_LOG_EXT}")
+        tap = bb_reader.RawTap(log_path)
+        tapped_ser = bb_reader.TappedSerial(ser, tap)
+        (header_txt, _, handoff) = bb_reader.open_stream(tapped_ser)
+        assert header_txt == DATA_HEADER
+        csv_path = normpath(f"{TEST_OUT_DIR}/test_tap.csv")
+        file_struct = bb_file.FileData(False, csv_path, header_txt)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.NONE,-1,-1)
+        bb_session.get_and_write_data(tapped_ser, file_struct, graph_struct, ask_rerun=False, \
+                                      handoff=handoff)
+        tap.close()
+        records = bb_reader.read_raw_log(log_path)
+        # One open marker, the exact bytes of each line, and the final empty line
+        assert [line for (_, line) in records] == [None] + \
+            [msg.encode() for msg in msg_list] + [b""]
+        rx_times = [rx_time for (rx_time, _) in records]
+        assert rx_times == sorted(rx_times)
+        # The lines are stamped with the receive clock, like the data rows
+        assert rx_times[0] <= bb_common.read_rx_clock() < rx_times[0] + 60
+        replay_path = normpath(f"{TEST_OUT_DIR}/test_tap_replay.csv")
+        bb_headless.replay(log_path, replay_path)
+        with open(csv_path, encoding='utf-8') as f_in:
+            lines = f_in.read().splitlines()
+        with open(replay_path, encoding='utf-8') as f_in:
+            replay_lines = f_in.read().splitlines()
+        assert len(lines) == len(replay_lines) == num_data_lines + 1
+        assert [line.split(",")[-2:] for line in lines] == \
+            [line.split(",")[-2:] for line in replay_lines]
+
+    @pytest.mark.parametrize("threaded", [False, True])
+    def test_open_stream_backlog(self, threaded):
+        """
+        This method tests that bb_reader.open_stream() keeps every line sent while the user answers
+        prompts, even when there are more of them than the run's reader queue can hold
+        """
+        num_data_lines = bb_common.READ_QUEUE_SIZE + 500
+        msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER]
+        for i in range(num_data_lines):
+            msg_list.append(f"{DATA_ROW_START},{i},{i*2}")
+        ser = SerialMock(msg_list, 0)
+        (header_txt, _, handoff) = bb_reader.open_stream(ser, ask_user=False)
+        handoff.join(30) # The prompts (the board sends every line before they are answered)
+        assert handoff.num_dropped == 0
+        fpath = normpath(f"{TEST_OUT_DIR}/test_backlog_{int(threaded)}.csv")
+        file_struct = bb_file.FileData(False, fpath, header_txt)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.NONE,-1,-1)
+        bb_session.get_and_write_data(ser, file_struct, graph_struct, \
+                                      bb_session.RunOptions(threaded), ask_rerun=False, \
+                                      handoff=handoff)
+        with open(fpath, encoding='utf-8') as f_in:
+            lines = f_in.read().splitlines()
+        assert len(lines) == num_data_lines + 1
+        assert lines[-1].endswith(f",{num_data_lines - 1},{(num_data_lines - 1)*2}")
+
+    @pytest.mark.parametrize("threaded,use_asyncio", [(False, False), (True, False), (False, True)])
+    def test_open_stream_handoff(self, threaded, use_asyncio):
+        """
+        This method tests that bb_session.get_and_write_data() takes over the data stream that
+        bb_reader.open_stream() started, without losing the lines sent while the user answered
+        prompts
+        """
+        num_data_lines = 30
+        msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER]
+        for i in range(num_data_lines):
+            msg_list.append(f"{DATA_ROW_START},{i},{i*2}")
+        ser = SerialMock(msg_list, 0.005)
+        (header_txt, delay_ard, handoff) = bb_reader.open_stream(ser)
+        assert header_txt == DATA_HEADER
+        assert delay_ard > 0
+        assert ser.timeout > delay_ard
+        sleep(0.1) # The prompts (the board keeps sending data)
+        fpath = normpath(f"{TEST_OUT_DIR}/test_handoff_{int(threaded)}{int(use_asyncio)}.csv")
+        file_struct = bb_file.FileData(False, fpath, header_txt)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.NONE,-1,-1)
+        options = bb_session.RunOptions(threaded, use_asyncio=use_asyncio)
+        bb_session.get_and_write_data(ser, file_struct, graph_struct, options, ask_rerun=False, \
+                                      handoff=handoff)
+        with open(fpath, encoding='utf-8') as f_in:
+            lines = f_in.read().splitlines()
+        assert lines[0] == DATA_HEADER
+        assert [line.split(",")[-2:] for line in lines[1:]] == \
+            [[str(i), str(i*2)] for i in range(num_data_lines)]
+        # The timer starts at the header, so the first row isn't at 0
+        timers = [float(line.split(",")[2]) for line in lines[1:]]
+        assert 0 < timers[0] < timers[-1]
+
+    @pytest.mark.skipif(os_name != "posix", reason="pseudo-terminals are only on POSIX")
+    @pytest.mark.parametrize("tapped", [False, True])
+    def test_async_line_reader_fd(self, tapped):
+        """
+        This method tests bb_session.async_acquire() on a pseudo-terminal, so the lines are read by
+        watching the port's file descriptor, and the end of the stream is found by the idle timeout
+        (With a bb_reader.TappedSerial, the chunks are still read through the file descriptor, and
+        every line is recorded)
+        """
+        (master_fd, slave_fd) = openpty()
+        ser = serial.Serial(ttyname(slave_fd), timeout=0.2)
+        log_path = normpath(f"{TEST_OUT_DIR}/test_async_fd{bb_common.RAW_LOG_EXT}")
+        tap = bb_reader.RawTap(log_path) if tapped else None
+        if tapped:
+            ser = bb_reader.TappedSerial(ser, tap)
+        num_data_lines = 20
+        def write_lines():
+            for i in range(num_data_lines):
+                # Split each line across two writes to test the partial-line handling
+                os_write(master_fd, f"{DATA_ROW_START},".encode())
+                sleep(0.002)
+                os_write(master_fd, f"{i},{i/2}\r\n".encode())
+        fpath = normpath(f"{TEST_OUT_DIR}/test_async_fd.csv")
+        file_struct = bb_file.FileData(False, fpath, DATA_HEADER)
+        file_struct.write_header()
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.NONE,-1,-1)
+        writer = Thread(target=write_lines)
+        writer.start()
+        bb_common.asyncio.run(bb_session.async_acquire(ser, time(), file_struct, graph_struct))
+        writer.join()
+        ser.close()
+        os_close(master_fd)
+        os_close(slave_fd)
+        file_struct.close_workbook()
+        with open(fpath, encoding='utf-8') as f_in:
+            lines = f_in.read().splitlines()
+        assert len(lines) == num_data_lines + 1
+        assert lines[-1].endswith(f"{num_data_lines - 1},{(num_data_lines - 1)/2}")
+        if tapped:
+            tap.close()
+            records = bb_reader.read_raw_log(log_path)
+            assert [line for (_, line) in records] == \
+                [f"{DATA_ROW_START},{i},{i/2}\r\n".encode() for i in range(num_data_lines)]
+
+    def test_line_framer(self):
+        """
+        This method tests bb_reader.LineFramer with lines split across chunks and a line longer than
+        the buffer
+        """
+        framer = bb_reader.LineFramer(8)
+        assert not framer.feed(b"DATA,1")
+        assert framer.feed(b",2\r\nDATA,3\r") == ["DATA,1,2"]
+        assert framer.feed(b"\n\r\nLABEL") == ["DATA,3", ""]
+        long_line = "LABEL" + ",x"*20
+        assert framer.feed(long_line[5:].encode() + b"\r\nMSG,a\r\n") == [long_line, "MSG,a"]
+        assert framer.num_bytes == 0
+
+    def test_rate_estimator(self):
+        """
+        This method tests bb_reader.RateEstimator with a late line and a batch of lines, and
+        bb_session.adapt_to_rate() with a port whose timeout is too long
+        """
+        rate = bb_reader.RateEstimator(update_interval=1.0)
+        rx_time = 100.0
+        updates = 0
+        for i in range(30):
+            rx_time += 1.0 if i == 10 else 0.1 # One line is very late
+            updates += rate.add(rx_time)
+        # Five lines received together (in one chunk) after 0.5 s
+        updates += rate.add(rx_time + 0.5, 5)
+        (median, jitter) = rate.get_interval()
+        assert median == pytest.approx(0.1)
+        assert jitter == pytest.approx(0, abs=1e-9)
+        assert updates == 3
+        assert rate.get_timeout() == pytest.approx(bb_common.RATE_TIMEOUT_FACTOR*0.1)
+        assert "10.00 lines/s" in rate.describe()
+        ser = SerialMock([""], 0)
+        ser.timeout = 2.0
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.NONE,-1,-1)
+        bb_session.adapt_to_rate(rate, ser, graph_struct)
+        assert ser.timeout == rate.get_timeout()
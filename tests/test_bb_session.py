@@ -0,0 +1,486 @@
+'''
+Brad Barakat
+Made for testing bb_session.py (the runs)
+
+The goal here is to automate as much testing as possible without needing to set up the Arduino.
+A user would not need to see or even use this file.
+'''
+
+# Import standard libraries
+from os import openpty, ttyname, write as os_write, close as os_close, name as os_name
+from os.path import normpath
+from unittest.mock import patch
+from time import time, sleep
+from threading import Thread, Timer
+from types import SimpleNamespace
+from traceback import extract_stack
+from zipfile import ZipFile
+from io import StringIO
+# Import 3rd party libraries
+import pytest
+import serial
+# Import BB-DAQ from src directory
+from src import bb_common, bb_graph, bb_file, bb_reader, bb_session
+from tests.mocks import DATA_HEADER, DATA_ROW_START, TEST_OUT_DIR, SerialMock, \
+    TimeoutSerialMock, FakeClock, StalledSerialMock
+
+
+class TestClass:
+    """
+    The class containing the tests for bb_session.py
+    """
+
+    @patch("builtins.input", side_effect=['Timer_Reset', '1', '0', 'history', 'Clear_Data', '1', \
+           '1', normpath(f"{TEST_OUT_DIR}/test_gc_none_w2"), 'New_Wkbk', '0'])
+    def test_get_and_write_data_excel_gc_none(self, _):
+        """
+        This method tests bb_session.get_and_write_data() for an Excel output with no graph:
+        - A sheet testing the timer reset, and another testing the data clear (and sheet naming)
+        - A new workbook with row types to also test file-switching
+        Patching requires another argument, but it's unused, so I put _
+        """
+        timer_reset_list = [bb_common.DATA_START_AFTER, \
+                DATA_HEADER, \
+                f"{DATA_ROW_START},1,0", \
+                f"{DATA_ROW_START},2,1", \
+                bb_common.RESET_TIMER, \
+                f"{bb_common.LABEL_ROW},{bb_common.DATE_WORD},Label,Timer Reset", \
+                f"{DATA_ROW_START},5,2", ""]
+        clear_data_list = [bb_common.DATA_START_AFTER, \
+                DATA_HEADER, \
+                f"{DATA_ROW_START},1,0", \
+                f"{DATA_ROW_START},2,1", \
+                bb_common.CLEAR_DATA, \
+                f"{bb_common.LABEL_ROW},{bb_common.DATE_WORD},Label,Data Cleared", \
+                f"{DATA_ROW_START},5,2", ""]
+        new_wkbk_rt_list = [bb_common.DATA_START_AFTER, \
+                DATA_HEADER, \
+                f"{DATA_ROW_START},1,0", \
+                f"{bb_common.MSG_ROW},Message", \
+                f"{bb_common.LABEL_ROW},{bb_common.DATE_WORD},Label,Message Sent", \
+                # Intentionally left out a row type below
+                f"{bb_common.DATE_WORD},{bb_common.TIMER_WORD},{bb_common.TIME_WORD},4,1",
+                f"{DATA_ROW_START},5,2", ""]
+        msg_list = timer_reset_list + clear_data_list + new_wkbk_rt_list
+        ser = SerialMock(msg_list, 0.25)
+        fpath = normpath(f"{TEST_OUT_DIR}/test_gc_none_w1.xlsx")
+        file_struct = bb_file.FileData(True, fpath, DATA_HEADER)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.NONE,-1,-1)
+        bb_session.get_and_write_data(ser, file_struct, graph_struct)
+        # DATA_START_AFTER, MSG_ROW, RESET_TIMER, and "" won't be shown in the file
+        num_disp_rows = len(new_wkbk_rt_list) - 1 - 1 - 1 # This is 1-indexed
+        # row_num is 0-indexed and incremented after each row is done
+        assert file_struct.row_num == num_disp_rows
+
+    @patch("builtins.input", side_effect=['Sheet_1', '0'])
+    def test_get_and_write_data_excel_gc_sheet(self, _):
+        """
+        This method tests bb_session.get_and_write_data() for an Excel output with the graph only in
+        the sheet (not live)
+        Patching requires another argument, but it's unused, so I put _
+        """
+        num_data_lines = 10
+        msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER]
+        for i in range(num_data_lines):
+            msg_list.append(f"{DATA_ROW_START},{i},{(i-1)**2}")
+        ser = SerialMock(msg_list, 0.25)
+        fpath = normpath(f"{TEST_OUT_DIR}/test_gc_sheet.xlsx")
+        file_struct = bb_file.FileData(True, fpath, DATA_HEADER)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.EXCEL_ONLY,4,5)
+        bb_session.get_and_write_data(ser, file_struct, graph_struct)
+        # DATA_START_AFTER, MSG_ROW, RESET_TIMER, and "" won't be shown in the file
+        num_disp_rows = num_data_lines + 1 # This is 1-indexed
+        # row_num is 0-indexed and incremented after each row is done
+        assert file_struct.row_num == num_disp_rows
+        assert len(file_struct.curr_sheet.charts) == 1
+
+    @patch("builtins.input", side_effect=['Sheet_1', '0'])
+    def test_get_and_write_data_excel_gc_live(self, _):
+        """
+        This method tests bb_session.get_and_write_data() for an Excel output with the live graph
+        Patching requires another argument, but it's unused, so I put _
+        """
+        num_data_lines = 10
+        msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER]
+        for i in range(num_data_lines):
+            msg_list.append(f"{DATA_ROW_START},{i},{(i-1)**2}")
+        ser = SerialMock(msg_list, 0.01)
+        fpath = normpath(f"{TEST_OUT_DIR}/test_gc_live.xlsx")
+        file_struct = bb_file.FileData(True, fpath, DATA_HEADER)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.LIVE,4,5,1.1)
+        # The clock moves 0.25 s per point, so the frames (1/1.1 s apart) are due at the 5th and
+        # 9th points, no matter how fast the lines arrive
+        graph_struct.clock = FakeClock(0.25)
+        bb_session.get_and_write_data(ser, file_struct, graph_struct)
+        # DATA_START_AFTER, MSG_ROW, RESET_TIMER, and "" won't be shown in the file
+        num_disp_rows = num_data_lines + 1 # This is 1-indexed
+        # row_num is 0-indexed and incremented after each row is done
+        assert file_struct.row_num == num_disp_rows
+        assert len(file_struct.curr_sheet.charts) == 1
+        assert graph_struct.num_plot_bufs == 2
+
+    @patch("builtins.input", side_effect=['1', normpath(f"{TEST_OUT_DIR}/test_gc_none_f2"), '0'])
+    def test_get_and_write_data_csv_gc_none(self, _):
+        """
+        This method tests bb_session.get_and_write_data() for a CSV output with no graph:
+        - A file testing the data clear and timer reset
+        - A new file with row types to also test file-switching
+        Patching requires another argument, but it's unused, so I put _
+        """
+        clear_timer_list = [bb_common.DATA_START_AFTER, \
+                DATA_HEADER, \
+                f"{DATA_ROW_START},1,0", \
+                bb_common.CLEAR_DATA, \
+                f"{DATA_ROW_START},3,1", \
+                bb_common.RESET_TIMER, \
+                f"{bb_common.LABEL_ROW},{bb_common.DATE_WORD},Label,Timer Reset", \
+                f"{DATA_ROW_START},6,2", ""]
+        new_file_rt_list = [bb_common.DATA_START_AFTER, \
+                DATA_HEADER, \
+                f"{DATA_ROW_START},1,0", \
+                f"{bb_common.MSG_ROW},Message", \
+                f"{bb_common.LABEL_ROW},{bb_common.DATE_WORD},Label,Message Sent", \
+                # Intentionally left out a row type below
+                f"{bb_common.DATE_WORD},{bb_common.TIMER_WORD},{bb_common.TIME_WORD},4,1",
+                f"{DATA_ROW_START},5,2", ""]
+        msg_list = clear_timer_list + new_file_rt_list
+        ser = SerialMock(msg_list, 0.25)
+        fpath = normpath(f"{TEST_OUT_DIR}/test_gc_none_f1.csv")
+        file_struct = bb_file.FileData(False, fpath, DATA_HEADER)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.NONE,-1,-1)
+        bb_session.get_and_write_data(ser, file_struct, graph_struct)
+        # DATA_START_AFTER, MSG_ROW, RESET_TIMER, and "" won't be shown in the file
+        num_disp_rows = len(new_file_rt_list) - 1 - 1 - 1 # This is 1-indexed
+        # row_num is 0-indexed and incremented after each row is done
+        assert file_struct.row_num == num_disp_rows
+
+    @patch("builtins.input", side_effect='0')
+    def test_get_and_write_data_csv_gc_sheet(self, _):
+        """
+        This method tests bb_session.get_and_write_data() for a CSV output with the graph only in
+        the sheet (not live), which should be no different than the no graph case due to file type
+        Patching requires another argument, but it's unused, so I put _
+        """
+        num_data_lines = 10
+        msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER]
+        for i in range(num_data_lines):
+            msg_list.append(f"{DATA_ROW_START},{i},{(i-1)**2}")
+        ser = SerialMock(msg_list, 0.25)
+        fpath = normpath(f"{TEST_OUT_DIR}/test_gc_sheet.csv")
+        file_struct = bb_file.FileData(False, fpath, DATA_HEADER)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.EXCEL_ONLY,4,5)
+        bb_session.get_and_write_data(ser, file_struct, graph_struct)
+        # DATA_START_AFTER, MSG_ROW, RESET_TIMER, and "" won't be shown in the file
+        num_disp_rows = num_data_lines + 1 # This is 1-indexed
+        # row_num is 0-indexed and incremented after each row is done
+        assert file_struct.row_num == num_disp_rows
+        with pytest.raises(AttributeError):
+            _ = len(file_struct.curr_sheet.charts)
+
+    @patch("builtins.input", side_effect='0')
+    def test_get_and_write_data_csv_gc_live(self, _):
+        """
+        This method tests bb_session.get_and_write_data() for a CSV output with the live graph
+        Patching requires another argument, but it's unused, so I put _
+        """
+        num_data_lines = 10
+        msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER]
+        for i in range(num_data_lines):
+            msg_list.append(f"{DATA_ROW_START},{i},{(i-1)**2}")
+        ser = SerialMock(msg_list, 0.01)
+        fpath = normpath(f"{TEST_OUT_DIR}/test_gc_live.csv")
+        file_struct = bb_file.FileData(False, fpath, DATA_HEADER)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.LIVE,4,5,1.1)
+        # The clock moves 0.25 s per point, so the frames (1/1.1 s apart) are due at the 5th and
+        # 9th points, no matter how fast the lines arrive
+        graph_struct.clock = FakeClock(0.25)
+        bb_session.get_and_write_data(ser, file_struct, graph_struct)
+        # DATA_START_AFTER, MSG_ROW, RESET_TIMER, and "" won't be shown in the file
+        num_disp_rows = num_data_lines + 1 # This is 1-indexed
+        # row_num is 0-indexed and incremented after each row is done
+        assert file_struct.row_num == num_disp_rows
+        with pytest.raises(AttributeError):
+            _ = len(file_struct.curr_sheet.charts)
+        assert graph_struct.num_plot_bufs == 2
+
+    @patch("builtins.input", side_effect='0')
+    def test_get_and_write_data_csv_threaded(self, _):
+        """
+        This method tests bb_session.get_and_write_data() for a CSV output with the serial data read
+        in a separate thread
+        Patching requires another argument, but it's unused, so I put _
+        """
+        num_data_lines = 10
+        msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER]
+        for i in range(num_data_lines):
+            msg_list.append(f"{DATA_ROW_START},{i},{(i-1)**2}")
+        msg_list.append(bb_common.RESET_TIMER)
+        msg_list.append(f"{DATA_ROW_START},{num_data_lines},0")
+        ser = SerialMock(msg_list, 0.01)
+        fpath = normpath(f"{TEST_OUT_DIR}/test_threaded.csv")
+        file_struct = bb_file.FileData(False, fpath, DATA_HEADER)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.NONE,-1,-1)
+        bb_session.get_and_write_data(ser, file_struct, graph_struct, \
+                                      bb_session.RunOptions(threaded=True))
+        num_disp_rows = num_data_lines + 1 + 1 # This is 1-indexed
+        assert file_struct.row_num == num_disp_rows
+        with open(fpath, encoding='utf-8') as f_in:
+            lines = f_in.read().splitlines()
+        assert len(lines) == num_disp_rows
+        # The timer was reset when RESETTIMER was received, so the last timer value is small
+        assert float(lines[-1].split(bb_common.DATA_DELIM)[2]) < 0.1
+
+    def test_stalled_stream_stops(self):
+        """
+        This method tests that a keypress in the live graph stops a threaded run while the stream
+        is stalled (the reader thread's queue is waited on for one frame at a time)
+        """
+        msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER, f"{DATA_ROW_START},0,1"]
+        ser = StalledSerialMock(msg_list, 0)
+        fpath = normpath(f"{TEST_OUT_DIR}/test_stalled.csv")
+        file_struct = bb_file.FileData(False, fpath, DATA_HEADER)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.LIVE,4,5)
+        stopper = Timer(0.5, graph_struct.on_key_press, args=(None,))
+        stopper.start()
+        t_start = time()
+        bb_session.get_and_write_data(ser, file_struct, graph_struct, bb_session.RunOptions(True), \
+                                      ask_rerun=False)
+        stopper.join()
+        # Stopped soon after the keypress (the reader thread, which is stuck in readline(), is
+        # only waited on for its join timeout)
+        assert time() - t_start < 0.5 + bb_common.READER_JOIN_TIMEOUT + 5
+        assert ser.closed.is_set()
+        assert file_struct.row_num == 2
+
+    @pytest.mark.parametrize("use_handoff,echo", [(False, False), (True, False), (False, True)])
+    def test_acquire_ports(self, capsys, use_handoff, echo):
+        """
+        This method tests bb_session.acquire_ports() with two ports at different data rates, either
+        opened by each port's thread or taken over from bb_reader.open_stream(), and that it shows
+        one status line for every port instead of printing every line (unless echo is used)
+        """
+        sers = []
+        file_structs = []
+        tags = []
+        num_lines_list = [30, 10]
+        for (ind, (num_lines, delay_s)) in enumerate(zip(num_lines_list, [0.002, 0.01])):
+            msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER]
+            for i in range(num_lines):
+                msg_list.append(f"{DATA_ROW_START},{i},{ind}")
+            sers.append(SerialMock(msg_list, delay_s))
+            fpath = normpath(f"{TEST_OUT_DIR}/test_multi_{ind}.csv")
+            file_structs.append(bb_file.FileData(False, fpath, DATA_HEADER))
+            tags.append(f"Port {ind}")
+        handoffs = [bb_reader.open_stream(ser, ask_user=False)[2] for ser in sers] if use_handoff \
+            else None
+        capsys.readouterr()
+        bb_session.acquire_ports(sers, file_structs, tags, handoffs, echo)
+        out = capsys.readouterr().out
+        assert (out.count(DATA_ROW_START) == sum(num_lines_list)) == echo
+        assert (f"{sum(num_lines_list)} lines | " in out) != echo
+        for (ind, num_lines) in enumerate(num_lines_list):
+            with open(file_structs[ind].file_name, encoding='utf-8') as f_in:
+                lines = f_in.read().splitlines()
+            assert lines[0] == DATA_HEADER
+            assert len(lines) == num_lines + 1
+            assert all(line.endswith(f",{ind}") for line in lines[1:])
+            # The timers start from the same time
+            assert float(lines[1].split(",")[2]) < 0.1
+
+    def test_session_many_runs(self):
+        """
+        This method tests that bb_session.get_and_write_data() runs again as many times as asked
+        (each in a new worksheet) without the runs nesting inside each other
+        """
+        num_runs = 12
+        num_data_lines = 5
+        msg_list = []
+        for _ in range(num_runs):
+            msg_list += [bb_common.DATA_START_AFTER, DATA_HEADER]
+            msg_list += [f"{DATA_ROW_START},{i},{i*2}" for i in range(num_data_lines)]
+            msg_list.append("") # The serial timeout that ends each run
+        ser = SerialMock(msg_list, 0.001)
+        inputs = []
+        for run in range(num_runs):
+            # Name the sheet, then run again in the same workbook (except after the last run)
+            inputs += [f"Run_{run}"] + (["1", "0"] if run < num_runs - 1 else ["0"])
+        fpath = normpath(f"{TEST_OUT_DIR}/test_session.xlsx")
+        file_struct = bb_file.FileData(True, fpath, DATA_HEADER)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.EXCEL_ONLY, 2, 5)
+        stack_depths = []
+        write_header = bb_file.FileData.write_header
+        def record_depth(self):
+            stack_depths.append(len(extract_stack()))
+            write_header(self)
+        with patch("builtins.input", side_effect=inputs), \
+                patch.object(bb_file.FileData, "write_header", record_depth):
+            bb_session.get_and_write_data(ser, file_struct, graph_struct)
+        assert len(stack_depths) == num_runs
+        assert len(set(stack_depths)) == 1
+        with ZipFile(fpath) as xlsx:
+            names = xlsx.namelist()
+        assert sum(name.startswith("xl/worksheets/sheet") for name in names) == num_runs
+        assert sum(name.startswith("xl/charts/chart") for name in names) == num_runs
+
+    @pytest.mark.parametrize("threaded", [False, True])
+    def test_stream_guard_reset(self, threaded):
+        """
+        This method tests that bb_session.get_and_write_data() keeps writing to the same file when
+        the board resets (CLEARDATA and the header are sent again) or the data pauses
+        """
+        msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER]
+        msg_list += [f"{DATA_ROW_START},{i},{i}" for i in range(5)]
+        msg_list += [bb_common.CLEAR_DATA, DATA_HEADER] # The board reset
+        msg_list += [f"{DATA_ROW_START},{i},{i}" for i in range(5, 10)]
+        msg_list += [""] # The data paused
+        msg_list += [f"{DATA_ROW_START},{i},{i}" for i in range(10, 15)]
+        ser = TimeoutSerialMock(msg_list + [""], 0.005)
+        fpath = normpath(f"{TEST_OUT_DIR}/test_stream_guard_{int(threaded)}.csv")
+        file_struct = bb_file.FileData(False, fpath, DATA_HEADER)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.NONE,-1,-1)
+        options = bb_session.RunOptions(threaded, reconnect_timeout=0.2)
+        bb_session.get_and_write_data(ser, file_struct, graph_struct, options, ask_rerun=False)
+        with open(fpath, encoding='utf-8') as f_in:
+            lines = f_in.read().splitlines()
+        assert lines[0] == DATA_HEADER
+        gap_rows = [line.split(",") for line in lines if line.startswith(bb_common.GAP_ROW)]
+        assert [row[1] for row in gap_rows] == ["Board reset", "Resumed"]
+        assert all(float(row[2]) > 0 for row in gap_rows)
+        data_rows = [line for line in lines[1:] if not line.startswith(bb_common.GAP_ROW)]
+        assert [line.split(",")[-1] for line in data_rows] == [str(i) for i in range(15)]
+
+    @patch("src.bb_session.list_ports.comports")
+    def test_stream_guard_reconnect(self, mock_comports):
+        """
+        This method tests that bb_session.StreamGuard closes a port that left the port list and
+        reopens it once it is back
+        """
+        port_info = SimpleNamespace(device="/dev/ttyBB")
+        mock_comports.side_effect = [[], [], [port_info]]
+        calls = []
+        ser = SimpleNamespace(port=port_info.device, open=lambda: calls.append("open"), \
+                              close=lambda: calls.append("close"))
+        file_struct = bb_file.FileData(False, normpath(f"{TEST_OUT_DIR}/test_reconnect.csv"), \
+                                       DATA_HEADER)
+        guard = bb_session.StreamGuard(ser, file_struct, reconnect_timeout=5, poll_interval=0.01)
+        guard.last_rx = 1.0
+        for _ in range(3):
+            assert not guard.screen("", 2.0)
+        assert calls == ["close", "open"]
+        line = f"{DATA_ROW_START},1,2"
+        assert guard.screen(line, 3.5) == [(line, 3.5)]
+        assert guard.restarts == [("Reconnected", 2.5)]
+        assert guard.describe().startswith("Stream restarts: 1 (board resets: 0)")
+        file_struct.close_workbook()
+
+    @patch("builtins.input", side_effect=['0'])
+    def test_get_and_write_data_asyncio(self, _):
+        """
+        This method tests bb_session.get_and_write_data() with the asyncio tasks and a live graph
+        (The SerialMock has no file descriptor, so its lines are read in the default executor)
+        Patching requires another argument, but it's unused, so I put _
+        """
+        num_data_lines = 20
+        msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER]
+        for i in range(num_data_lines):
+            msg_list.append(f"{DATA_ROW_START},{i},{(i-1)**2}")
+        ser = SerialMock(msg_list, 0.02)
+        fpath = normpath(f"{TEST_OUT_DIR}/test_asyncio.csv")
+        file_struct = bb_file.FileData(False, fpath, DATA_HEADER)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.LIVE,4,5)
+        bb_session.get_and_write_data(ser, file_struct, graph_struct, \
+                                      bb_session.RunOptions(use_asyncio=True))
+        assert file_struct.row_num == num_data_lines + 1
+        # The graph task refreshed the graph on its own schedule (20 lines take about 0.4 s)
+        assert graph_struct.num_plot_bufs >= 2
+        assert graph_struct.points.num_points == num_data_lines
+
+    @pytest.mark.skipif(os_name != "posix", reason="pseudo-terminals are only on POSIX")
+    def test_get_and_write_data_chunked(self):
+        """
+        This method tests bb_session.get_and_write_data() on a pseudo-terminal, so the data lines
+        are read in chunks by a bb_reader.LineFramer (the serial timeout ends the run)
+        """
+        (master_fd, slave_fd) = openpty()
+        ser = serial.Serial(ttyname(slave_fd), timeout=0.2)
+        ser.close()
+        num_data_lines = 200
+        msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER]
+        for i in range(num_data_lines):
+            msg_list.append(f"{DATA_ROW_START},{i},{i/2}")
+        def write_lines():
+            sleep(0.1) # Wait for the port to be opened
+            os_write(master_fd, ("\r\n".join(msg_list) + "\r\n").encode())
+        fpath = normpath(f"{TEST_OUT_DIR}/test_chunked.csv")
+        file_struct = bb_file.FileData(False, fpath, DATA_HEADER)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.NONE,-1,-1)
+        writer = Thread(target=write_lines)
+        writer.start()
+        bb_session.get_and_write_data(ser, file_struct, graph_struct, ask_rerun=False)
+        writer.join()
+        os_close(master_fd)
+        os_close(slave_fd)
+        with open(fpath, encoding='utf-8') as f_in:
+            lines = f_in.read().splitlines()
+        assert len(lines) == num_data_lines + 1
+        assert lines[-1].endswith(f"{num_data_lines - 1},{(num_data_lines - 1)/2}")
+
+    def test_empty_batch(self):
+        """
+        This method tests that bb_session.get_and_write_data() keeps reading when a read gives no
+        complete line (e.g., a chunk with only part of a line)
+        """
+        num_data_lines = 10
+        msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER]
+        for i in range(num_data_lines):
+            msg_list.append(f"{DATA_ROW_START},{i},{i/2}")
+        ser = SerialMock(msg_list, 0.005)
+        read_batch = bb_session.read_batch
+        num_reads = []
+        def read_every_other(*args, **kwargs):
+            num_reads.append(1)
+            return [] if len(num_reads) % 2 else read_batch(*args, **kwargs)
+        fpath = normpath(f"{TEST_OUT_DIR}/test_empty_batch.csv")
+        file_struct = bb_file.FileData(False, fpath, DATA_HEADER)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.NONE,-1,-1)
+        with patch.object(bb_session, "read_batch", read_every_other):
+            bb_session.get_and_write_data(ser, file_struct, graph_struct, ask_rerun=False)
+        with open(fpath, encoding='utf-8') as f_in:
+            lines = f_in.read().splitlines()
+        assert len(lines) == num_data_lines + 1
+        assert lines[-1].endswith(f"{num_data_lines - 1},{(num_data_lines - 1)/2}")
+
+    @pytest.mark.parametrize("echo", [False, True])
+    def test_console_status(self, capsys, echo):
+        """
+        This method tests bb_common.ConsoleStatus, and that a run only prints every line when asked
+        """
+        stream = StringIO() # Not a terminal, so each status gets its own line
+        status = bb_common.ConsoleStatus(interval=3600, stream=stream)
+        for i in range(5):
+            status.add_line(f"{DATA_ROW_START},{i},{i/4}")
+        status.add_line("") # A timeout
+        assert stream.getvalue() == "" # Not due yet
+        status.finish()
+        text = stream.getvalue()
+        assert text.count("\n") == 1
+        assert text.startswith("5 lines | ")
+        assert "| 1 timeouts | 00:00:00 | " in text
+        assert text.endswith(f"last: {DATA_ROW_START},4,1.0\n")
+        # A run prints the status instead of the lines (unless echo is used)
+        num_data_lines = 200
+        msg_list = [bb_common.DATA_START_AFTER, DATA_HEADER]
+        for i in range(num_data_lines):
+            msg_list.append(f"{DATA_ROW_START},{i},{i/4}")
+        ser = SerialMock(msg_list, 0)
+        fpath = normpath(f"{TEST_OUT_DIR}/test_console_status_{echo}.csv")
+        file_struct = bb_file.FileData(False, fpath, DATA_HEADER)
+        graph_struct = bb_graph.GraphData(bb_common.GraphChoice.NONE,-1,-1)
+        capsys.readouterr()
+        bb_session.get_and_write_data(ser, file_struct, graph_struct, \
+                                      bb_session.RunOptions(echo=echo), ask_rerun=False)
+        out = capsys.readouterr().out
+        assert (out.count(DATA_ROW_START) == num_data_lines) == echo
+        assert (f"{num_data_lines} lines | " in out) != echo
+        with open(fpath, encoding='utf-8') as f_in:
+            assert len(f_in.read().splitlines()) == num_data_lines + 1